@@ -1,10 +1,19 @@
-__all__ = ["Tiff", "tags", "NotTiledError", "SinglePageError", "byteorder", "is_bigtiff", "__version__", "tiff_version", "tiff_version_raw"]
+__all__ = ["Tiff", "tags", "NotTiledError", "SinglePageError", "byteorder", "is_bigtiff", "__version__", "tiff_version", "tiff_version_raw",
+           "auto_tile_shape", "replay_windows", "tiles_in_mask", "convert", "copy_pages", "map_tiles", "Mosaic",
+           "ByteSource", "FileSource", "HTTPRangeSource", "BlockReader", "ReadStats",
+           "SharedTileCache", "DiskTileCache"]
 
 from .utils import byteorder, is_bigtiff
+from .tiling import auto_tile_shape, replay_windows, tiles_in_mask
+from .sources import ByteSource, FileSource, HTTPRangeSource, BlockReader, ReadStats
+from .cache import SharedTileCache, DiskTileCache
 try:
     from ._pytiff import Tiff, NotTiledError, SinglePageError, tags
     from ._pytiff import __doc__
     from ._pytiff import tiff_version, tiff_version_raw
+    from .convert import convert, copy_pages
+    from .pipeline import map_tiles
+    from .mosaic import Mosaic
 except ImportError as e:
     print("Cython modules not available")
 
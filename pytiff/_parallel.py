@@ -0,0 +1,221 @@
+"""Helpers to run tile and band jobs on several threads.
+
+libtiff handles must not be shared between threads, so every thread opens its own
+read handle. The decoding itself releases the gil.
+"""
+import collections
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def ordered_map(func, items, workers=1, max_pending=None, processes=False):
+    """Apply func to every item and yield the results in the order of items.
+
+    At most max_pending results are computed ahead of the consumer, which bounds the memory usage.
+    Items are taken from the iterable only when they are submitted.
+
+    Args:
+        func (callable): function applied to every item.
+        items (iterable): the items.
+        workers (int): number of threads. 1 runs everything in the calling thread. Default: 1
+        max_pending (int): maximum number of submitted but not consumed items. Default: 2 * workers
+        processes (bool): use worker processes instead of threads. func and the items have to be picklable. Default: False
+    """
+    if workers is None or workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * workers
+    pending = collections.deque()
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class ReaderPool(object):
+    """Thread local read handles for one tiff file.
+
+    Args:
+        opener (callable): function without arguments returning a new Tiff object.
+    """
+    def __init__(self, opener):
+        self._opener = opener
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles = []
+
+    def get(self, page=None):
+        """Return the handle of the calling thread, optionally set to a page."""
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = self._opener()
+            self._local.handle = handle
+            with self._lock:
+                self._handles.append(handle)
+        if page is not None:
+            handle.set_page(page)
+        return handle
+
+    def close(self):
+        """Close all handles opened by this pool."""
+        with self._lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles = []
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class BackgroundWriter(object):
+    """Run write jobs in order on one background thread.
+
+    `submit` blocks if max_pending jobs are waiting, which slows down a producer that is faster than the disk.
+    If a job fails, the following jobs are skipped and the error is raised by the next `flush`.
+
+    Args:
+        max_pending (int): maximum number of queued jobs. Default: 2 (double buffering)
+    """
+    def __init__(self, max_pending=2):
+        self._queue = queue.Queue(maxsize=max(int(max_pending), 1))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="pytiff-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if self._error is None:
+                    func, args = job
+                    func(*args)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, *args):
+        """Queue func(*args). Blocks while the queue is full."""
+        if not self._thread.is_alive():
+            raise RuntimeError("The background writer is closed")
+        self._queue.put((func, args))
+
+    def flush(self):
+        """Wait until all queued jobs are done and raise the first error of a job."""
+        self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        """Finish all queued jobs and stop the thread. Errors are raised like in `flush`."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+class HandlePool(object):
+    """Bounded pool of read handles for many files.
+
+    A handle is lent to one thread at a time. At most max_open handles are open; if the limit is reached,
+    idle handles of the least recently used files are closed, or the caller waits for a busy handle.
+
+    Args:
+        opener (callable): function mapping a key (e.g. a file index) to a new Tiff object.
+        max_open (int): maximum number of open handles. Default: 32
+    """
+    def __init__(self, opener, max_open=32):
+        self._opener = opener
+        self.max_open = max(int(max_open), 1)
+        self._idle = collections.OrderedDict()
+        self._n_open = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, key):
+        """Return an idle or new handle for key. It has to be given back with `release`."""
+        with self._condition:
+            while True:
+                handles = self._idle.get(key)
+                if handles:
+                    handle = handles.pop()
+                    if not handles:
+                        del self._idle[key]
+                    return handle
+                if self._n_open < self.max_open:
+                    self._n_open += 1
+                    break
+                if self._idle:
+                    # close a handle of the least recently used file
+                    lru = next(iter(self._idle))
+                    self._idle[lru].pop(0).close()
+                    if not self._idle[lru]:
+                        del self._idle[lru]
+                    self._n_open -= 1
+                    continue
+                self._condition.wait()
+        try:
+            return self._opener(key)
+        except BaseException:
+            with self._condition:
+                self._n_open -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, key, handle):
+        """Give a handle back to the pool."""
+        with self._condition:
+            handles = self._idle.pop(key, [])
+            handles.append(handle)
+            self._idle[key] = handles
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def handle(self, key):
+        """Context manager lending a handle for key."""
+        handle = self.acquire(key)
+        try:
+            yield handle
+        finally:
+            self.release(key, handle)
+
+    def close(self):
+        """Close all idle handles."""
+        with self._condition:
+            for handles in self._idle.values():
+                for handle in handles:
+                    handle.close()
+                    self._n_open -= 1
+            self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
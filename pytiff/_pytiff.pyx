@@ -9,19 +9,32 @@ cimport ctiff
 from libcpp.string cimport string
 import logging
 from cpython cimport bool
+from cpython.buffer cimport PyBUF_READ, PyBUF_WRITE
+from cpython.memoryview cimport PyMemoryView_FromMemory
+from libc.string cimport memcpy
 cimport numpy as np
 import numpy as np
 from math import ceil
 import re
+import zlib
 from pytiff._version import _package
+from pytiff.tiling import auto_tile_shape, tiles_in_mask
+from pytiff.utils import page_list, pack_samples, unpack_samples
+from pytiff._parallel import ordered_map, ReaderPool, BackgroundWriter
+from pytiff.sources import BlockReader
 import sys
+import os
 import copy
 from enum import IntEnum
 PY3 = sys.version_info[0] == 3
 
 TYPE_MAP = {
   1: {
+    1: np.bool_,
+    2: np.uint8,
+    4: np.uint8,
     8: np.uint8,
+    12: np.uint16,
     16: np.uint16,
     32: np.uint32,
     64: np.uint64
@@ -42,6 +55,7 @@ TYPE_MAP = {
 
 # map data type to (sample_format, bitspersample)
 INVERSE_TYPE_MAP = {
+  np.dtype('bool'): (1, 1),
   np.dtype('uint8'): (1, 8),
   np.dtype('uint16'): (1, 16),
   np.dtype('uint32'): (1, 32),
@@ -239,6 +253,38 @@ TIFF_TAGS_NOT_WRITABLE = [
         tags["strip_offsets"]
         ]
 
+# tags that describe the layout of the image data. They are set by the writer
+# and are not copied if tags of one page are transferred to another one.
+TIFF_TAGS_LAYOUT = [
+        tags["image_width"],
+        tags["image_length"],
+        tags["bits_per_sample"],
+        tags["compression"],
+        tags["photometric"],
+        tags["fill_order"],
+        tags["samples_per_pixel"],
+        tags["rows_per_strip"],
+        tags["planar_configuration"],
+        tags["page_number"],
+        tags["predictor"],
+        tags["tile_width"],
+        tags["tile_length"],
+        tags["extra_samples"],
+        tags["sample_format"],
+        tags["indexed"],
+        tags["jpeg_tables"],
+        tags["ycbcr_subsampling"],
+        tags["ycbcr_positioning"],
+        tags["reference_black_white"],
+        tags["image_depth"],
+        tags["tile_depth"],
+        ] + TIFF_TAGS_NOT_WRITABLE
+
+def descriptive_tags(tagdict):
+  """Return the tags of a page that do not describe the data layout."""
+  return {key: value for key, value in dict.items(tagdict)
+          if key not in TIFF_TAGS_LAYOUT and value is not None}
+
 # the data types to the corresponding type in TIFF_TAGS
 TIFF_DATA_TYPES = {
     1: np.dtype("uint8"),       # BYTE 8-bit unsigned integer.
@@ -314,6 +360,9 @@ cdef unsigned int MIN_IS_BLACK = 1
 cdef unsigned int MIN_IS_WHITE = 0
 cdef unsigned int NO_COMPRESSION = 1
 cdef unsigned int RGB = 2
+# libtiff only codes one slice of a 3D tile, so tiles of volumes are encoded here:
+# without compression or with (adobe) deflate
+VOLUME_COMPRESSIONS = (1, 8, 32946)
 
 def tiff_version_raw():
   """Return the raw version string of libtiff."""
@@ -325,6 +374,98 @@ def tiff_version():
   m = re.search("(?<=[Vv]ersion )\d+\.\d+\.?\d*", str_version)
   return m.group(0)
 
+def _resolve_tile_shape(options, image_size, dtype, samples, compression, default):
+  """Get (tile_length, tile_width) from the write options.
+
+  "tile_shape" can either be a tuple or "auto". If it is not given, "tile_length" and "tile_width" are used.
+  """
+  tile_shape = options.get("tile_shape", None)
+  if tile_shape is None:
+    tile_shape = options.get("tile_length", default), options.get("tile_width", default)
+  elif isinstance(tile_shape, str):
+    if tile_shape != "auto":
+      raise ValueError("tile_shape must be a tuple or 'auto', got: {}".format(tile_shape))
+    tile_shape = auto_tile_shape(image_size[:2], dtype, samples, compression,
+                                 access=options.get("access", "patches"), patch_size=options.get("patch_size", 256))
+  tile_length, tile_width = int(tile_shape[0]), int(tile_shape[1])
+  if tile_length <= 0 or tile_width <= 0 or tile_length % 16 or tile_width % 16:
+    raise ValueError("Tile length and width must be positive multiples of 16, got: {} x {}".format(tile_length, tile_width))
+  return tile_length, tile_width
+
+def _convert_into(np.ndarray dst, np.ndarray src, select, factor, offset):
+  """Write src ([depth,] rows, columns, samples) into dst, selecting channels, converting the dtype and scaling."""
+  if select is not None:
+    src = src[..., select]
+  if dst.ndim < src.ndim:
+    src = src[..., 0]
+  if factor is None:
+    np.copyto(dst, src, casting="unsafe")
+  elif dst.dtype.kind == "f":
+    np.multiply(src, factor, out=dst, casting="unsafe")
+    if offset:
+      np.add(dst, offset, out=dst, casting="unsafe")
+  else:
+    np.copyto(dst, np.rint(src * float(factor) + offset), casting="unsafe")
+
+cdef ctiff.TIFFExtendProc _parent_extender = NULL
+
+cdef void _extend_tags(ctiff.TIFF* handle) noexcept nogil:
+  """Register the gdal nodata tag on every directory, libtiff does not know it."""
+  cdef ctiff.TIFFFieldInfo info
+  info.field_tag = 42113
+  info.field_readcount = ctiff.TIFF_VARIABLE
+  info.field_writecount = ctiff.TIFF_VARIABLE
+  info.field_type = ctiff.TIFF_ASCII
+  info.field_bit = ctiff.FIELD_CUSTOM
+  info.field_oktochange = 1
+  info.field_passcount = 0
+  info.field_name = b"GDALNoDataValue"
+  ctiff.TIFFMergeFieldInfo(handle, &info, 1)
+  if _parent_extender != NULL:
+    _parent_extender(handle)
+
+_parent_extender = ctiff.TIFFSetTagExtender(_extend_tags)
+
+cdef _read_nodata(ctiff.TIFF* handle):
+  """Value of the gdal nodata tag or None."""
+  cdef char* value = NULL
+  if ctiff.TIFFGetField(handle, tags.gdal_nodata, &value) != 1 or value == NULL:
+    return None
+  return value
+
+def _crop_packed(np.ndarray rows, long bit_start, long bit_count):
+  """Cut bit_count bits starting at bit_start out of every row of packed bytes. The rows of the result start at a byte boundary."""
+  cdef long start = bit_start // 8, shift = bit_start % 8, n_bytes = (bit_count + 7) // 8, tail = bit_count % 8
+  data = rows[:, start:start + n_bytes + 1]
+  if shift:
+    # move the bits of every byte up and fill in the high bits of the next byte
+    following = np.zeros_like(data)
+    following[:, :-1] = data[:, 1:]
+    data = ((data.astype(np.uint16) << shift) | (following >> (8 - shift))).astype(np.uint8)
+  out = np.array(data[:, :n_bytes], dtype=np.uint8)
+  if tail:
+    # bits after the chunk are zero, as in pack_samples
+    out[:, -1] &= (0xff << (8 - tail)) & 0xff
+  return out
+
+def _decode_volume_tile(np.ndarray raw, compression, predictor):
+  """Decode the bytes of a 3D tile read with TIFFReadRawTile."""
+  if compression not in VOLUME_COMPRESSIONS or predictor != 1:
+    raise ValueError("Volumes with compression {} and predictor {} are not supported".format(compression, predictor))
+  if compression == NO_COMPRESSION:
+    return raw
+  return np.frombuffer(zlib.decompress(raw), dtype=np.uint8)
+
+def _sample_bits(dtype, options):
+  """(sample format, bits per sample) for writing. The option n_bits selects 2, 4 or 12 bit unsigned samples."""
+  sample_format, nbits = INVERSE_TYPE_MAP[np.dtype(dtype)]
+  n_bits = options.get("n_bits")
+  if n_bits is not None and n_bits != nbits:
+    if sample_format != 1 or not 0 < n_bits < nbits:
+      raise ValueError("{} bits per sample are not possible for dtype {}".format(n_bits, np.dtype(dtype)))
+    nbits = n_bits
+  return sample_format, nbits
+
 class NotTiledError(Exception):
   def __init__(self, message):
     self.message = message
@@ -349,9 +490,150 @@ cdef _get_rgb(np.ndarray[np.uint32_t, ndim=2] inp, short n_samples):
 
   return rgb
 
+# first bytes of a little/big endian tiff and bigtiff
+TIFF_MAGIC = (b"II*\x00", b"MM\x00*", b"II+\x00", b"MM\x00+")
+
+def _is_tiff_buffer(obj):
+  """Return True if obj is an in-memory tiff (bytes, bytearray, memoryview, ...) and not a filename."""
+  if isinstance(obj, bytes):
+    return obj[:4] in TIFF_MAGIC
+  if isinstance(obj, unicode):
+    return False
+  try:
+    memoryview(obj)
+  except TypeError:
+    return False
+  return True
+
+# In-memory files are read through libtiff client callbacks.
+# The data is not copied, libtiff maps the buffer of the caller.
+cdef struct _MemoryFile:
+  char* data
+  unsigned long long size
+  unsigned long long pos
+
+cdef ctiff.tsize_t _memory_read(ctiff.thandle_t handle, ctiff.tdata_t buf, ctiff.tsize_t size) noexcept nogil:
+  cdef _MemoryFile* f = <_MemoryFile*> handle
+  cdef unsigned long long n = size
+  if size <= 0 or f.pos >= f.size:
+    return 0
+  if n > f.size - f.pos:
+    n = f.size - f.pos
+  memcpy(buf, f.data + f.pos, n)
+  f.pos += n
+  return n
+
+cdef ctiff.tsize_t _memory_write(ctiff.thandle_t handle, ctiff.tdata_t buf, ctiff.tsize_t size) noexcept nogil:
+  return -1
+
+cdef ctiff.toff_t _memory_seek(ctiff.thandle_t handle, ctiff.toff_t offset, int whence) noexcept nogil:
+  cdef _MemoryFile* f = <_MemoryFile*> handle
+  cdef long long pos
+  if whence == 0:
+    pos = <long long> offset
+  elif whence == 1:
+    pos = <long long> f.pos + <long long> offset
+  elif whence == 2:
+    pos = <long long> f.size + <long long> offset
+  else:
+    return <ctiff.toff_t> -1
+  if pos < 0:
+    return <ctiff.toff_t> -1
+  f.pos = pos
+  return f.pos
+
+cdef int _memory_close(ctiff.thandle_t handle) noexcept nogil:
+  return 0
+
+cdef ctiff.toff_t _memory_size(ctiff.thandle_t handle) noexcept nogil:
+  return (<_MemoryFile*> handle).size
+
+cdef int _memory_map(ctiff.thandle_t handle, ctiff.tdata_t* base, ctiff.toff_t* size) noexcept nogil:
+  cdef _MemoryFile* f = <_MemoryFile*> handle
+  base[0] = <ctiff.tdata_t> f.data
+  size[0] = f.size
+  return 1
+
+cdef void _memory_unmap(ctiff.thandle_t handle, ctiff.tdata_t base, ctiff.toff_t size) noexcept nogil:
+  pass
+
+# File-like objects are read and written through their read(into)/write/seek/tell methods.
+cdef ctiff.tsize_t _stream_read(ctiff.thandle_t handle, ctiff.tdata_t buf, ctiff.tsize_t size) noexcept with gil:
+  stream = <object> handle
+  cdef ctiff.tsize_t total = 0
+  try:
+    if size <= 0:
+      return 0
+    view = PyMemoryView_FromMemory(<char*> buf, size, PyBUF_WRITE)
+    readinto = getattr(stream, "readinto", None)
+    while total < size:
+      if readinto is not None:
+        n = readinto(view[total:])
+      else:
+        chunk = stream.read(size - total)
+        n = len(chunk)
+        view[total:total + n] = chunk
+      if not n:
+        break
+      total += n
+    return total
+  except Exception as e:
+    logging.getLogger(_package).error("Reading from {} failed: {}".format(stream, e))
+    return -1
+
+cdef ctiff.tsize_t _stream_write(ctiff.thandle_t handle, ctiff.tdata_t buf, ctiff.tsize_t size) noexcept with gil:
+  stream = <object> handle
+  try:
+    if size <= 0:
+      return 0
+    n = stream.write(PyMemoryView_FromMemory(<char*> buf, size, PyBUF_READ))
+    return size if n is None else n
+  except Exception as e:
+    logging.getLogger(_package).error("Writing to {} failed: {}".format(stream, e))
+    return -1
+
+cdef ctiff.toff_t _stream_seek(ctiff.thandle_t handle, ctiff.toff_t offset, int whence) noexcept with gil:
+  stream = <object> handle
+  try:
+    stream.seek(<long long> offset, whence)
+    return stream.tell()
+  except Exception as e:
+    logging.getLogger(_package).error("Seeking in {} failed: {}".format(stream, e))
+    return <ctiff.toff_t> -1
+
+cdef int _stream_close(ctiff.thandle_t handle) noexcept with gil:
+  # the stream belongs to the caller, it is only flushed
+  stream = <object> handle
+  try:
+    if hasattr(stream, "flush"):
+      stream.flush()
+  except Exception as e:
+    logging.getLogger(_package).error("Flushing {} failed: {}".format(stream, e))
+    return -1
+  return 0
+
+cdef ctiff.toff_t _stream_size(ctiff.thandle_t handle) noexcept with gil:
+  stream = <object> handle
+  try:
+    pos = stream.tell()
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(pos)
+    return size
+  except Exception as e:
+    logging.getLogger(_package).error("Getting the size of {} failed: {}".format(stream, e))
+    return 0
+
+cdef int _stream_map(ctiff.thandle_t handle, ctiff.tdata_t* base, ctiff.toff_t* size) noexcept nogil:
+  return 0
+
+cdef void _stream_unmap(ctiff.thandle_t handle, ctiff.tdata_t base, ctiff.toff_t size) noexcept nogil:
+  pass
+
 cpdef object rebuild(data):
-    filename, file_mode, bigtiff, encoding, current_page = data
-    obj = Tiff(filename, file_mode, bigtiff, encoding)
+    filename, file_mode, bigtiff, encoding, current_page = data[:5]
+    tile_cache = data[5] if len(data) > 5 else None
+    obj = Tiff(filename, file_mode, bigtiff, encoding, tile_cache=tile_cache)
     obj.set_page(current_page)
     return obj
 
@@ -370,19 +652,58 @@ cdef class Tiff:
     numpy.ndarray
     (200, 50)
 
+  Instead of a filename, an in-memory tiff (bytes, bytearray, memoryview or any other buffer) can be read.
+  The buffer is not copied. A file-like object (e.g. io.BytesIO) can be used for reading and writing.
+  A `pytiff.ByteSource` (e.g. `pytiff.HTTPRangeSource`) is read through a `pytiff.BlockReader`,
+  which caches blocks and merges the requests for the tiles of a chunk.
+
+  Examples:
+    >>> with pytiff.Tiff(response.content) as f:
+    >>>   chunk = f[100:300, 50:100]
+    >>> stream = io.BytesIO()
+    >>> with pytiff.Tiff(stream, "w") as f:
+    >>>   f.write(data)
+    >>> tiff_bytes = stream.getvalue()
+
+  Decoded tiles can be shared between handles and processes with a tile cache, e.g. `pytiff.SharedTileCache`,
+  or kept across restarts with `pytiff.DiskTileCache`. The cache is pickled with the Tiff object.
+
+  Examples:
+    >>> cache = pytiff.SharedTileCache(size=2**30)
+    >>> f = pytiff.Tiff("tiff_file.tif", tile_cache=cache)
+
   Args:
-    filename (string): The filename of the tiff file.
+    filename (string, buffer or file-like): The filename of the tiff file, an in-memory tiff or a file-like object.
     file_mode (string): File mode either "w" for writing (old data is deleted), "a" for appending or "r" for reading. Default: "r".
     bigiff (bool): If True the file is assumed to be bigtiff. Default: False.
     encoding (string): Optional string encoding name to enable Unicode support for "ascii" tags. Default: None (ascii tags are always bytes).
+    tile_cache (object): Optional cache of decoded tiles with methods get(key, out) and put(key, tile). Only files with a filename are cached. Default: None.
+    write_queue (int): In write mode, number of tiles or row blocks that can be queued for a background writer thread.
+                       Encoding and writing then overlap with the caller, which blocks only if the queue is full.
+                       Errors of the writer are raised by save_page, write or close. Default: 0 (write synchronously)
+    byteorder (string): In write mode, "<" writes a little endian and ">" a big endian file. Default: None (native byte order)
   """
   cdef ctiff.TIFF* tiff_handle
   cdef public short samples_per_pixel
   cdef short[:] n_bits_view
   cdef unsigned short[:] extra_samples
   cdef short sample_format, n_pages, _write_mode_n_pages
+  cdef short _packed_bits
+  cdef unsigned short _planar_config
+  cdef unsigned short _compression, _predictor
+  cdef object _tile_byte_counts
+  cdef bint _skip_empty, _wrote_tile
+  cdef public object fill_value
+  cdef object _writer
   cdef bool closed, cached, _unsaved_page
   cdef unsigned int image_width, image_length, tile_width, tile_length
+  cdef unsigned int image_depth, tile_depth
+  cdef bint _volume
+  cdef bint _fast_read, _prefetch
+  cdef short _n_samples
+  cdef object _read_dtype
+  cdef np.ndarray _tile_buffer
+  cdef np.ndarray _tile_view
   cdef object cache, logger
   cdef public object filename
   cdef object file_mode
@@ -391,32 +712,95 @@ cdef class Tiff:
   cdef _dtype_write
   cdef object _singlepage
   cdef object _pages
-
-  def __cinit__(self, filename, file_mode="r", bigtiff=False, encoding=None):
+  cdef object _source
+  cdef object _open_mode
+  cdef np.ndarray _source_buffer
+  cdef _MemoryFile _memory_file
+  cdef public object tile_cache
+  cdef object _file_id
+
+  def __cinit__(self, filename, file_mode="r", bigtiff=False, encoding=None, tile_cache=None, write_queue=0,
+                byteorder=None):
     if bigtiff:
       file_mode += "8"
-    tmp_filename = <string> filename
-    tmp_mode = <string> file_mode
     self.closed = True
-    self.filename = tmp_filename
-    self.file_mode = tmp_mode
+    self.file_mode = <string> file_mode
+    if byteorder is not None and file_mode != "r":
+      if byteorder not in ("<", ">"):
+        raise ValueError("Unknown byte order: {}. Use '<' or '>'".format(byteorder))
+      # libtiff modifier for the byte order of new files
+      file_mode += "l" if byteorder == "<" else "b"
+    self._open_mode = file_mode
+    tmp_mode = <string> file_mode
     self.encoding = encoding
     self._write_mode_n_pages = 0
+    self._packed_bits = 0
+    self._planar_config = 1
+    self._compression = NO_COMPRESSION
+    self._predictor = 1
+    self.image_depth = 1
+    self.tile_depth = 1
+    self._volume = False
+    self._fast_read = False
+    self._tile_byte_counts = None
+    self._skip_empty = False
+    self._wrote_tile = False
+    self.fill_value = 0
     self.n_pages = 0
     self._singlepage = False
     self._pages = None
-    self.tiff_handle = ctiff.TIFFOpen(tmp_filename.c_str(), tmp_mode.c_str())
-    if self.tiff_handle is NULL:
-      raise IOError("file not found!")
+    self._source = None
+    self.filename = None
+    self.tile_cache = tile_cache
+    self._file_id = None
+    self._writer = None
+    if _is_tiff_buffer(filename):
+      if self.file_mode != "r":
+        raise ValueError("In-memory buffers can only be read. Use a file-like object (e.g. io.BytesIO) for writing.")
+      self._open_memory(filename)
+    elif hasattr(filename, "read_range"):
+      self._open_stream(BlockReader(filename))
+    elif hasattr(filename, "read") or hasattr(filename, "write"):
+      self._open_stream(filename)
+    else:
+      tmp_filename = <string> filename
+      self.filename = tmp_filename
+      self.tiff_handle = ctiff.TIFFOpen(tmp_filename.c_str(), tmp_mode.c_str())
+      if self.tiff_handle is NULL:
+        raise IOError("file not found!")
     self.closed = False
     self._unsaved_page = False
+    if write_queue and self.file_mode != "r":
+      self._writer = BackgroundWriter(write_queue)
 
     self.logger = logging.getLogger(_package)
-    self.logger.debug("Tiff object created. file: {}".format(filename))
+    self.logger.debug("Tiff object created. file: {}".format(self.filename if self.filename is not None else type(filename)))
     cdef np.ndarray[np.int16_t, ndim=1] write_pages_buffer = np.zeros(2, dtype=np.int16)
     if self.file_mode == "r":
       self._init_page()
 
+  cdef _open_memory(self, data):
+    """Open an in-memory tiff without copying it."""
+    self._source = data
+    self._source_buffer = np.frombuffer(data, dtype=np.uint8)
+    self._memory_file.data = <char*> self._source_buffer.data
+    self._memory_file.size = self._source_buffer.shape[0]
+    self._memory_file.pos = 0
+    self.tiff_handle = ctiff.TIFFClientOpen("<memory>", "r", <ctiff.thandle_t> &self._memory_file,
+        _memory_read, _memory_write, _memory_seek, _memory_close, _memory_size, _memory_map, _memory_unmap)
+    if self.tiff_handle is NULL:
+      raise IOError("Could not read tiff from memory!")
+
+  cdef _open_stream(self, stream):
+    """Open a file-like object. The object is used, but not closed by this class."""
+    self._source = stream
+    tmp_mode = <string> self._open_mode
+    tmp_name = <string> str(getattr(stream, "name", "<stream>"))
+    self.tiff_handle = ctiff.TIFFClientOpen(tmp_name.c_str(), tmp_mode.c_str(), <ctiff.thandle_t> stream,
+        _stream_read, _stream_write, _stream_seek, _stream_close, _stream_size, _stream_map, _stream_unmap)
+    if self.tiff_handle is NULL:
+      raise IOError("Could not open tiff from {}!".format(stream))
+
   def _init_page(self):
     """Initialize page specific attributes."""
     self.logger.debug("_init_page called.")
@@ -429,14 +813,22 @@ cdef class Tiff:
     cdef np.ndarray[np.int16_t, ndim=1] bits_buffer = np.zeros(self.samples_per_pixel, dtype=np.int16)
     err = ctiff.TIFFGetField(self.tiff_handle, tags.bits_per_sample, <ctiff.ttag_t*>bits_buffer.data)
     if err != 1:
-        self.logger.warn("[FAIL] Could not read bits per sample tag!")
+        # the default of the tiff specification, e.g. for bilevel images
+        self.logger.debug("[FAIL] Could not read bits per sample tag! 1 is assumed!")
+        bits_buffer[:] = 1
     self.n_bits_view = bits_buffer
+    # samples that do not fill whole bytes are packed and have to be unpacked after decoding
+    self._packed_bits = bits_buffer[0] if bits_buffer[0] % 8 else 0
     self.logger.debug("[SUCCESS] read bits per sample")
 
     self.sample_format = 1
     ctiff.TIFFGetField(self.tiff_handle, tags.sample_format, &self.sample_format)
     self.logger.debug("[SUCCESS] read sample format")
 
+    self._planar_config = 1
+    ctiff.TIFFGetField(self.tiff_handle, tags.planar_configuration, &self._planar_config)
+    self.logger.debug("[SUCCESS] read planar configuration")
+
     ctiff.TIFFGetField(self.tiff_handle, tags.image_width, &self.image_width)
     self.logger.debug("[SUCCESS] read image width")
     ctiff.TIFFGetField(self.tiff_handle, tags.image_length, &self.image_length)
@@ -447,6 +839,20 @@ cdef class Tiff:
     ctiff.TIFFGetField(self.tiff_handle, tags.tile_length, &self.tile_length)
     self.logger.debug("[SUCCESS] read tile length")
 
+    # volumetric images have an image depth and tiles with a tile depth
+    self.image_depth = 1
+    self.tile_depth = 1
+    ctiff.TIFFGetField(self.tiff_handle, tags.image_depth, &self.image_depth)
+    ctiff.TIFFGetField(self.tiff_handle, tags.tile_depth, &self.tile_depth)
+    self.image_depth = max(self.image_depth, 1)
+    self.tile_depth = max(self.tile_depth, 1)
+    self._volume = self.image_depth > 1
+    self.logger.debug("[SUCCESS] read image depth")
+    self._compression = NO_COMPRESSION
+    self._predictor = 1
+    ctiff.TIFFGetField(self.tiff_handle, tags.compression, &self._compression)
+    ctiff.TIFFGetField(self.tiff_handle, tags.predictor, &self._predictor)
+
     # get extra samples
     cdef unsigned short* _extra = NULL
     cdef unsigned short nextra;
@@ -464,6 +870,30 @@ cdef class Tiff:
     # read tags for new page
     self.read_tags()
     self.cached = False
+    # tiles with zero byte count are not stored in the file
+    counts = dict.get(self.tags, tags.tile_byte_counts)
+    self._tile_byte_counts = None if counts is None else np.atleast_1d(counts)
+
+    # layout of the page for read_patch, so small reads do not evaluate the properties again
+    self._n_samples = self.n_samples
+    try:
+      self._read_dtype = np.dtype(self.dtype)
+    except KeyError:
+      # samples without a numpy type (e.g. complex) can not be read, but the tags can
+      self._read_dtype = None
+    self._fast_read = (self._read_dtype is not None and self.file_mode.startswith("r") and self.is_tiled()
+                       and self.tile_width > 0 and self._planar_config != 2 and not self._volume)
+    self._prefetch = self._source is not None and hasattr(self._source, "prefetch")
+    self._tile_buffer = None
+    self._tile_view = None
+    # missing tiles are filled with the gdal nodata value, if the page has one
+    self.fill_value = 0
+    nodata = _read_nodata(self.tiff_handle)
+    if nodata is not None and self._read_dtype is not None:
+      try:
+        self.fill_value = self._read_dtype.type(float(nodata))
+      except ValueError:
+        self.logger.warn("Invalid gdal nodata value: {}".format(nodata))
 
   def __reduce__(self):
       if "w" in self.file_mode or "a" in self.file_mode:
@@ -472,7 +902,13 @@ cdef class Tiff:
       bigtiff = False
       if "8" in self.file_mode:
           bigtiff = True
-      data = self.filename, self.file_mode, bigtiff, self.encoding, self.current_page
+      filename = self.filename
+      if filename is None:
+          if self._source_buffer is None:
+              raise TypeError("Tiff objects reading from file-like objects can not be pickled")
+          # in-memory tiffs are pickled with their data
+          filename = self._source_buffer.tobytes()
+      data = filename, self.file_mode, bigtiff, self.encoding, self.current_page, self.tile_cache
       return rebuild, (data,)
 
   @property
@@ -491,8 +927,18 @@ cdef class Tiff:
       if self._pages is not None:
         for p in self._pages:
             p.close()
+      error = None
+      if self._writer is not None:
+        # queued tiles are written before the file is closed
+        try:
+          self._writer.close()
+        except Exception as e:
+          error = e
+        self._writer = None
       ctiff.TIFFClose(self.tiff_handle)
       self.closed = True
+      if error is not None:
+        raise error
       return
 
   def __dealloc__(self):
@@ -501,6 +947,11 @@ cdef class Tiff:
       if self._pages is not None:
           for p in self._pages:
               p.close()
+      if self._writer is not None:
+        try:
+          self._writer.close()
+        except Exception:
+          self.logger.error("Writing a tile failed. file: {}".format(self.filename))
       ctiff.TIFFClose(self.tiff_handle)
 
   @property
@@ -526,8 +977,12 @@ cdef class Tiff:
 
       This is equal to:
       `(number_of_rows, number_of_columns)`
+
+      Volumetric images have the size `(image depth, image height, image width)`.
     """
     size = self.image_length, self.image_width
+    if self._volume:
+      size = (self.image_depth,) + size
 
     if self.samples_per_pixel > 1:
         size += (self.samples_per_pixel,)
@@ -554,12 +1009,14 @@ cdef class Tiff:
       uint32 array. One value is containing all four values of an RGBA image. Thus the dtype of the numpy array
       is uint8.
 
+      Images with separate sample planes (planar configuration 2) are read per sample, their dtype is the type of the first sample.
+
       If the mode is 'greyscale', the dtype is the type of the first sample.
       Since greyscale images only have one sample per pixel, this resembles the general dtype.
     """
     if "a" in self.file_mode or "w" in self.file_mode:
       return self._dtype_write.type
-    if self.mode == "rgb":
+    if self.mode == "rgb" and self._planar_config != 2:
       self.logger.debug("RGB Image assumed for dtype.")
       return np.uint8
     return TYPE_MAP[self.sample_format][self.n_bits[0]]
@@ -582,9 +1039,12 @@ cdef class Tiff:
     if self._singlepage:
         raise SinglePageError()
     # if we are already on the page, we can save quite a bit of time by not re-reading all the tags and stuff.
-    if self.current_page == value:
+    current = self.current_page
+    if current == value:
         return
-    ctiff.TIFFSetDirectory(self.tiff_handle, value)
+    # reading the next directory avoids walking the whole directory chain
+    if value != current + 1 or not ctiff.TIFFReadDirectory(self.tiff_handle):
+      ctiff.TIFFSetDirectory(self.tiff_handle, value)
     self._init_page()
 
   @property
@@ -619,7 +1079,12 @@ cdef class Tiff:
 
   @property
   def n_samples(self):
-    cdef short samples_in_file = self.samples_per_pixel - self.extra_samples.size
+    """Number of samples that are read. Trailing alpha samples are dropped, unspecified extra samples are data."""
+    cdef short samples_in_file = self.samples_per_pixel
+    for i in range(self.extra_samples.size - 1, -1, -1):
+      if self.extra_samples[i] == 0:
+        break
+      samples_in_file -= 1
     return samples_in_file
 
   def is_tiled(self):
@@ -630,6 +1095,107 @@ cdef class Tiff:
     else:
         return False
 
+  def nonempty_tiles(self, sample=0):
+    """Positions of the tiles of the current page that contain data.
+
+    Tiles written with `skip_empty=True` are not stored in the file (their byte count is zero).
+    They are found from the tile byte counts, so background can be skipped without reading pixel data.
+
+    Args:
+      sample (int): sample plane for images with separate sample planes. Default: 0
+
+    Returns:
+      np.ndarray: N x 2 array with the (y, x) pixel positions of the upper left corners of the tiles.
+
+    Examples:
+      >>> with pytiff.Tiff("slide.tif") as f:
+      >>>   for y, x in f.nonempty_tiles():
+      >>>     tile = f[y:y + 256, x:x + 256]
+    """
+    if not self.is_tiled():
+      raise NotTiledError("Image is not tiled!")
+    n_y = int(ceil(float(self.image_length) / self.tile_length))
+    n_x = int(ceil(float(self.image_width) / self.tile_width))
+    ys, xs = np.mgrid[0:n_y, 0:n_x]
+    positions = np.stack([ys.ravel() * self.tile_length, xs.ravel() * self.tile_width], axis=1)
+    counts = self._tile_byte_counts
+    if counts is None:
+      return positions
+    # planes are stored one after the other
+    start = sample * n_y * n_x if self._planar_config == 2 else 0
+    return positions[counts[start:start + n_y * n_x] > 0]
+
+  def iter_masked_tiles(self, mask, mask_scale=None, workers=1):
+    """Decode the tiles of the current page that intersect a region of interest mask.
+
+    The mask is mapped onto the tile grid, only tiles under a set mask pixel are decoded.
+    Tiles are read in the order of their file offsets; with several workers every thread uses an own file handle.
+
+    Args:
+      mask (array_like): 2D boolean mask covering the whole page, usually at a low resolution.
+      mask_scale (float or tuple): number of image pixels per mask pixel. Default: None (derived from the shapes)
+      workers (int): number of threads decoding tiles. Default: 1
+
+    Returns:
+      generator: tuples (y, x, tile) with the position of the tile in the page. Tiles at the border are cropped to the page.
+
+    Examples:
+      >>> with pytiff.Tiff("slide.tif") as f:
+      >>>   for y, x, tile in f.iter_masked_tiles(tissue_mask, mask_scale=64, workers=4):
+      >>>     predict(tile)
+    """
+    if not self.is_tiled():
+      raise NotTiledError("Image is not tiled!")
+    selected = tiles_in_mask(mask, (self.image_length, self.image_width), (self.tile_length, self.tile_width), mask_scale)
+    ty, tx = np.nonzero(selected)
+    offsets = dict.get(self.tags, tags.tile_offsets)
+    if offsets is not None and ty.size:
+      # chunky tiles are numbered row by row
+      offsets = np.atleast_1d(offsets)[ty * selected.shape[1] + tx]
+      order = np.argsort(offsets, kind="stable")
+      ty, tx = ty[order], tx[order]
+    positions = [(int(y) * self.tile_length, int(x) * self.tile_width) for y, x in zip(ty, tx)]
+    return self._iter_tiles(positions, workers)
+
+  def _iter_tiles(self, positions, workers):
+    length, width = self.tile_length, self.tile_width
+    if workers is None or workers <= 1:
+      for y, x in positions:
+        yield y, x, self.read((y, y + length), (x, x + width))
+      return
+    page = self.current_page
+    readers = ReaderPool(self._reopen)
+
+    def read_tile(position):
+      y, x = position
+      return y, x, readers.get(page).read((y, y + length), (x, x + width))
+
+    try:
+      for result in ordered_map(read_tile, positions, workers):
+        yield result
+    finally:
+      readers.close()
+
+  def read_masked(self, mask, mask_scale=None, fill=0, workers=1):
+    """Read the current page, decoding only the tiles that intersect a region of interest mask.
+
+    Args:
+      mask (array_like): 2D boolean mask covering the whole page, usually at a low resolution.
+      mask_scale (float or tuple): number of image pixels per mask pixel. Default: None (derived from the shapes)
+      fill (scalar): value of the pixels in tiles outside the mask. Default: 0
+      workers (int): number of threads decoding tiles. Default: 1
+
+    Returns:
+      np.ndarray: the page, tiles outside the mask are set to fill.
+    """
+    shape = (self.image_length, self.image_width)
+    if self.n_samples > 1:
+      shape += (self.n_samples,)
+    out = np.full(shape, fill, dtype=self.dtype)
+    for y, x, tile in self.iter_masked_tiles(mask, mask_scale, workers):
+      out[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+    return out
+
   def __enter__(self):
     return self
 
@@ -646,7 +1212,9 @@ cdef class Tiff:
     """
     if self.cached:
       return self.cache
-    if self.n_samples > 1:
+    if self._planar_config == 2 and self._can_read_scanlines():
+      data = self._load_scanlines((0, self.image_length), (0, self.image_width))
+    elif self.n_samples > 1:
       data = self._load_all_rgba()
     else:
       data = self._load_all_grey()
@@ -669,6 +1237,8 @@ cdef class Tiff:
   def _load_all_grey(self):
     """Loads an image at once. Returns a greyscale image."""
     self.logger.debug("Loading a whole greyscale image.")
+    if self._packed_bits:
+      return self._load_scanlines((0, self.image_length), (0, self.image_width))
     cdef np.ndarray total = np.zeros(self.size, dtype=self.dtype)
     cdef np.ndarray buffer = np.zeros(self.image_width, dtype=self.dtype)
 
@@ -677,51 +1247,167 @@ cdef class Tiff:
       total[i] = buffer
     return total
 
+  def _can_read_scanlines(self):
+    """Return True if rows of a striped image can be decoded with TIFFReadScanline."""
+    cdef unsigned short photometric = 1, planar_config = 1, compression = NO_COMPRESSION
+    ctiff.TIFFGetField(self.tiff_handle, tags.photometric, &photometric)
+    ctiff.TIFFGetField(self.tiff_handle, tags.planar_configuration, &planar_config)
+    ctiff.TIFFGetField(self.tiff_handle, tags.compression, &compression)
+    # palette, ycbcr and jpeg encoded images need the rgba interface
+    return photometric in (0, 1, 2) and compression != 7 and (planar_config == 1 or not self._packed_bits)
+
+  def _load_scanlines(self, y_range, x_range, channels=None):
+    """Load rows of a striped image without decoding the whole page.
+
+    For separate sample planes only the planes of the given channels are decoded.
+    """
+    self.logger.debug("Loading scanlines {} to {}.".format(y_range[0], y_range[1]))
+    dtype = TYPE_MAP[self.sample_format][self.n_bits[0]]
+    cdef np.ndarray buffer = np.zeros((self.image_width, self.samples_per_pixel), dtype=dtype)
+    cdef np.ndarray total = np.zeros((y_range[1] - y_range[0], x_range[1] - x_range[0], self.n_samples), dtype=dtype)
+    cdef np.ndarray raw
+    cdef unsigned int row, first_row = y_range[0]
+    cdef unsigned short sample
+    if self._planar_config == 2:
+      selected = list(range(self.n_samples)) if channels is None else channels
+      buffer = np.zeros(self.image_width, dtype=dtype)
+      total = np.zeros((y_range[1] - y_range[0], x_range[1] - x_range[0], len(selected)), dtype=dtype)
+      for k, sample in enumerate(selected):
+        for row in range(y_range[0], y_range[1]):
+          ctiff.TIFFReadScanline(self.tiff_handle, <void*> buffer.data, row, sample)
+          total[row - y_range[0], :, k] = buffer[x_range[0]:x_range[1]]
+    elif self._packed_bits:
+      # read the packed rows and unpack only the requested columns
+      raw = np.zeros((y_range[1] - y_range[0], ctiff.TIFFScanlineSize(self.tiff_handle)), dtype=np.uint8)
+      for row in range(y_range[0], y_range[1]):
+        ctiff.TIFFReadScanline(self.tiff_handle, <void*> (raw.data + (row - first_row) * raw.strides[0]), row, 0)
+      width = x_range[1] - x_range[0]
+      values = unpack_samples(raw, self._packed_bits, width * self.samples_per_pixel,
+                              start=x_range[0] * self.samples_per_pixel, dtype=dtype)
+      total[:] = values.reshape(raw.shape[0], width, self.samples_per_pixel)[:, :, :self.n_samples]
+    else:
+      for row in range(y_range[0], y_range[1]):
+        ctiff.TIFFReadScanline(self.tiff_handle, <void*> buffer.data, row, 0)
+        total[row - y_range[0]] = buffer[x_range[0]:x_range[1], :self.n_samples]
+    if total.shape[2] == 1 and channels is None:
+      return total[:, :, 0]
+    return total
+
+  def _read_rows(self, y_range, x_range=None):
+    """Load a chunk while decoding as few rows as possible.
+
+    Tiled images are read tile by tile, striped images row by row or, if they need the rgba interface, strip by strip.
+    """
+    if x_range is None:
+      x_range = (0, self.image_width)
+    if self.is_tiled():
+      return self._load_tiled(y_range, x_range)
+    if self._can_read_scanlines() or self.n_samples == 1:
+      # _load_all reads single sample pages (e.g. palette indices) by scanline as well
+      return self._load_scanlines(y_range, x_range)
+    return self._load_rgba_strips(y_range, x_range)
+
+  def _load_rgba_strips(self, y_range, x_range):
+    """Load rows of a striped image with the rgba interface (jpeg, ycbcr), decoding only the strips of the rows.
+
+    Returns the same samples as _load_all_rgba.
+    """
+    cdef unsigned int rows_per_strip = self.image_length
+    cdef unsigned int strip_row, n_rows, ya, yb
+    ctiff.TIFFGetField(self.tiff_handle, tags.rows_per_strip, &rows_per_strip)
+    rows_per_strip = min(rows_per_strip, self.image_length)
+    cdef np.ndarray buffer = np.zeros((rows_per_strip, self.image_width), dtype=np.uint32)
+    cdef np.ndarray total = np.zeros((y_range[1] - y_range[0], x_range[1] - x_range[0], self.samples_per_pixel), dtype=np.uint8)
+    strip_row = y_range[0] // rows_per_strip * rows_per_strip
+    while strip_row < y_range[1]:
+      if ctiff.TIFFReadRGBAStrip(self.tiff_handle, strip_row, <unsigned int*> buffer.data) != 1:
+        raise IOError("Could not decode the strip at row {}".format(strip_row))
+      # the raster of a strip starts with its bottom row
+      n_rows = min(rows_per_strip, self.image_length - strip_row)
+      rows = np.flipud(buffer[:n_rows])
+      ya = max(y_range[0], strip_row)
+      yb = min(y_range[1], strip_row + n_rows)
+      total[ya - y_range[0]:yb - y_range[0]] = _get_rgb(rows[ya - strip_row:yb - strip_row, x_range[0]:x_range[1]],
+                                                        self.samples_per_pixel)
+      strip_row += rows_per_strip
+    return total[:, :, :self.n_samples]
+
   def _load_tiled(self, y_range, x_range):
-    self.logger.debug("Loading tiled image. RGBA is assumed as RGBA,RGBA... for each pixel.")
-    cdef unsigned int z_size, start_x, start_y, start_x_offset, start_y_offset
-    cdef unsigned int end_x, end_y, end_x_offset, end_y_offset
     if not self.tile_width:
       raise NotTiledError("Image is not tiled!")
+    if not self._fast_read:
+      return self.read(y_range, x_range)
+    return self._read_patch(y_range[0], x_range[0], y_range[1] - y_range[0], x_range[1] - x_range[0])
+
+  def read_patch(self, long y, long x, long h, long w):
+    """Read a patch of h x w pixels with its upper left corner at (y, x).
+
+    This is the fast path for small reads of tiled images. The layout of the page is cached when the page is set
+    and all tiles are decoded into one reused buffer, so reading a patch inside one tile costs little more
+    than decoding the tile. Patches reaching over the image border are clipped.
+    Other images are read with `read`. If the tiles can not be decoded one by one, the image is loaded
+    as a whole, as with slicing.
+
+    Args:
+      y, x (int): row and column of the upper left corner.
+      h, w (int): number of rows and columns.
+
+    Returns:
+      np.ndarray: array of shape (h, w) for greyscale images, else (h, w, samples).
 
-    # use rgba if no greyscale image
-    z_size = self.n_samples
-
-    shape = (y_range[1] - y_range[0], x_range[1] - x_range[0], z_size)
-
-    start_x = x_range[0] // self.tile_width
-    start_y = y_range[0] // self.tile_length
-    end_x = ceil(float(x_range[1]) / self.tile_width)
-    end_y = ceil(float(y_range[1]) / self.tile_length)
-    offset_x = start_x * self.tile_width
-    offset_y = start_y * self.tile_length
-
-    large = (end_y - start_y) * self.tile_length, (end_x - start_x) * self.tile_width, z_size
-
-    self.logger.debug("loading tiled, dtype: {}".format(self.dtype))
-    cdef np.ndarray large_buf = np.zeros(large, dtype=self.dtype).squeeze()
-    cdef np.ndarray arr_buf = np.zeros(shape, dtype=self.dtype).squeeze()
-    self.logger.debug("large_buf dtype: {}".format(large_buf.dtype))
-    self.logger.debug("arr_buf dtype: {}".format(arr_buf.dtype))
-    cdef unsigned int np_x, np_y
-    np_x = 0
-    np_y = 0
-    for current_y in np.arange(start_y, end_y):
-      np_x = 0
-      for current_x in np.arange(start_x, end_x):
-        real_x = current_x * self.tile_width
-        real_y = current_y * self.tile_length
-        tmp = self._read_tile(real_y, real_x)
-        e_x = np_x + tmp.shape[1]
-        e_y = np_y + tmp.shape[0]
-
-        large_buf[np_y:e_y, np_x:e_x] = tmp
-        np_x += self.tile_width
-
-      np_y += self.tile_length
-
-    arr_buf = large_buf[y_range[0]-offset_y:y_range[1]-offset_y, x_range[0]-offset_x:x_range[1]-offset_x]
-    return arr_buf
+    Examples:
+      >>> with pytiff.Tiff("slide.tif") as f:
+      >>>   patch = f.read_patch(1024, 2048, 64, 64)
+    """
+    if not self._fast_read:
+      return self.read((y, y + h), (x, x + w))
+    try:
+      return self._read_patch(y, x, h, w)
+    except NotTiledError:
+      return self._get((y, y + h), (x, x + w))
+
+  cdef np.ndarray _read_patch(self, long y, long x, long h, long w):
+    """Read a patch of a tiled page with contiguous samples. Raises NotTiledError if a tile can not be decoded."""
+    if y < 0 or x < 0:
+      raise IndexError("Invalid patch ({}, {}, {}, {})".format(y, x, h, w))
+    cdef long y1 = max(min(y + h, <long> self.image_length), y)
+    cdef long x1 = max(min(x + w, <long> self.image_width), x)
+    cdef np.ndarray out
+    if self._n_samples > 1:
+      out = np.empty((y1 - y, x1 - x, self._n_samples), dtype=self._read_dtype)
+    else:
+      out = np.empty((y1 - y, x1 - x), dtype=self._read_dtype)
+    self._read_patch_into(out, y, x, y1, x1)
+    return out
+
+  cdef _read_patch_into(self, np.ndarray out, long y0, long x0, long y1, long x1):
+    """Copy the pixels [y0:y1, x0:x1] of a tiled page with contiguous samples into out."""
+    cdef long tile_length = self.tile_length, tile_width = self.tile_width
+    cdef long tile_y, tile_x, ya, yb, xa, xb
+    if self._tile_buffer is None:
+      # libtiff writes all samples, including extra samples
+      self._tile_buffer = np.empty((tile_length, tile_width, self.samples_per_pixel), dtype=self._read_dtype)
+      if self._n_samples > 1:
+        self._tile_view = self._tile_buffer[:, :, :self._n_samples]
+      else:
+        self._tile_view = self._tile_buffer[:, :, 0]
+    cdef np.ndarray tile = self._tile_buffer
+    cdef np.ndarray view = self._tile_view
+    if self._prefetch:
+      self._prefetch_tiles(y0 // tile_length, (y1 + tile_length - 1) // tile_length,
+                           x0 // tile_width, (x1 + tile_width - 1) // tile_width)
+    tile_y = y0 // tile_length * tile_length
+    while tile_y < y1:
+      ya = max(y0, tile_y)
+      yb = min(y1, tile_y + tile_length)
+      tile_x = x0 // tile_width * tile_width
+      while tile_x < x1:
+        xa = max(x0, tile_x)
+        xb = min(x1, tile_x + tile_width)
+        self._read_tile_into(tile, tile_y, tile_x)
+        out[ya - y0:yb - y0, xa - x0:xb - x0] = view[ya - tile_y:yb - tile_y, xa - tile_x:xb - tile_x]
+        tile_x += tile_width
+      tile_y += tile_length
 
   def _get(self, y_range=None, x_range=None):
     """Function to load a chunk of an image.
@@ -750,15 +1436,177 @@ cdef class Tiff:
 
     return res
 
+  def _reopen(self):
+    """Open an independent read handle for the same file or buffer."""
+    if self.filename is not None:
+      return Tiff(self.filename, "r", encoding=self.encoding, tile_cache=self.tile_cache)
+    if self._source_buffer is not None:
+      return Tiff(self._source, "r", encoding=self.encoding, tile_cache=self.tile_cache)
+    if hasattr(self._source, "clone"):
+      return Tiff(self._source.clone(), "r", encoding=self.encoding, tile_cache=self.tile_cache)
+    raise IOError("A file-like object can not be opened twice")
+
+  def _prefetch_tiles(self, start_y, end_y, start_x, end_x, samples=(0,), start_z=0, end_z=1):
+    """Pass the byte ranges of a block of tiles to the byte source, so they can be fetched with few requests."""
+    offsets = dict.get(self.tags, tags.tile_offsets)
+    counts = dict.get(self.tags, tags.tile_byte_counts)
+    if offsets is None or counts is None:
+      return
+    offsets = np.atleast_1d(offsets)
+    counts = np.atleast_1d(counts)
+    ranges = []
+    for sample in samples:
+      for tz in range(start_z, end_z):
+        for ty in range(start_y, end_y):
+          for tx in range(start_x, end_x):
+            index = ctiff.TIFFComputeTile(self.tiff_handle, tx * self.tile_width, ty * self.tile_length,
+                                          tz * self.tile_depth, sample)
+            if index < counts.size:
+              ranges.append((offsets[index], counts[index]))
+    self._source.prefetch(ranges)
+
+  def _ranges(self, y_slice, x_slice):
+    """Convert slices to (start, stop) ranges clipped to the image size."""
+    y_start = y_slice.start if y_slice.start is not None else 0
+    y_stop = y_slice.stop if y_slice.stop is not None and y_slice.stop < self.image_length else self.image_length
+    x_start = x_slice.start if x_slice.start is not None else 0
+    x_stop = x_slice.stop if x_slice.stop is not None and x_slice.stop < self.image_width else self.image_width
+    return (y_start, y_stop), (x_start, x_stop)
+
+  def _is_stack_index(self, index):
+    """Three slices on a greyscale multipage file index (pages, rows, columns)."""
+    if len(index) != 3 or self._singlepage or self.n_samples > 1:
+      return False
+    if not all(isinstance(i, slice) for i in index):
+      return False
+    return self.number_of_pages > 1
+
+  def read_stack(self, pages=None, y_range=None, x_range=None, out=None, workers=1):
+    """Read the same region from several pages into a 3 (or 4) dimensional array.
+
+    Multipage files can also be indexed with three slices (pages, rows, columns) for greyscale images
+    or four slices (pages, rows, columns, samples), e.g. `f[0:10, 100:200, 100:200]`.
+
+    Args:
+      pages (int, slice or list): selected pages. Default: None (all pages)
+      y_range (tuple): (start, stop) rows of the region. Default: None (all rows)
+      x_range (tuple): (start, stop) columns of the region. Default: None (all columns)
+      out (np.ndarray): optional output array of shape (pages, length, width[, samples]), which is filled in place.
+      workers (int): number of threads. Each thread uses an own file handle. Default: 1
+
+    Returns:
+      np.ndarray: array of shape (pages, length, width[, samples])
+
+    Examples:
+      >>> with pytiff.Tiff("stack.tif") as f:
+      >>>   stack = f.read_stack(slice(0, 50), (100, 356), (200, 456), workers=4)
+    """
+    if self.file_mode != "r":
+      raise Exception("Reading is only supported in read mode")
+    if self._singlepage:
+      page_indices = page_list(pages, 1)
+      page_indices = [self.current_page for p in page_indices]
+    else:
+      page_indices = page_list(pages, self.number_of_pages)
+    if y_range is None:
+      y_range = (0, self.image_length)
+    if x_range is None:
+      x_range = (0, self.image_width)
+    if not page_indices:
+      raise ValueError("No pages selected")
+
+    start_page = self.current_page
+    readers = ReaderPool(self._reopen)
+
+    def read_pages(job):
+      start, chunk = job
+      if workers > 1 or self._singlepage:
+        handle = readers.get()
+      else:
+        handle = self
+      for i, p in enumerate(chunk):
+        handle.set_page(p)
+        region = handle._get(y_range, x_range)
+        if out is None:
+          return region
+        if out[start + i].shape != region.shape:
+          raise ValueError("Region of page {} has shape {}, expected {}".format(p, region.shape, out[start + i].shape))
+        out[start + i] = region
+
+    try:
+      # the first page determines the shape and dtype of the output
+      if out is None:
+        first = read_pages((0, page_indices[:1]))
+        out = np.empty((len(page_indices),) + first.shape, dtype=first.dtype)
+        out[0] = first
+        remaining = 1
+      else:
+        if len(out) != len(page_indices):
+          raise ValueError("out has {} entries, but {} pages are selected".format(len(out), len(page_indices)))
+        remaining = 0
+      # contiguous chunks of pages, so every handle walks the directories forward
+      n_chunks = max(1, min(len(page_indices) - remaining, 4 * max(workers, 1)))
+      bounds = np.linspace(remaining, len(page_indices), n_chunks + 1).astype(int)
+      jobs = [(bounds[i], page_indices[bounds[i]:bounds[i+1]]) for i in range(n_chunks) if bounds[i] < bounds[i+1]]
+      for _ in ordered_map(read_pages, jobs, workers):
+        pass
+    finally:
+      readers.close()
+      if not self._singlepage:
+        self.set_page(start_page)
+    return out
+
+  def _get_stack(self, index):
+    pages = index[0]
+    y_range, x_range = self._ranges(index[1], index[2])
+    if isinstance(pages, slice):
+      # clip the slice to the number of pages
+      pages = slice(*pages.indices(self.number_of_pages))
+    data = self.read_stack(pages, y_range, x_range)
+    if len(index) > 3 and data.ndim == 4:
+      data = data[..., index[3]]
+    if np.ndim(pages) == 0 and not isinstance(pages, slice):
+      data = data[0]
+    return data
+
+  def _get_volume(self, index):
+    """Index a volumetric image with up to three slices (depth, rows, columns) and an optional channel index."""
+    if not isinstance(index, tuple):
+      index = (index,)
+    index = tuple(index) + (slice(None),) * (3 - len(index))
+    if len(index) > 4 or not all(isinstance(i, slice) for i in index[:3]):
+      raise Exception("Only slicing is supported")
+    y_range, x_range = self._ranges(index[1], index[2])
+    data = self.read_volume((index[0].start, index[0].stop), y_range, x_range)
+    if len(index) > 3 and data.ndim == 4:
+      data = data[..., index[3]]
+    return data
+
   def __getitem__(self, index):
+    # fast path for f[y0:y1, x0:x1] and f[y0:y1] on tiled pages
+    if self._fast_read:
+      if type(index) is tuple and len(index) == 2:
+        y_slice, x_slice = index
+      else:
+        y_slice, x_slice = index, slice(None)
+      if (type(y_slice) is slice and type(x_slice) is slice and y_slice.step is None and x_slice.step is None
+          and (y_slice.start or 0) >= 0 and (x_slice.start or 0) >= 0
+          and (y_slice.stop or 0) >= 0 and (x_slice.stop or 0) >= 0):
+        return self.read_patch(y_slice.start or 0, x_slice.start or 0,
+                               self.image_length if y_slice.stop is None else y_slice.stop - (y_slice.start or 0),
+                               self.image_width if x_slice.stop is None else x_slice.stop - (x_slice.start or 0))
     self.logger.debug("__getitem__ called")
+    if self._volume:
+      return self._get_volume(index)
+    if isinstance(index, tuple) and (len(index) == 4 or self._is_stack_index(index)):
+      return self._get_stack(index)
     if not isinstance(index, tuple):
       if isinstance(index, slice):
-        index = (index, slice(None,None,None))
+        index = (index, slice(None,None,None), None)
       else:
         raise Exception("Only slicing is supported")
     elif len(index) < 3:
-      index = index[0],index[1],0
+      index = index[0],index[1],None
 
     if not isinstance(index[0], slice) or not isinstance(index[1], slice):
       raise Exception("Only slicing is supported")
@@ -775,11 +1623,275 @@ cdef class Tiff:
     if y_range[1] is None or y_range[1] > self.image_length:
       y_range[1] = self.image_length
 
+    # channel selection, ignored for greyscale images
+    channels = index[2]
+    if self.n_samples > 1 and channels is not None and not (isinstance(channels, slice) and channels == slice(None)):
+      if isinstance(channels, slice):
+        channels = list(range(self.n_samples))[channels]
+      return self.read(y_range, x_range, channels=channels)
     return self._get(y_range, x_range)
 
   def __array__(self, dtype=None):
     return self.__getitem__(slice(None))
 
+  def read(self, y_range=None, x_range=None, out=None, dtype=None, scale=None, channels=None):
+    """Read a chunk into a new or a preallocated array, optionally converting and scaling it.
+
+    Tiles are decoded into one reused buffer and written into `out` one after another, so the
+    dtype conversion and the scaling happen per tile while the data is still in the cache.
+    `out` can be any writable array of the right shape, e.g. a strided view into a batch or an array in shared memory.
+    For images with separate sample planes (planar configuration 2) only the planes of the selected channels are decoded.
+
+    Args:
+      y_range (tuple): (start, stop) of the rows. Default: None (all rows)
+      x_range (tuple): (start, stop) of the columns. Default: None (all columns)
+      out (np.ndarray): array the chunk is written to. Its shape has to be (rows, columns) for a single channel,
+                        otherwise (rows, columns, channels). Default: None (a new array is allocated)
+      dtype (np.dtype): dtype of a new array. Default: float32 if scale is given, else the dtype of the image.
+      scale (float or tuple): factor or (factor, offset), the result is data * factor + offset. Default: None
+      channels (int or list): channels that are read. An int drops the channel axis. Default: None (all channels)
+
+    Returns:
+      np.ndarray: out or the new array.
+
+    Examples:
+      >>> batch = np.empty((32, 256, 256, 3), dtype=np.float32)
+      >>> with pytiff.Tiff("rgb_tiled.tif") as f:
+      >>>   for i, (y, x) in enumerate(positions):
+      >>>     f.read((y, y + 256), (x, x + 256), out=batch[i], scale=1 / 255.)
+    """
+    if self._volume:
+      raise ValueError("The page is a volume, use read_volume")
+    y_slice = slice(*y_range) if y_range is not None else slice(None)
+    x_slice = slice(*x_range) if x_range is not None else slice(None)
+    y_range, x_range = self._ranges(y_slice, x_slice)
+    n_samples = self.n_samples
+    if channels is None:
+      selected = list(range(n_samples))
+    else:
+      selected = [int(c) for c in np.atleast_1d(channels)]
+    for c in selected:
+      if not 0 <= c < n_samples:
+        raise IndexError("Channel {} out of range, the image has {} channels".format(c, n_samples))
+    shape = (y_range[1] - y_range[0], x_range[1] - x_range[0])
+    if np.ndim(channels) == 1 or (channels is None and n_samples > 1):
+      shape += (len(selected),)
+
+    if out is None:
+      if dtype is None:
+        dtype = np.float32 if scale is not None else self.dtype
+      out = np.empty(shape, dtype=dtype)
+    else:
+      if dtype is not None and np.dtype(dtype) != out.dtype:
+        raise ValueError("dtype {} does not match the dtype of out {}".format(np.dtype(dtype), out.dtype))
+      if tuple(out.shape) != shape:
+        raise ValueError("out has shape {}, but the chunk has shape {}".format(out.shape, shape))
+
+    factor = offset = None
+    if scale is not None:
+      factor, offset = (scale, 0) if np.ndim(scale) == 0 else scale
+    select = None if selected == list(range(n_samples)) else selected
+
+    if self.is_tiled():
+      self._read_tiles_into(out, y_range, x_range, select, factor, offset)
+    elif self._planar_config == 2 and self._can_read_scanlines():
+      # only the planes of the selected channels are decoded
+      data = self._load_scanlines(y_range, x_range, channels=selected)
+      _convert_into(out, data, None, factor, offset)
+    else:
+      data = self._read_rows(y_range, x_range)
+      if data.ndim == 2:
+        data = data[:, :, None]
+      _convert_into(out, data, select, factor, offset)
+    return out
+
+  def read_packed(self, y_range=None, x_range=None):
+    """Read a chunk of a 1, 2, 4 or 12 bit image in packed form.
+
+    Every row starts at a byte boundary and the samples are stored most significant bit first,
+    like in the file. A 1 bit mask needs an eighth of the memory of a bool array.
+
+    Args:
+      y_range (tuple): (start, stop) of the rows. Default: None (all rows)
+      x_range (tuple): (start, stop) of the columns. Default: None (all columns)
+
+    The decoded bytes of the tiles or rows are copied without unpacking the samples, only chunks that do not
+    start at a byte boundary are shifted.
+
+    Returns:
+      np.ndarray: uint8 array of shape (rows, bytes per row). `pytiff.utils.unpack_samples` unpacks it.
+    """
+    if (not self._packed_bits or self._volume or self.samples_per_pixel != self.n_samples
+        or (self._planar_config == 2 and self.samples_per_pixel > 1)
+        or not (self.is_tiled() or self._can_read_scanlines())):
+      return pack_samples(self.read(y_range, x_range), self.n_bits[0])
+    y_slice = slice(*y_range) if y_range is not None else slice(None)
+    x_slice = slice(*x_range) if x_range is not None else slice(None)
+    y_range, x_range = self._ranges(y_slice, x_slice)
+    cdef long pixel_bits = self._packed_bits * self.samples_per_pixel
+    cdef long bit_start = x_range[0] * pixel_bits, bit_stop = x_range[1] * pixel_bits
+    cdef np.ndarray rows
+    cdef unsigned int row, first_row = y_range[0]
+    if self.is_tiled():
+      rows = self._read_packed_tiles(y_range, bit_start // 8, (bit_stop + 7) // 8)
+      return _crop_packed(rows, bit_start % 8, bit_stop - bit_start)
+    rows = np.zeros((y_range[1] - y_range[0], ctiff.TIFFScanlineSize(self.tiff_handle)), dtype=np.uint8)
+    for row in range(y_range[0], y_range[1]):
+      ctiff.TIFFReadScanline(self.tiff_handle, <void*> (rows.data + (row - first_row) * rows.strides[0]), row, 0)
+    return _crop_packed(rows, bit_start, bit_stop - bit_start)
+
+  cdef np.ndarray _read_packed_tiles(self, y_range, long byte_start, long byte_stop):
+    """Copy the bytes byte_start to byte_stop of the decoded rows y_range of a packed tiled page."""
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef long tile_length = self.tile_length, tile_width = self.tile_width
+    cdef long row_bytes = tile_width * self._packed_bits * self.samples_per_pixel // 8
+    cdef long y0 = y_range[0], y1 = y_range[1], ty, tx, tile_y, tile_byte, ya, yb, ba, bb
+    cdef np.ndarray raw = np.empty((tile_length, row_bytes), dtype=np.uint8)
+    cdef np.ndarray rows = np.empty((y1 - y0, byte_stop - byte_start), dtype=np.uint8)
+    cdef void* data = <void*> raw.data
+    cdef ctiff.tsize_t bytes
+    cdef unsigned int x, y
+    if self._prefetch:
+      self._prefetch_tiles(y0 // tile_length, (y1 + tile_length - 1) // tile_length,
+                           byte_start // row_bytes, (byte_stop + row_bytes - 1) // row_bytes)
+    for ty in range(y0 // tile_length, (y1 + tile_length - 1) // tile_length):
+      tile_y = ty * tile_length
+      ya = max(y0, tile_y)
+      yb = min(y1, tile_y + tile_length)
+      for tx in range(byte_start // row_bytes, (byte_stop + row_bytes - 1) // row_bytes):
+        tile_byte = tx * row_bytes
+        ba = max(byte_start, tile_byte)
+        bb = min(byte_stop, tile_byte + row_bytes)
+        x = tx * tile_width
+        y = tile_y
+        index = ctiff.TIFFComputeTile(handle, x, y, 0, 0)
+        if self._tile_byte_counts is not None and index < self._tile_byte_counts.size and self._tile_byte_counts[index] == 0:
+          # sparse tile
+          raw[:] = pack_samples(np.full((1, tile_width * self.samples_per_pixel), self.fill_value), self._packed_bits)
+        else:
+          with nogil:
+            bytes = ctiff.TIFFReadTile(handle, data, x, y, 0, 0)
+          if bytes == -1:
+            raise NotTiledError("Tiled reading not possible")
+        rows[ya - y0:yb - y0, ba - byte_start:bb - byte_start] = raw[ya - tile_y:yb - tile_y, ba - tile_byte:bb - tile_byte]
+    return rows
+
+  def _read_tiles_into(self, np.ndarray out, y_range, x_range, select, factor, offset):
+    """Decode the tiles of a chunk one by one and write them converted into out."""
+    cdef unsigned int ty, tx, tile_y, tile_x, y0, y1, x0, x1
+    cdef unsigned int start_y = y_range[0] // self.tile_length
+    cdef unsigned int start_x = x_range[0] // self.tile_width
+    cdef unsigned int end_y = ceil(float(y_range[1]) / self.tile_length)
+    cdef unsigned int end_x = ceil(float(x_range[1]) / self.tile_width)
+    cdef np.ndarray tile, target
+    planes = None
+    if self._planar_config == 2:
+      # every sample is stored in own tiles
+      planes = list(range(self.n_samples)) if select is None else select
+      tile = np.empty((self.tile_length, self.tile_width, 1), dtype=self.dtype)
+    else:
+      # tiles contain all samples, including extra samples
+      tile = np.empty((self.tile_length, self.tile_width, self.samples_per_pixel), dtype=self.dtype)
+      if select is None and self.samples_per_pixel != self.n_samples:
+        select = list(range(self.n_samples))
+    if self._source is not None and hasattr(self._source, "prefetch"):
+      self._prefetch_tiles(start_y, end_y, start_x, end_x, planes or (0,))
+    for ty in range(start_y, end_y):
+      tile_y = ty * self.tile_length
+      y0 = max(y_range[0], tile_y)
+      y1 = min(y_range[1], tile_y + self.tile_length)
+      for tx in range(start_x, end_x):
+        tile_x = tx * self.tile_width
+        x0 = max(x_range[0], tile_x)
+        x1 = min(x_range[1], tile_x + self.tile_width)
+        target = out[y0 - y_range[0]:y1 - y_range[0], x0 - x_range[0]:x1 - x_range[0]]
+        if planes is None:
+          self._read_tile_into(tile, tile_y, tile_x)
+          _convert_into(target, tile[y0 - tile_y:y1 - tile_y, x0 - tile_x:x1 - tile_x], select, factor, offset)
+          continue
+        for k, sample in enumerate(planes):
+          self._read_tile_into(tile, tile_y, tile_x, sample)
+          _convert_into(target if target.ndim == 2 else target[:, :, k:k + 1],
+                        tile[y0 - tile_y:y1 - tile_y, x0 - tile_x:x1 - tile_x], None, factor, offset)
+
+  def read_volume(self, z_range=None, y_range=None, x_range=None, out=None):
+    """Read a block of a volumetric image (image depth > 1), decoding only the 3D tiles it intersects.
+
+    Volumetric images are indexed with three slices (depth, rows, columns), e.g. `f[10:20, 100:200, 100:200]`.
+
+    Args:
+      z_range (tuple): (start, stop) of the slices. Default: None (all slices)
+      y_range (tuple): (start, stop) of the rows. Default: None (all rows)
+      x_range (tuple): (start, stop) of the columns. Default: None (all columns)
+      out (np.ndarray): optional output array of shape (slices, rows, columns[, samples]), which is filled in place.
+
+    Returns:
+      np.ndarray: array of shape (slices, rows, columns[, samples])
+
+    Examples:
+      >>> with pytiff.Tiff("volume.tif") as f:
+      >>>   block = f.read_volume((10, 74), (0, 64), (128, 192))
+    """
+    if not self.is_tiled():
+      raise NotTiledError("Volumes can only be read if they are tiled!")
+    if z_range is None:
+      z_range = (None, None)
+    z_start = z_range[0] if z_range[0] is not None else 0
+    z_stop = z_range[1] if z_range[1] is not None and z_range[1] < self.image_depth else self.image_depth
+    y_slice = slice(*y_range) if y_range is not None else slice(None)
+    x_slice = slice(*x_range) if x_range is not None else slice(None)
+    y_range, x_range = self._ranges(y_slice, x_slice)
+    shape = (max(z_stop - z_start, 0), y_range[1] - y_range[0], x_range[1] - x_range[0])
+    if self.n_samples > 1:
+      shape += (self.n_samples,)
+    if out is None:
+      out = np.empty(shape, dtype=self.dtype)
+    elif tuple(out.shape) != shape:
+      raise ValueError("out has shape {}, but the block has shape {}".format(out.shape, shape))
+    self._read_volume_into(out, (z_start, z_stop), y_range, x_range)
+    return out
+
+  def _read_volume_into(self, np.ndarray out, z_range, y_range, x_range):
+    """Decode the 3D tiles of a block one by one and write them into out."""
+    cdef unsigned int tz, ty, tx, tile_z, tile_y, tile_x, z0, z1, y0, y1, x0, x1
+    cdef unsigned int start_z = z_range[0] // self.tile_depth
+    cdef unsigned int start_y = y_range[0] // self.tile_length
+    cdef unsigned int start_x = x_range[0] // self.tile_width
+    cdef unsigned int end_z = ceil(float(z_range[1]) / self.tile_depth)
+    cdef unsigned int end_y = ceil(float(y_range[1]) / self.tile_length)
+    cdef unsigned int end_x = ceil(float(x_range[1]) / self.tile_width)
+    cdef np.ndarray tile, target
+    select = planes = None
+    if self._planar_config == 2:
+      planes = list(range(self.n_samples))
+      tile = np.empty((self.tile_depth, self.tile_length, self.tile_width, 1), dtype=self.dtype)
+    else:
+      tile = np.empty((self.tile_depth, self.tile_length, self.tile_width, self.samples_per_pixel), dtype=self.dtype)
+      if self.samples_per_pixel != self.n_samples:
+        select = list(range(self.n_samples))
+    if self._source is not None and hasattr(self._source, "prefetch"):
+      self._prefetch_tiles(start_y, end_y, start_x, end_x, planes or (0,), start_z, end_z)
+    for tz in range(start_z, end_z):
+      tile_z = tz * self.tile_depth
+      z0 = max(z_range[0], tile_z)
+      z1 = min(z_range[1], tile_z + self.tile_depth)
+      for ty in range(start_y, end_y):
+        tile_y = ty * self.tile_length
+        y0 = max(y_range[0], tile_y)
+        y1 = min(y_range[1], tile_y + self.tile_length)
+        for tx in range(start_x, end_x):
+          tile_x = tx * self.tile_width
+          x0 = max(x_range[0], tile_x)
+          x1 = min(x_range[1], tile_x + self.tile_width)
+          target = out[z0 - z_range[0]:z1 - z_range[0], y0 - y_range[0]:y1 - y_range[0], x0 - x_range[0]:x1 - x_range[0]]
+          for k, sample in enumerate(planes or (0,)):
+            self._read_tile_into(tile, tile_y, tile_x, sample, tile_z)
+            block = tile[z0 - tile_z:z1 - tile_z, y0 - tile_y:y1 - tile_y, x0 - tile_x:x1 - tile_x]
+            if planes is None:
+              _convert_into(target, block, select, None, None)
+            else:
+              _convert_into(target if target.ndim == 3 else target[..., k:k + 1], block, None, None, None)
+
   def write(self, np.ndarray data, **options):
     """Write data to the tif file.
 
@@ -788,38 +1900,52 @@ cdef class Tiff:
     Multipage tiffs are supperted by calling write multiple times.
 
     Args:
-        data (array_like): 2D numpy array. Supported dtypes: un(signed) integer, float.
+        data (array_like): 2D numpy array. Supported dtypes: un(signed) integer, float, bool (written as 1 bit samples).
+        n_bits: bits per sample for unsigned integer data, e.g. 2, 4 or 12. Values are packed. Default: size of the dtype
         method: determines which method is used for writing. Either "tile" for tiled tiffs or "scanline" for basic scanline tiffs. Default: "tile"
         photometric: determines how values are interpreted, either zero == black or zero == white.
                      MIN_IS_BLACK(default), MIN_IS_WHITE. more information can be found in the libtiff doc.
         planar_config: defaults to 1, component values for each pixel are stored contiguously.
-                      2 says components are stored in component planes. Irrelevant for greyscale images.
+                      2 says components are stored in component planes, so single channels can be read without
+                      decoding the others. Irrelevant for greyscale images.
         compression: compression level. defaults to no compression. More information can be found in the libtiff doc.
-        tile_length: Only needed if method is "tile", sets the length of a tile. Must be a multiple of 16. Default: 256
-        tile_width: Only needed if method is "tile", sets the width of a tile. Must be a multiple of 16. Default: 256
+        tile_length: Only needed if method is "tile", sets the length of a tile. Must be a multiple of 16. Default: 240
+        tile_width: Only needed if method is "tile", sets the width of a tile. Must be a multiple of 16. Default: 240
+        tile_shape: Only needed if method is "tile". Either a tuple (tile_length, tile_width) or "auto".
+                    "auto" chooses the tile shape from the image size, dtype, samples, compression and the access pattern.
+        access: expected access pattern for tile_shape="auto". Either "patches", "rows" or "full". Default: "patches"
+        patch_size: typical read window (int or tuple) for tile_shape="auto". Default: 256
+        skip_empty: Only used if method is "tile". If True, tiles that only contain fill_value are not written. Default: False
+        fill_value: value of empty tiles. With skip_empty it is stored in the gdal nodata tag (42113). Default: 0
 
     Examples:
       >>> data = np.random.rand(100,100)
       >>> # data = np.random.randint(size=(100,100))
       >>> with pytiff.Tiff("example.tif", "w") as handle:
       >>>   handle.write(data, method="tile", tile_length=240, tile_width=240)
+      >>>   handle.write(data, method="tile", tile_shape="auto", access="patches", patch_size=64)
     """
     if self.file_mode not in ["w", "a", "w8", "a8"]:
       raise Exception("Write is only supported in .. write mode ..")
 
-    cdef short photometric, planar_config, compression
+    cdef short photometric, planar_config
+    cdef unsigned short compression
     cdef short sample_format, nbits, samples_per_pixel
 
-    photometric = options.get("photometric", MIN_IS_BLACK)
+    samples_per_pixel = 1
     if data.ndim == 3:
-        photometric = RGB
+        samples_per_pixel = data.shape[2]
+    photometric = options.get("photometric", RGB if samples_per_pixel in (3, 4) else MIN_IS_BLACK)
 
     planar_config = options.get("planar_config", 1)
+    self._planar_config = planar_config
+    self._volume = False
+    self.image_depth = self.tile_depth = 1
     compression = options.get("compression", NO_COMPRESSION)
-    samples_per_pixel = 1
-    if data.ndim == 3:
-        samples_per_pixel = data.shape[2]
-    sample_format, nbits = INVERSE_TYPE_MAP[data.dtype]
+    sample_format, nbits = _sample_bits(data.dtype, options)
+    self._dtype_write = np.dtype(data.dtype)
+    self.samples_per_pixel = samples_per_pixel
+    self._packed_bits = nbits if nbits % 8 else 0
 
     ctiff.TIFFSetField(self.tiff_handle, tags.orientation, 1) # Image orientation , top left
     ctiff.TIFFSetField(self.tiff_handle, tags.samples_per_pixel, samples_per_pixel)
@@ -834,6 +1960,7 @@ cdef class Tiff:
         samples_per_pixel, data.shape[0], data.shape[1]))
     self.logger.debug("Type of input data: {}, max value: {} min value: {} C contiguous: {}".format(data.dtype, data.max(), data.min(), data.flags.c_contiguous))
 
+    self._set_sparse_options(options)
     write_method = options.get("method", "tile")
     if write_method == "tile":
       self._write_tiles(data, **options)
@@ -844,12 +1971,15 @@ cdef class Tiff:
 
   def _write_tiles(self, np.ndarray data, **options):
     cdef short tile_length, tile_width
-    tile_length = options.get("tile_length", 240)
-    tile_width = options.get("tile_width", 240)
+    samples_per_pixel = data.shape[2] if data.ndim == 3 else 1
+    tile_length, tile_width = _resolve_tile_shape(options, (data.shape[0], data.shape[1]), data.dtype, samples_per_pixel,
+                                                  options.get("compression", NO_COMPRESSION), 240)
     self.logger.debug("Writing tiles of size {} x {}".format(tile_length, tile_width))
 
     ctiff.TIFFSetField(self.tiff_handle, tags.tile_length, tile_length)
     ctiff.TIFFSetField(self.tiff_handle, tags.tile_width, tile_width)
+    self.tile_length = tile_length
+    self.tile_width = tile_width
 
     cdef np.ndarray buffer
     n_tile_rows = int(np.ceil(data.shape[0] / float(tile_length)))
@@ -870,15 +2000,17 @@ cdef class Tiff:
         # Save time by only padding if necessary.
         # Note: This implementation is faster than np.sum(to_pad) > 0, altough it is ugly.
         if to_pad[0][0] + to_pad[0][1] + to_pad[1][0] + to_pad[1][1]:
-            buffer = np.pad(buffer, to_pad, "constant", constant_values=(0))
+            buffer = np.pad(buffer, to_pad, "constant", constant_values=self.fill_value)
         else:
             # Pad implicitly converts the buffer to c-contiguous layout.
             # If we do not pad, we need to make the conversion explicitly.
             buffer = np.ascontiguousarray(buffer)
         self.logger.debug("Buffer array c contiguous: {}".format(buffer.flags.c_contiguous))
 
-        ctiff.TIFFWriteTile(self.tiff_handle, <void *> buffer.data, x, y, 0, 0)
+        self._write_tile(buffer, x, y)
 
+    self._flush_writes()
+    self._write_empty_page()
     ctiff.TIFFWriteDirectory(self.tiff_handle)
 
   def _write_scanline(self, np.ndarray data, **options):
@@ -893,55 +2025,121 @@ cdef class Tiff:
       ctiff.TIFFSetField(self.tiff_handle, tags.rows_per_strip, rows_per_strip)
     else:
       ctiff.TIFFSetField(self.tiff_handle, tags.rows_per_strip, ctiff.TIFFDefaultStripSize(self.tiff_handle, data.shape[1])) # rows per strip, use tiff function for estimate
-    cdef np.ndarray row
-    for i in range(data.shape[0]):
-      row = data[i]
-      ctiff.TIFFWriteScanline(self.tiff_handle, <void *>row.data, i, 0)
+    cdef np.ndarray plane
+    cdef unsigned short sample
+    if self._planar_config == 2 and data.ndim == 3:
+      # libtiff expects all rows of a sample plane before the next plane
+      planes = [np.ascontiguousarray(data[:, :, i]) for i in range(data.shape[2])]
+    else:
+      planes = [data]
+    block = 64
+    for sample, plane in enumerate(planes):
+      for start in range(0, plane.shape[0], block):
+        rows = plane[start:start + block]
+        if self._writer is None:
+          self._write_rows(rows, start, sample)
+        else:
+          self._writer.submit(self._write_rows, rows, start, sample)
+    self._flush_writes()
     ctiff.TIFFWriteDirectory(self.tiff_handle)
 
+  def _write_rows(self, np.ndarray rows, unsigned int start, unsigned short sample):
+    """Write a block of rows with TIFFWriteScanline without holding the gil."""
+    if self._packed_bits:
+      rows = pack_samples(rows, self._packed_bits)
+    rows = np.ascontiguousarray(rows)
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef char* data = rows.data
+    cdef Py_ssize_t stride = rows.strides[0]
+    cdef unsigned int i, n = rows.shape[0]
+    cdef int err = 0
+    with nogil:
+      for i in range(n):
+        if ctiff.TIFFWriteScanline(handle, <void*> (data + i * stride), start + i, sample) == -1:
+          err = 1
+          break
+    if err:
+      raise IOError("Writing row {} failed".format(start + i))
+
   def new_page(self, image_size, dtype, **options):
     """ adds a new page to the tiff file, and initializes chunk writing
 
 
+    Volumes are written if tile_shape has three entries (tile_depth, tile_length, tile_width). image_size is then
+    (depth, length, width) or (depth, length, width, samples) and chunks are set with three slices.
+
     Args:
-        image_size (array like (integer)): the size of the image
-        dytpe (np.dtype): the dtype of the image
+        image_size (array like (integer)): the size of the image, (length, width) or (length, width, samples)
+        dytpe (np.dtype): the dtype of the image. bool pages are written with 1 bit samples.
+        n_bits: bits per sample for unsigned integer dtypes, e.g. 2, 4 or 12. Values are packed. Default: size of the dtype
         photometric: determines how values are interpreted, either zero == black or zero == white.
                      MIN_IS_BLACK(default), MIN_IS_WHITE. more information can be found in the libtiff doc.
         planar_config: defaults to 1, component values for each pixel are stored contiguously.
-                      2 says components are stored in component planes. Irrelevant for greyscale images.
+                      2 says components are stored in component planes, so single channels can be read without
+                      decoding the others. Irrelevant for greyscale images.
         compression: compression level. defaults to no compression. More information can be found in the libtiff doc.
+                     Volumes support no compression and deflate (8).
         tile_length: sets the length of a tile. Must be a multiple of 16. Default: 256
         tile_width: sets the width of a tile. Must be a multiple of 16. Default: 256
+        tile_shape: either a tuple (tile_length, tile_width) or "auto". "auto" chooses the tile shape
+                    from the image size, dtype, compression and the access pattern.
+                    (tile_depth, tile_length, tile_width) writes a volume with 3D tiles.
+        access: expected access pattern for tile_shape="auto". Either "patches", "rows" or "full". Default: "patches"
+        patch_size: typical read window (int or tuple) for tile_shape="auto". Default: 256
+        skip_empty: If True, tiles that only contain fill_value are not written. Default: False
+        fill_value: value of empty tiles. With skip_empty it is stored in the gdal nodata tag (42113). Default: 0
     """
     if self._unsaved_page:
         self.save_page()
-    cdef short photometric, planar_config, compression
-    cdef short sample_format, nbits
+    cdef short photometric, planar_config
+    cdef unsigned short compression
+    cdef short sample_format, nbits, samples_per_pixel
     cdef int length, width
-    photometric = options.get("photometric", MIN_IS_BLACK)
+    cdef unsigned int image_depth = 1, tile_depth = 1
+    tile_shape = options.get("tile_shape", None)
+    self._volume = tile_shape is not None and not isinstance(tile_shape, str) and len(tile_shape) == 3
+    if self._volume:
+        image_depth, tile_depth = image_size[0], tile_shape[0]
+        if image_depth <= 0 or tile_depth <= 0:
+            raise ValueError("Image depth and tile depth must be positive, got: {} and {}".format(image_depth, tile_depth))
+        image_size = image_size[1:]
+        options = dict(options, tile_shape=tile_shape[1:])
+    self.image_depth = image_depth
+    self.tile_depth = tile_depth
+    samples_per_pixel = 1
+    if len(image_size) > 2:
+        samples_per_pixel = image_size[2]
+    photometric = options.get("photometric", RGB if samples_per_pixel in (3, 4) else MIN_IS_BLACK)
     planar_config = options.get("planar_config", 1)
+    self._planar_config = planar_config
     compression = options.get("compression", NO_COMPRESSION)
+    if self._volume and compression not in VOLUME_COMPRESSIONS:
+        raise ValueError("Volumes can not be written with compression {}, use one of {}".format(compression, VOLUME_COMPRESSIONS))
+    self._compression = compression
 
     # cast to numpy.dtype. if this is not done, keys are not matching.
     self._dtype_write = np.dtype(dtype)
     dtype = np.dtype(dtype)
-    sample_format, nbits = INVERSE_TYPE_MAP[dtype]
+    sample_format, nbits = _sample_bits(dtype, options)
+    self._packed_bits = nbits if nbits % 8 else 0
     length = image_size[0]
     width = image_size[1]
     self.image_length = image_size[0]
     self.image_width = image_size[1]
+    self.samples_per_pixel = samples_per_pixel
 
     cdef short tile_length, tile_width
-    tile_length = options.get("tile_length", 256)
-    tile_width = options.get("tile_width", 256)
+    tile_length, tile_width = _resolve_tile_shape(options, image_size, dtype, samples_per_pixel, compression, 256)
     self.tile_length = tile_length
     self.tile_width = tile_width
     ctiff.TIFFSetField(self.tiff_handle, tags.tile_length, tile_length)
     ctiff.TIFFSetField(self.tiff_handle, tags.tile_width, tile_width)
+    if self._volume:
+      ctiff.TIFFSetField(self.tiff_handle, tags.image_depth, image_depth)
+      ctiff.TIFFSetField(self.tiff_handle, tags.tile_depth, tile_depth)
 
     ctiff.TIFFSetField(self.tiff_handle, tags.orientation, 1) # Image orientation , top left
-    ctiff.TIFFSetField(self.tiff_handle, tags.samples_per_pixel, 1)
+    ctiff.TIFFSetField(self.tiff_handle, tags.samples_per_pixel, samples_per_pixel)
     ctiff.TIFFSetField(self.tiff_handle, tags.bits_per_sample, nbits)
     ctiff.TIFFSetField(self.tiff_handle, tags.image_length, length)
     ctiff.TIFFSetField(self.tiff_handle, tags.image_width, width)
@@ -949,11 +2147,26 @@ cdef class Tiff:
     ctiff.TIFFSetField(self.tiff_handle, tags.compression, compression) # compression, 1 == no compression
     ctiff.TIFFSetField(self.tiff_handle, tags.photometric, photometric) # photometric, minisblack
     ctiff.TIFFSetField(self.tiff_handle, tags.planar_configuration, planar_config) # planarconfig, contiguous not needed for gray
+    self._set_sparse_options(options)
     self._unsaved_page = True
 
+  def _set_sparse_options(self, options):
+    """Set skip_empty and fill_value for writing a page."""
+    cdef bytes nodata
+    self._skip_empty = options.get("skip_empty", False)
+    self.fill_value = options.get("fill_value", 0)
+    self._wrote_tile = False
+    if self._skip_empty:
+      # readers (pytiff, gdal) take the value of missing tiles from the gdal nodata tag
+      nodata = str(self.fill_value).encode("ascii")
+      ctiff.TIFFSetField(self.tiff_handle, tags.gdal_nodata, <char*> nodata)
+
   def __setitem__(self, key, item):
     """ enables chunkwise writing uses _chunk_writing """
     self.logger.debug("__setitem__ called")
+    if self._volume:
+      self._set_volume(key, item)
+      return
     if not isinstance(key, tuple):
       if isinstance(key, slice):
         key = (key, slice(None,None,None))
@@ -978,12 +2191,53 @@ cdef class Tiff:
       y_range[1] = self.image_length
 
     shape = y_range[1] - y_range[0], x_range[1] - x_range[0]
+    if self.samples_per_pixel > 1:
+      shape += (self.samples_per_pixel,)
     if shape != item.shape:
       raise ValueError("data shape :{} is not matching to the slice: {}".format(item.shape, shape))
     if self._dtype_write != np.dtype(item.dtype):
         raise ValueError("data dtype :{} is not matching to the image dtype: {}".format(item.dtype, self.dtype))
     self._write_chunk(item, x_pos=x_range[0], y_pos=y_range[0])
 
+  def _set_volume(self, key, item):
+    """Write a block of a volume given by up to three slices (depth, rows, columns)."""
+    if not isinstance(key, tuple):
+      key = (key,)
+    key = tuple(key) + (slice(None),) * (3 - len(key))
+    if len(key) != 3 or not all(isinstance(k, slice) for k in key):
+      raise Exception("Only slicing is supported")
+    z_start = key[0].start if key[0].start is not None else 0
+    z_stop = key[0].stop if key[0].stop is not None and key[0].stop < self.image_depth else self.image_depth
+    y_range, x_range = self._ranges(key[1], key[2])
+    shape = z_stop - z_start, y_range[1] - y_range[0], x_range[1] - x_range[0]
+    if self.samples_per_pixel > 1:
+      shape += (self.samples_per_pixel,)
+    if shape != item.shape:
+      raise ValueError("data shape :{} is not matching to the slice: {}".format(item.shape, shape))
+    if self._dtype_write != np.dtype(item.dtype):
+      raise ValueError("data dtype :{} is not matching to the image dtype: {}".format(item.dtype, self.dtype))
+    self._write_volume_chunk(item, z_start, y_range[0], x_range[0])
+
+  def _write_volume_chunk(self, np.ndarray data, unsigned int z_pos, unsigned int y_pos, unsigned int x_pos):
+    """Write a block of a volume as 3D tiles. The block has to start at a tile boundary."""
+    cdef unsigned int tile_depth = self.tile_depth, tile_length = self.tile_length, tile_width = self.tile_width
+    cdef unsigned int z, y, x
+    cdef np.ndarray buffer
+    if z_pos % tile_depth or y_pos % tile_length or x_pos % tile_width:
+      raise ValueError("Blocks of a volume have to start at a tile boundary")
+    for z in range(0, data.shape[0], tile_depth):
+      for y in range(0, data.shape[1], tile_length):
+        for x in range(0, data.shape[2], tile_width):
+          buffer = data[z:z + tile_depth, y:y + tile_length, x:x + tile_width]
+          to_pad = ((0, tile_depth - buffer.shape[0]), (0, tile_length - buffer.shape[1]), (0, tile_width - buffer.shape[2]))
+          if data.ndim == 4:
+            to_pad += ((0, 0),)
+          if buffer.shape[0] != tile_depth or buffer.shape[1] != tile_length or buffer.shape[2] != tile_width:
+            buffer = np.pad(buffer, to_pad, "constant", constant_values=self.fill_value)
+          else:
+            buffer = np.ascontiguousarray(buffer)
+          self._write_tile(buffer, x_pos + x, y_pos + y, z_pos + z)
+
   def _write_chunk(self, np.ndarray data, **options):
     """ writes a chunk at the given position
 
@@ -1013,17 +2267,101 @@ cdef class Tiff:
         buffer = data[y:(i+1)*tile_length, x:(j+1)*tile_width]
         buffer.astype(dtype)
         to_pad = ((0, tile_length - buffer.shape[0]), (0, tile_width - buffer.shape[1]))
+        if data.ndim == 3:
+            to_pad += ((0, 0),)
 
         # Save time by only padding if necessary.
         # Note: This implementation is faster than np.sum(to_pad) > 0, altough it is ugly.
         if to_pad[0][0] + to_pad[0][1] + to_pad[1][0] + to_pad[1][1] > 0:
-            buffer = np.pad(buffer, to_pad, "constant", constant_values=(0))
+            buffer = np.pad(buffer, to_pad, "constant", constant_values=self.fill_value)
         else:
             # Pad implicitly converts the buffer to c-contiguous layout.
             # If we do not pad, we need to make the conversion explicitly.
             buffer = np.ascontiguousarray(buffer)
 
-        ctiff.TIFFWriteTile(self.tiff_handle, <void *> buffer.data, x_chunk+x, y_chunk+y, 0, 0)
+        self._write_tile(buffer, x_chunk+x, y_chunk+y)
+
+  cdef _write_tile(self, np.ndarray buffer, unsigned int x, unsigned int y, unsigned int z=0):
+    """Encode and write one c-contiguous tile, on the background writer if there is one."""
+    if self._writer is None:
+      self._write_tile_now(buffer, x, y, z)
+      return
+    if not buffer.flags.owndata:
+      # the caller may change its array after __setitem__ returns
+      buffer = buffer.copy()
+    self._writer.submit(self._write_tile_now, buffer, x, y, z)
+
+  def _write_tile_now(self, np.ndarray buffer, unsigned int x, unsigned int y, unsigned int z=0):
+    """Encode and write one tile. With separate sample planes every sample is written as an own tile."""
+    if self._planar_config == 2 and buffer.ndim == (4 if self._volume else 3):
+      for sample in range(buffer.shape[buffer.ndim - 1]):
+        self._write_tile_sample(np.ascontiguousarray(buffer[..., sample]), x, y, sample, z)
+    else:
+      self._write_tile_sample(buffer, x, y, 0, z)
+
+  cdef _write_tile_sample(self, np.ndarray buffer, unsigned int x, unsigned int y, unsigned short sample, unsigned int z=0):
+    """Encode and write the tile of one sample plane without holding the gil."""
+    if self._skip_empty and not np.any(buffer != self.fill_value):
+      # the tile stays sparse, with zero offset and byte count
+      return
+    if self._packed_bits:
+      if self._volume:
+        # every row of every slice starts at a byte boundary
+        buffer = buffer.reshape(buffer.shape[0] * buffer.shape[1], -1)
+      buffer = pack_samples(buffer, self._packed_bits)
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef void* data = <void*> buffer.data
+    cdef ctiff.tsize_t bytes
+    cdef ctiff.ttile_t tile
+    cdef ctiff.tsize_t size
+    cdef np.ndarray encoded
+    if self._volume:
+      # libtiff clips encoded tiles to the size of one slice, so the whole 3D tile is encoded here
+      encoded = np.ascontiguousarray(buffer).view(np.uint8).reshape(-1)
+      if self._compression != NO_COMPRESSION:
+        encoded = np.frombuffer(zlib.compress(encoded), dtype=np.uint8)
+      tile = ctiff.TIFFComputeTile(handle, x, y, z, sample)
+      data = <void*> encoded.data
+      size = encoded.shape[0]
+      with nogil:
+        bytes = ctiff.TIFFWriteRawTile(handle, tile, data, size)
+    else:
+      with nogil:
+        bytes = ctiff.TIFFWriteTile(handle, data, x, y, z, sample)
+    if bytes == -1:
+      raise IOError("Writing tile at ({}, {}, {}) failed".format(z, y, x))
+    self._wrote_tile = True
+
+  def _write_empty_page(self):
+    """Write the first tile of a page, whose tiles were all skipped.
+
+    libtiff only writes the tile offsets and byte counts, if a tile was written. Without them the page can not be read.
+    """
+    if not self._skip_empty or self._wrote_tile:
+      return
+    shape = (self.tile_length, self.tile_width)
+    if self._volume:
+      shape = (self.tile_depth,) + shape
+    if self.samples_per_pixel > 1 and self._planar_config != 2:
+      shape += (self.samples_per_pixel,)
+    self._skip_empty = False
+    try:
+      self._write_tile_sample(np.full(shape, self.fill_value, dtype=self._dtype_write), 0, 0, 0, 0)
+    finally:
+      self._skip_empty = True
+
+  def _write_raw_tile(self, data, unsigned int x, unsigned int y, unsigned short sample=0):
+    """Write a tile that is already encoded with the compression of the page, e.g. by a worker thread."""
+    self._flush_writes()
+    cdef np.ndarray buffer = np.frombuffer(data, dtype=np.uint8)
+    cdef ctiff.ttile_t tile = ctiff.TIFFComputeTile(self.tiff_handle, x, y, 0, sample)
+    cdef ctiff.tsize_t n_bytes = buffer.shape[0]
+    cdef ctiff.tsize_t n_written
+    with nogil:
+      n_written = ctiff.TIFFWriteRawTile(self.tiff_handle, tile, <void*> buffer.data, n_bytes)
+    if n_written != n_bytes:
+      raise IOError("Writing raw tile at ({}, {}) failed".format(y, x))
+    self._wrote_tile = True
 
   def read_tags(self):
     """  reads standard tags and saves them in a dictionary
@@ -1076,6 +2414,8 @@ cdef class Tiff:
     cdef np.ndarray data
     cdef void* d
     cdef unsigned short page, n_pages
+    cdef unsigned short n_extra = 0
+    cdef unsigned short* extra = NULL
     # if no data type, don't try to read
     if data_type is None:
         return None, 0
@@ -1109,6 +2449,12 @@ cdef class Tiff:
         err = ctiff.TIFFGetField(self.tiff_handle, tag, &page , &n_pages)
         data[0] = page
         data[1] = n_pages
+    # extra samples are returned as a count and a pointer to the array
+    elif tag == tags.extra_samples:
+        err = ctiff.TIFFGetField(self.tiff_handle, tag, &n_extra, &extra)
+        data = np.zeros(n_extra, dtype=data_type)
+        for i in range(n_extra):
+            data[i] = extra[i]
     # handle tags with count > 1, this only works if TIFFGetField expects a
     # pointer to an array. A buffer variable needs to be used because
     # TIFFGetField allocates the necessary memory itself. Afterwards the data
@@ -1161,7 +2507,7 @@ cdef class Tiff:
     """
     if self.file_mode == "r":
         raise Exception("Tag writing is not supported in read mode")
-    kwargs.update(tagdict)
+    kwargs.update(tagdict or {})
 
     for _key in kwargs:
       if isinstance(_key, str):
@@ -1171,7 +2517,7 @@ cdef class Tiff:
 
       if key in TIFF_TAGS_NOT_WRITABLE:
           continue
-      self._set_tag(key, kwargs[key])
+      self._set_tag(key, kwargs[_key])
 
   def _set_tag(self, tag, value):
     """  sets one tag in the tiff file
@@ -1188,6 +2534,8 @@ cdef class Tiff:
     # helper variables
     cdef unsigned char page, total_pages
     cdef float fval
+    # queued tiles use the same libtiff handle
+    self._flush_writes()
     if type(tag) == int:
       tag = tags(tag)
     elif isinstance(tag, str):
@@ -1229,23 +2577,225 @@ cdef class Tiff:
             err = ctiff.TIFFSetField(self.tiff_handle, tag, <float> data.item(0))
         err = ctiff.TIFFSetField(self.tiff_handle, tag, data.data[0])
 
+  def append_page_from(self, Tiff other, page=None):
+    """Append a page of another tiff file without decoding it.
+
+    The compressed tiles or strips are transferred as they are, together with the layout
+    and the remaining tags of the page. Hence the new page has the same tiling and compression as the source page.
+
+    Args:
+        other (Tiff): tiff file opened in read mode.
+        page (int): page of other that is copied. Default: None (the current page of other)
+
+    Examples:
+      >>> with pytiff.Tiff("a.tif") as a, pytiff.Tiff("b.tif") as b, pytiff.Tiff("ab.tif", "w") as out:
+      >>>   out.append_page_from(a, 0)
+      >>>   out.append_page_from(b, 0)
+    """
+    if self.file_mode not in ["w", "a", "w8", "a8"]:
+      raise Exception("Write is only supported in .. write mode ..")
+    if other.file_mode != "r":
+      raise Exception("Pages can only be copied from files in read mode")
+    if self._unsaved_page:
+      self.save_page()
+    if page is not None:
+      other.set_page(page)
+
+    cdef unsigned short bits = 1
+    ctiff.TIFFGetField(other.tiff_handle, tags.bits_per_sample, &bits)
+    if bits > 8 and ctiff.TIFFIsByteSwapped(other.tiff_handle) != ctiff.TIFFIsByteSwapped(self.tiff_handle):
+      # the samples in the raw tiles or strips keep the byte order of the source
+      raise ValueError("Pages with {} bit samples can only be copied between files of the same byte order. "
+                       "Open the destination with byteorder=pytiff.byteorder(source)".format(bits))
+    self._copy_layout(other)
+    self.set_tags(descriptive_tags(other.tags))
+
+    cdef bint tiled = other.is_tiled()
+    key = tags.tile_byte_counts if tiled else tags.strip_byte_counts
+    counts = dict.get(other.tags, key)
+    if counts is None:
+      raise IOError("Page {} has no {}".format(other.current_page, key.name))
+    counts = np.atleast_1d(counts).astype(np.int64)
+    self.logger.debug("Copying {} raw {}".format(counts.size, "tiles" if tiled else "strips"))
+
+    cdef np.ndarray buffer = np.empty(max(counts.max(), 1), dtype=np.uint8)
+    cdef void* data = <void*> buffer.data
+    cdef ctiff.TIFF* src = other.tiff_handle
+    cdef ctiff.TIFF* dst = self.tiff_handle
+    cdef unsigned int i
+    cdef ctiff.tsize_t n_bytes, n_read, n_written
+    for i in range(counts.size):
+      n_bytes = counts[i]
+      # empty (sparse) chunks stay empty
+      if n_bytes == 0:
+        continue
+      with nogil:
+        if tiled:
+          n_read = ctiff.TIFFReadRawTile(src, i, data, n_bytes)
+        else:
+          n_read = ctiff.TIFFReadRawStrip(src, i, data, n_bytes)
+      if n_read != n_bytes:
+        raise IOError("Reading raw chunk {} of page {} failed".format(i, other.current_page))
+      with nogil:
+        if tiled:
+          n_written = ctiff.TIFFWriteRawTile(dst, i, data, n_bytes)
+        else:
+          n_written = ctiff.TIFFWriteRawStrip(dst, i, data, n_bytes)
+      if n_written != n_bytes:
+        raise IOError("Writing raw chunk {} failed".format(i))
+
+    ctiff.TIFFWriteDirectory(self.tiff_handle)
+    self._write_mode_n_pages += 1
+
+  cdef _copy_layout(self, Tiff other):
+    """Set the layout tags (size, sample type, tiling, compression, ...) of the current page of other."""
+    cdef ctiff.TIFF* src = other.tiff_handle
+    cdef ctiff.TIFF* dst = self.tiff_handle
+    cdef unsigned int u32
+    cdef unsigned short u16, u16_2
+    cdef unsigned short* u16_ptr = NULL
+    cdef float* float_ptr = NULL
+    cdef void* void_ptr = NULL
+
+    # compression has to be set before the codec specific tags (e.g. predictor)
+    for tag in [tags.compression, tags.bits_per_sample, tags.samples_per_pixel, tags.sample_format,
+                tags.photometric, tags.planar_configuration, tags.fill_order, tags.predictor, tags.ycbcr_positioning]:
+      if ctiff.TIFFGetField(src, tag, &u16) == 1:
+        ctiff.TIFFSetField(dst, tag, u16)
+    layout_u32 = [tags.image_width, tags.image_length, tags.image_depth]
+    if other.is_tiled():
+      layout_u32 += [tags.tile_width, tags.tile_length, tags.tile_depth]
+    else:
+      layout_u32 += [tags.rows_per_strip]
+    for tag in layout_u32:
+      if ctiff.TIFFGetField(src, tag, &u32) == 1:
+        ctiff.TIFFSetField(dst, tag, u32)
+
+    if ctiff.TIFFGetField(src, tags.extra_samples, &u16, &u16_ptr) == 1:
+      ctiff.TIFFSetField(dst, tags.extra_samples, u16, u16_ptr)
+    if ctiff.TIFFGetField(src, tags.ycbcr_subsampling, &u16, &u16_2) == 1:
+      ctiff.TIFFSetField(dst, tags.ycbcr_subsampling, u16, u16_2)
+    if ctiff.TIFFGetField(src, tags.reference_black_white, &float_ptr) == 1:
+      ctiff.TIFFSetField(dst, tags.reference_black_white, float_ptr)
+    # jpeg compressed tiles/strips need the shared tables
+    if ctiff.TIFFGetField(src, tags.jpeg_tables, &u32, &void_ptr) == 1:
+      ctiff.TIFFSetField(dst, tags.jpeg_tables, u32, void_ptr)
+    # value of sparse tiles
+    nodata = _read_nodata(src)
+    if nodata is not None:
+      nodata = nodata.encode("ascii")
+      ctiff.TIFFSetField(dst, tags.gdal_nodata, <char*> nodata)
+
   def save_page(self):
     """ saves the page """
     if self._unsaved_page:
+        self._flush_writes()
         self._unsaved_page = False
+        self._write_empty_page()
         ctiff.TIFFWriteDirectory(self.tiff_handle)
         self._write_mode_n_pages += 1
 
-  cdef _read_tile(self, unsigned int y, unsigned int x):
-    cdef np.ndarray buffer = np.zeros((self.tile_length, self.tile_width, self.n_samples),dtype=self.dtype).squeeze()
-    cdef ctiff.tsize_t bytes = ctiff.TIFFReadTile(self.tiff_handle, <void *>buffer.data, x, y, 0, 0)
+  def _flush_writes(self):
+    """Wait for the background writer and raise its errors. libtiff must not be used by two threads at once."""
+    if self._writer is not None:
+      self._writer.flush()
+
+  def _file_identity(self):
+    """Identity of the file used in tile cache keys: (path, size, modification time). None without a filename."""
+    if self._file_id is None and self.filename is not None:
+      stat = os.stat(self.filename)
+      mtime = getattr(stat, "st_mtime_ns", stat.st_mtime)
+      self._file_id = (os.path.realpath(self.filename), stat.st_size, mtime)
+    return self._file_id
+
+  def _tile_key(self, unsigned int y, unsigned int x, unsigned short sample=0, unsigned int z=0):
+    """Cache key of the tile containing voxel (z, y, x) of a sample plane, None if the tile can not be cached."""
+    if self.tile_cache is None or not self.file_mode.startswith("r"):
+      return None
+    identity = self._file_identity()
+    if identity is None:
+      return None
+    return identity, self.current_page, z // self.tile_depth, y // self.tile_length, x // self.tile_width, sample
+
+  cdef _read_tile_into(self, np.ndarray buffer, unsigned int y, unsigned int x, unsigned short sample=0, unsigned int z=0):
+    """Decode the tile containing pixel (y, x) into a c-contiguous buffer of the size of a tile.
+
+    For separate sample planes the tile of the given sample is decoded. For volumes z selects the slice
+    and the buffer has the size of a 3D tile.
+    """
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef void* data = <void*> buffer.data
+    cdef ctiff.tsize_t bytes
+    cdef np.ndarray raw
+    if self._tile_byte_counts is not None:
+      index = ctiff.TIFFComputeTile(handle, x, y, z, sample)
+      if index < self._tile_byte_counts.size and self._tile_byte_counts[index] == 0:
+        # sparse tile, nothing to read or decode
+        buffer[...] = self.fill_value
+        return buffer
+    key = self._tile_key(y, x, sample, z)
+    if key is not None and self.tile_cache.get(key, buffer):
+      return buffer
+    if self._volume:
+      # TIFFReadTile only decodes one slice of a 3D tile
+      raw = self._read_volume_tile(x, y, z, sample)
+      if not self._packed_bits:
+        buffer.reshape(-1).view(np.uint8)[:] = raw[:buffer.nbytes]
+        if buffer.dtype.itemsize > 1 and ctiff.TIFFIsByteSwapped(handle):
+          buffer.byteswap(True)
+    else:
+      if self._packed_bits:
+        raw = np.empty(ctiff.TIFFTileSize(handle), dtype=np.uint8)
+        data = <void*> raw.data
+      # release the gil, so that several handles can decode in parallel
+      with nogil:
+        bytes = ctiff.TIFFReadTile(handle, data, x, y, z, sample)
+      if bytes == -1:
+        raise NotTiledError("Tiled reading not possible")
+    if self._packed_bits:
+      # every row of every slice starts at a byte boundary
+      n_rows = self.tile_length * self.tile_depth
+      count = buffer.size // n_rows
+      buffer.reshape(n_rows, count)[:] = unpack_samples(raw.reshape(n_rows, -1), self._packed_bits,
+                                                        count, dtype=buffer.dtype)
+    if key is not None:
+      self.tile_cache.put(key, buffer)
+    return buffer
+
+  def _decode_tile(self, unsigned int y, unsigned int x, np.ndarray buffer=None):
+    """Decode the tile containing pixel (y, x) with TIFFReadTile only, without cache, unpacking or copies.
+
+    The lower bound for reading a patch inside one tile, used by the benchmarks.
+    Returns the buffer of shape (tile_length, tile_width, samples_per_pixel), which can be passed again.
+    """
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef ctiff.tsize_t bytes
+    if buffer is None:
+      buffer = np.empty((self.tile_length, self.tile_width, self.samples_per_pixel), dtype=self._read_dtype)
+    if not buffer.flags.c_contiguous or buffer.nbytes < ctiff.TIFFTileSize(handle):
+      raise ValueError("The buffer must be c-contiguous and hold a tile of {} bytes".format(ctiff.TIFFTileSize(handle)))
+    cdef void* data = <void*> buffer.data
+    with nogil:
+      bytes = ctiff.TIFFReadTile(handle, data, x, y, 0, 0)
     if bytes == -1:
       raise NotTiledError("Tiled reading not possible")
     return buffer
 
+  cdef np.ndarray _read_volume_tile(self, unsigned int x, unsigned int y, unsigned int z, unsigned short sample):
+    """Read the raw bytes of a 3D tile and decode them."""
+    cdef ctiff.TIFF* handle = self.tiff_handle
+    cdef ctiff.ttile_t tile = ctiff.TIFFComputeTile(handle, x, y, z, sample)
+    cdef np.ndarray raw = np.empty(self._tile_byte_counts[tile], dtype=np.uint8)
+    cdef void* data = <void*> raw.data
+    cdef ctiff.tsize_t size = raw.shape[0]
+    cdef ctiff.tsize_t bytes
+    with nogil:
+      bytes = ctiff.TIFFReadRawTile(handle, tile, data, size)
+    if bytes == -1:
+      raise NotTiledError("Tiled reading not possible")
+    return _decode_volume_tile(raw, self._compression, self._predictor)
+
   def _value_count(self, tag):
-    cdef short planarconfig
-    ctiff.TIFFGetField(self.tiff_handle, tags.planar_configuration, &planarconfig)
     pool_samples_per_pixel = [
             TIFF_TAGS_REVERSE["bits_per_sample"],
             TIFF_TAGS_REVERSE["min_sample_value"],
@@ -1257,16 +2807,11 @@ cdef class Tiff:
     if tag in pool_samples_per_pixel:
         sys.stdout.flush()
         return self.samples_per_pixel
+    # libtiff already counts the strips and tiles of all sample planes
     elif tag == TIFF_TAGS_REVERSE["strip_offsets"] or tag == TIFF_TAGS_REVERSE["strip_byte_counts"]:
-        if planarconfig == 1:
-            return ctiff.TIFFNumberOfStrips(self.tiff_handle)
-        if planarconfig == 2:
-            return ctiff.TIFFNumberOfStrips(self.tiff_handle) * self.samples_per_pixel
+        return ctiff.TIFFNumberOfStrips(self.tiff_handle)
     elif tag == TIFF_TAGS_REVERSE["tile_offsets"] or tag == TIFF_TAGS_REVERSE["tile_byte_counts"]:
-        if planarconfig == 1:
-            return ctiff.TIFFNumberOfTiles(self.tiff_handle)
-        if planarconfig == 2:
-            return ctiff.TIFFNumberOfTiles(self.tiff_handle) * self.samples_per_pixel
+        return ctiff.TIFFNumberOfTiles(self.tiff_handle)
     elif tag == TIFF_TAGS_REVERSE["extra_samples"]:
         return self.extra_samples.size
     else:
@@ -1274,15 +2819,12 @@ cdef class Tiff:
 
   @property
   def pages(self):
+    cdef Tiff page
     if self._pages is None:
       self._pages = []
       current = 0
-      mode = "r"
-      # use bigtiff if original file is opened as bigtiff
-      if "8" in self.file_mode:
-          mode += "8"
       while current < self.number_of_pages:
-          page = Tiff(self.filename, mode, encoding=self.encoding)
+          page = self._reopen()
           page.set_page(current)
           current += 1
           page._singlepage = True
@@ -0,0 +1,397 @@
+"""Caches for decoded tiles.
+
+A tile cache is passed to `Tiff` with the `tile_cache` argument. Before a tile is decoded,
+`cache.get(key, out)` is called, which copies a cached tile into `out` and returns True on a hit.
+Decoded tiles are stored with `cache.put(key, tile)`.
+`SharedTileCache` keeps tiles in shared memory, `DiskTileCache` keeps them in a directory across restarts.
+Keys are tuples (file identity, page, tile slice, tile row, tile column, sample), the file identity contains path, size and modification time.
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+_MAGIC = 0x70797469666663  # "pytiffc"
+_HEADER_FIELDS = 8
+_attach_lock = threading.Lock()
+
+
+def key_hash(key):
+    """Map a cache key to a non-zero 64 bit integer."""
+    digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).digest()
+    value = int(np.frombuffer(digest, dtype=np.uint64)[0])
+    return value or 1
+
+
+def _attach_untracked(name):
+    """Open existing shared memory without registering it with the resource tracker.
+
+    Only the creator is tracked, so the memory is removed once when the creator closes it or exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name, create=False)
+        finally:
+            resource_tracker.register = register
+
+
+def _tile_bytes(array):
+    """Flat uint8 view of a c-contiguous array."""
+    return np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+
+
+class SharedTileCache(object):
+    """Tile cache in POSIX shared memory, that is shared by several processes.
+
+    The cache consists of slots of `slot_size` bytes. A key is mapped to a set of `ways` slots;
+    inside a set the slots are replaced with the CLOCK algorithm.
+    Reads do not take a lock: every slot has a version counter which is odd while the slot is written.
+    A reader copies the tile and only accepts it, if the version did not change in between.
+    Writers are serialized by a lock per set (a thread lock and an fcntl lock on a lock file).
+
+    The cache can be pickled, e.g. together with a `Tiff` object that is sent to DataLoader worker processes.
+    Unpickled caches attach to the same shared memory.
+
+    Args:
+        size (int): total size of the cache in bytes. Default: 1 GiB
+        slot_size (int): maximal size of a tile in bytes. Larger tiles are not cached. Default: 256 * 256 * 4
+        ways (int): number of slots per set. Default: 8
+        name (string): name of the shared memory. Default: None (a random name)
+
+    Examples:
+        >>> cache = pytiff.SharedTileCache(size=4 * 2**30, slot_size=512 * 512 * 3)
+        >>> handle = pytiff.Tiff("slide.tif", tile_cache=cache)
+        >>> # pickled handles, e.g. in DataLoader workers, share the cache
+    """
+    def __init__(self, size=2**30, slot_size=256 * 256 * 4, ways=8, name=None):
+        if shared_memory is None:
+            raise ImportError("SharedTileCache needs multiprocessing.shared_memory (python >= 3.8)")
+        slot_size = int(slot_size)
+        ways = int(ways)
+        n_sets = max(1, int(size) // (slot_size * ways))
+        n_slots = n_sets * ways
+        nbytes = self._layout_size(n_slots, slot_size)
+        if name is None:
+            name = "pytiff_" + uuid.uuid4().hex[:16]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        header = np.ndarray(_HEADER_FIELDS, dtype=np.uint64, buffer=shm.buf)
+        header[:4] = (_MAGIC, n_slots, slot_size, ways)
+        self._owner = True
+        self._setup(shm)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to an existing cache by its name."""
+        if shared_memory is None:
+            raise ImportError("SharedTileCache needs multiprocessing.shared_memory (python >= 3.8)")
+        obj = cls.__new__(cls)
+        shm = _attach_untracked(name)
+        obj._owner = False
+        obj._setup(shm)
+        return obj
+
+    @staticmethod
+    def _layout_size(n_slots, slot_size):
+        return 8 * _HEADER_FIELDS + n_slots * (8 + 8 + 8 + 8 + slot_size)
+
+    def _setup(self, shm):
+        self._shm = shm
+        self.name = shm.name
+        header = np.ndarray(_HEADER_FIELDS, dtype=np.uint64, buffer=shm.buf)
+        if header[0] != _MAGIC:
+            raise ValueError("{} is not a pytiff tile cache".format(shm.name))
+        self.n_slots, self.slot_size, self.ways = int(header[1]), int(header[2]), int(header[3])
+        self.n_sets = self.n_slots // self.ways
+        offset = 8 * _HEADER_FIELDS
+        arrays = []
+        for dtype in [np.uint64, np.uint64, np.uint64, np.uint64]:
+            arrays.append(np.ndarray(self.n_slots, dtype=dtype, buffer=shm.buf, offset=offset))
+            offset += 8 * self.n_slots
+        # keys, version counters, tile sizes, CLOCK reference bits
+        self._keys, self._versions, self._sizes, self._referenced = arrays
+        self._data = np.ndarray((self.n_slots, self.slot_size), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        self._hands = np.zeros(self.n_sets, dtype=np.int64)
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+        if fcntl is not None:
+            self._lock_file = open(os.path.join(_lock_dir(), self.name + ".lock"), "a+b")
+
+    def __reduce__(self):
+        return SharedTileCache.attach, (self.name,)
+
+    def _lock(self, set_index):
+        self._thread_lock.acquire()
+        if self._lock_file is not None:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, set_index)
+
+    def _unlock(self, set_index):
+        if self._lock_file is not None:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, set_index)
+        self._thread_lock.release()
+
+    def get(self, key, out):
+        """Copy the tile stored for key into out.
+
+        Returns:
+            bool: True if the tile was found, else False.
+        """
+        h = key_hash(key)
+        base = (h % self.n_sets) * self.ways
+        target = _tile_bytes(out) if out.flags.c_contiguous else None
+        for slot in base + np.flatnonzero(self._keys[base:base + self.ways] == h):
+            version = int(self._versions[slot])
+            if version & 1 or int(self._sizes[slot]) != out.nbytes:
+                continue
+            tile = self._data[slot, :out.nbytes]
+            if target is not None:
+                target[:] = tile
+            else:
+                out[...] = tile.view(out.dtype).reshape(out.shape)
+            # the slot might have been rewritten while copying
+            if int(self._versions[slot]) == version and int(self._keys[slot]) == h:
+                self._referenced[slot] = 1
+                return True
+        return False
+
+    def put(self, key, tile):
+        """Store a tile. Tiles larger than slot_size are ignored."""
+        data = _tile_bytes(tile)
+        if data.size > self.slot_size:
+            return
+        h = key_hash(key)
+        set_index = h % self.n_sets
+        base = set_index * self.ways
+        self._lock(set_index)
+        try:
+            existing = np.flatnonzero(self._keys[base:base + self.ways] == h)
+            if existing.size:
+                slot = base + existing[0]
+            else:
+                slot = base + self._evict(set_index)
+            self._versions[slot] += 1
+            self._keys[slot] = 0
+            self._data[slot, :data.size] = data
+            self._sizes[slot] = data.size
+            self._keys[slot] = h
+            self._referenced[slot] = 1
+            self._versions[slot] += 1
+        finally:
+            self._unlock(set_index)
+
+    def _evict(self, set_index):
+        """Choose a slot of a set with the CLOCK algorithm."""
+        base = set_index * self.ways
+        hand = int(self._hands[set_index])
+        for _ in range(2 * self.ways + 1):
+            slot = base + hand
+            hand = (hand + 1) % self.ways
+            if self._keys[slot] == 0 or not self._referenced[slot]:
+                break
+            self._referenced[slot] = 0
+        self._hands[set_index] = hand
+        return slot - base
+
+    def clear(self):
+        """Remove all tiles."""
+        for set_index in range(self.n_sets):
+            self._lock(set_index)
+            try:
+                base = set_index * self.ways
+                self._versions[base:base + self.ways] += 2
+                self._keys[base:base + self.ways] = 0
+            finally:
+                self._unlock(set_index)
+
+    def close(self):
+        """Detach from the shared memory. The creator also removes it."""
+        if self._shm is None:
+            return
+        self._keys = self._versions = self._sizes = self._referenced = self._data = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            if self._lock_file is not None:
+                try:
+                    os.remove(self._lock_file.name)
+                except OSError:
+                    pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class DiskTileCache(object):
+    """Persistent tile cache in a directory, that survives restarts and is shared by all processes using the directory.
+
+    Every tile is stored uncompressed as an own .npy file, which is memory mapped when it is read.
+    Files are written to a temporary name and renamed, so readers never see partial tiles.
+    Hits update the modification time of a file; if the directory grows beyond `size` bytes, the least recently
+    used tiles are removed until 90% of `size` are left. The size is checked per process, so the directory
+    can exceed `size` by the tiles other processes added since the last eviction.
+    Tiles of modified files are not returned, because the key contains the size and modification time of the file.
+
+    Args:
+        directory (string): cache directory. It is created if it does not exist.
+        size (int): maximal size of all tiles in bytes. Default: 10 GiB
+
+    Examples:
+        >>> cache = pytiff.DiskTileCache("/var/cache/pytiff", size=50 * 2**30)
+        >>> handle = pytiff.Tiff("archive.tif", tile_cache=cache)
+    """
+    def __init__(self, directory, size=10 * 2**30):
+        self.directory = directory
+        self.size = int(size)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._thread_lock = threading.Lock()
+        self._usage = sum(n_bytes for _, _, n_bytes in self._entries())
+
+    def __reduce__(self):
+        return DiskTileCache, (self.directory, self.size)
+
+    def _path(self, key):
+        name = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name[:2], name + ".npy")
+
+    def _entries(self):
+        """(modification time, path, size) of all tiles. Leftovers of crashed writers are removed."""
+        entries = []
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(".npy"):
+                        entries.append((stat.st_mtime, path, stat.st_size))
+                    elif name.endswith(".tmp") and now - stat.st_mtime > 3600:
+                        os.remove(path)
+                except OSError:
+                    # removed by another process
+                    pass
+        return entries
+
+    def get(self, key, out):
+        """Copy the tile stored for key into out.
+
+        Returns:
+            bool: True if the tile was found, else False.
+        """
+        path = self._path(key)
+        try:
+            tile = np.load(path, mmap_mode="r", allow_pickle=False)
+            if tile.dtype != out.dtype or tile.size != out.size:
+                return False
+            out[...] = tile.reshape(out.shape)
+            del tile
+            # mark as recently used
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return False
+        return True
+
+    def put(self, key, tile):
+        """Store a tile."""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created by another process
+                pass
+        tmp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            with open(tmp, "wb") as handle:
+                np.save(handle, np.ascontiguousarray(tile), allow_pickle=False)
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            # a full disk or a removed directory only costs the cache entry
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._thread_lock:
+            self._usage += os.path.getsize(path)
+            full = self._usage > self.size
+        if full:
+            self.evict()
+
+    def evict(self, target=None):
+        """Remove the least recently used tiles until the directory holds at most target bytes.
+
+        Args:
+            target (int): size in bytes. Default: None (90% of the cache size)
+        """
+        if target is None:
+            target = int(0.9 * self.size)
+        with self._thread_lock:
+            lock_file = None
+            if fcntl is not None:
+                lock_file = open(os.path.join(self.directory, ".lock"), "a+b")
+                try:
+                    fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    # another process is evicting
+                    lock_file.close()
+                    return
+            try:
+                entries = sorted(self._entries())
+                usage = sum(n_bytes for _, _, n_bytes in entries)
+                for _, path, n_bytes in entries:
+                    if usage <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    usage -= n_bytes
+                self._usage = usage
+            finally:
+                if lock_file is not None:
+                    fcntl.lockf(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def clear(self):
+        """Remove all tiles."""
+        self.evict(0)
+
+    def close(self):
+        """Nothing to release, the tiles stay on disk."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+def _lock_dir():
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    import tempfile
+    return tempfile.gettempdir()
@@ -0,0 +1,184 @@
+"""Convert tiff files into a tiled and compressed layout and copy pages between files."""
+import zlib
+
+import numpy as np
+
+from ._pytiff import Tiff, tags, descriptive_tags, _resolve_tile_shape
+from ._parallel import ordered_map, ReaderPool
+from .utils import byteorder, is_bigtiff, page_list
+
+# switch to bigtiff if the uncompressed output gets close to 4 GiB
+BIGTIFF_LIMIT = 2**32 - 2**28
+# upper bound for the size of a band of rows, that is processed at once
+BAND_BYTES = 64 * 2**20
+# compressions, whose tiles are encoded by the worker threads: none, adobe deflate and deflate
+WORKER_CODECS = (1, 8, 32946)
+
+
+def _page_info(handle):
+    shape = handle.shape
+    if handle.samples_per_pixel > 1:
+        # the extra samples are not read
+        shape = shape[:2] + (handle.n_samples,)
+        if handle.n_samples == 1:
+            shape = shape[:2]
+    if handle.is_tiled():
+        unit = handle.tags[tags.tile_length]
+    else:
+        unit = handle.tags[tags.rows_per_strip]
+    if not unit or unit > shape[0]:
+        unit = shape[0]
+    dtype = np.dtype(handle.dtype)
+    return {"shape": tuple(int(s) for s in shape), "dtype": dtype, "unit": int(unit),
+            "tags": descriptive_tags(handle.tags)}
+
+
+def _band_rows(info, tile_length, band_bytes):
+    """Number of rows per band. Bands are aligned to the destination tiles and cover whole source tiles/strips."""
+    rows = tile_length * int(np.ceil(info["unit"] / float(tile_length)))
+    row_bytes = int(np.prod(info["shape"][1:])) * info["dtype"].itemsize
+    max_rows = max(tile_length, (band_bytes // max(row_bytes, 1)) // tile_length * tile_length)
+    return max(tile_length, min(rows, max_rows))
+
+
+def _encode_in_workers(dtype, compression, options):
+    """True if tiles can be encoded outside of libtiff and written raw."""
+    return (compression in WORKER_CODECS and dtype.kind != "b" and options.get("n_bits") is None
+            and options.get("planar_config", 1) == 1 and not options.get("skip_empty", False))
+
+
+def _encode_tiles(band, y0, tile_shape, compression):
+    """Split a band into tiles, pad them and encode them. Returns (y, x, bytes) for every tile."""
+    tile_length, tile_width = tile_shape
+    encoded = []
+    for y in range(0, band.shape[0], tile_length):
+        for x in range(0, band.shape[1], tile_width):
+            tile = band[y:y + tile_length, x:x + tile_width]
+            pad = [(0, tile_length - tile.shape[0]), (0, tile_width - tile.shape[1])] + [(0, 0)] * (tile.ndim - 2)
+            if pad[0][1] or pad[1][1]:
+                tile = np.pad(tile, pad, "constant")
+            data = np.ascontiguousarray(tile).tobytes()
+            if compression != 1:
+                # zlib releases the gil, so tiles are compressed in parallel
+                data = zlib.compress(data)
+            encoded.append((y0 + y, x, data))
+    return encoded
+
+
+def convert(src, dst, tile_shape=(256, 256), compression=1, pages=None, workers=1, bigtiff=None,
+            band_bytes=BAND_BYTES, encoding=None, **options):
+    """Convert a tiff file into a tiled (and compressed) tiff file.
+
+    The source is streamed in bands of rows that are aligned to the destination tiles, so only a
+    few bands are held in memory at once. Striped sources are decoded row by row (jpeg and ycbcr strip by strip),
+    tiled sources tile by tile.
+    Bands of all selected pages are read in parallel by `workers` threads, each with an own file handle,
+    while the destination is written in order.
+    Without compression or with deflate (8) the workers also split the bands into tiles and compress them,
+    the writing thread only appends the encoded tiles. Other codecs, packed samples (bool, n_bits), separate
+    sample planes and skip_empty are encoded by libtiff in the writing thread.
+    Tags that do not describe the data layout (e.g. image_description, resolution) are copied.
+
+    Args:
+        src (string): filename of the source tiff.
+        dst (string): filename of the destination tiff. An existing file is overwritten.
+        tile_shape (tuple or "auto"): tile shape of the destination. Default: (256, 256)
+        compression (int): libtiff compression code of the destination. Default: 1 (no compression)
+        pages (int, slice or list): pages of the source that are converted. Default: None (all pages)
+        workers (int): number of threads. Default: 1
+        bigtiff (bool): write a bigtiff. If None, bigtiff is used if the source is a bigtiff or
+                        if the uncompressed data gets close to 4 GiB. Default: None
+        band_bytes (int): upper bound for the uncompressed size of one band. Default: 64 MiB
+        encoding (string): encoding of ascii tags, see `Tiff`. Default: None
+        options: further options passed to `Tiff.new_page`, e.g. photometric or access and patch_size for tile_shape="auto".
+
+    Examples:
+        >>> pytiff.convert("vendor.tif", "canonical.tif", tile_shape=(512, 512), compression=8, workers=4)
+    """
+    with Tiff(src, encoding=encoding) as handle:
+        page_indices = page_list(pages, handle.number_of_pages)
+        infos = []
+        for p in page_indices:
+            handle.set_page(p)
+            infos.append(_page_info(handle))
+
+    if bigtiff is None:
+        total = sum(int(np.prod(info["shape"])) * info["dtype"].itemsize for info in infos)
+        bigtiff = is_bigtiff(src) or total > BIGTIFF_LIMIT
+
+    layouts = []
+    for info in infos:
+        samples = info["shape"][2] if len(info["shape"]) > 2 else 1
+        layouts.append(_resolve_tile_shape(dict(options, tile_shape=tile_shape), info["shape"], info["dtype"],
+                                           samples, compression, 256))
+
+    jobs = []
+    for i, (info, layout) in enumerate(zip(infos, layouts)):
+        rows = _band_rows(info, layout[0], band_bytes)
+        for y0 in range(0, info["shape"][0], rows):
+            jobs.append((i, y0, min(y0 + rows, info["shape"][0])))
+
+    readers = ReaderPool(lambda: Tiff(src, encoding=encoding))
+    encode = [_encode_in_workers(info["dtype"], compression, options) for info in infos]
+
+    def read_band(job):
+        i, y0, y1 = job
+        band = np.ascontiguousarray(readers.get(page_indices[i])._read_rows((y0, y1)), dtype=infos[i]["dtype"])
+        if encode[i]:
+            return _encode_tiles(band, y0, layouts[i], compression)
+        return band
+
+    try:
+        with Tiff(dst, "w", bigtiff=bigtiff, encoding=encoding) as out:
+            current = None
+            for (i, y0, y1), band in zip(jobs, ordered_map(read_band, jobs, workers)):
+                if i != current:
+                    out.new_page(infos[i]["shape"], infos[i]["dtype"], tile_shape=layouts[i],
+                                 compression=compression, **options)
+                    out.set_tags(infos[i]["tags"])
+                    current = i
+                if encode[i]:
+                    for y, x, data in band:
+                        out._write_raw_tile(data, x, y)
+                else:
+                    out[y0:y1, :] = band
+            out.save_page()
+    finally:
+        readers.close()
+
+
+def copy_pages(src, dst, pages=None, bigtiff=None, encoding=None):
+    """Copy pages of a tiff file without decoding them.
+
+    The compressed tiles or strips are transferred as they are (see `Tiff.append_page_from`),
+    so the copy runs at the speed of the disk. A new destination gets the byte order of the source,
+    a given Tiff object needs the same byte order for samples of more than 8 bits.
+
+    Args:
+        src (string): filename of the source tiff.
+        dst (string or Tiff): filename of the destination tiff (an existing file is overwritten)
+                              or a Tiff object opened in write or append mode, e.g. to concatenate files.
+        pages (int, slice or list): pages of the source that are copied. Default: None (all pages)
+        bigtiff (bool): write a bigtiff if dst is a filename. If None, bigtiff is used if the source is a bigtiff. Default: None
+        encoding (string): encoding of ascii tags, see `Tiff`. Default: None
+
+    Examples:
+        >>> pytiff.copy_pages("stack.tif", "subset.tif", pages=[0, 10, 20])
+        >>> with pytiff.Tiff("both.tif", "w") as out:
+        >>>   pytiff.copy_pages("a.tif", out)
+        >>>   pytiff.copy_pages("b.tif", out)
+    """
+    with Tiff(src, encoding=encoding) as handle:
+        page_indices = page_list(pages, handle.number_of_pages)
+        if isinstance(dst, Tiff):
+            out = dst
+        else:
+            if bigtiff is None:
+                bigtiff = is_bigtiff(src)
+            out = Tiff(dst, "w", bigtiff=bigtiff, encoding=encoding, byteorder=byteorder(src))
+        try:
+            for p in page_indices:
+                out.append_page_from(handle, p)
+        finally:
+            if out is not dst:
+                out.close()
@@ -1,6 +1,6 @@
 from libcpp.string cimport string
 
-cdef extern from "tiffio.h":
+cdef extern from "tiffio.h" nogil:
   # structs
   cdef struct tiff:
     pass
@@ -19,26 +19,69 @@ cdef extern from "tiffio.h":
   ctypedef unsigned short tdir_t
   ctypedef unsigned int ttile_t
   ctypedef unsigned int tstrip_t
+  ctypedef void* thandle_t
+  ctypedef unsigned long long toff_t
+
+  # custom tags, that libtiff does not know
+  ctypedef enum TIFFDataType:
+    TIFF_ASCII
+
+  ctypedef struct TIFFFieldInfo:
+    ttag_t field_tag
+    short field_readcount
+    short field_writecount
+    TIFFDataType field_type
+    unsigned short field_bit
+    unsigned char field_oktochange
+    unsigned char field_passcount
+    char* field_name
+
+  enum:
+    TIFF_VARIABLE
+    FIELD_CUSTOM
+
+  # client callbacks
+  ctypedef tsize_t (*TIFFReadWriteProc)(thandle_t, tdata_t, tsize_t)
+  ctypedef toff_t (*TIFFSeekProc)(thandle_t, toff_t, int)
+  ctypedef int (*TIFFCloseProc)(thandle_t)
+  ctypedef toff_t (*TIFFSizeProc)(thandle_t)
+  ctypedef int (*TIFFMapFileProc)(thandle_t, tdata_t*, toff_t*)
+  ctypedef void (*TIFFUnmapFileProc)(thandle_t, tdata_t, toff_t)
+  ctypedef void (*TIFFExtendProc)(TIFF*)
   # functions
   # general functions
   int TIFFIsTiled(TIFF*)
+  int TIFFIsByteSwapped(TIFF*)
   string TIFFGetVersion()
   const TIFFField* TIFFFieldWithTag(TIFF*, ttag_t)
   unsigned int TIFFFieldDataType(const TIFFField* )
   int TIFFGetField(TIFF*, ttag_t, ...)
   int TIFFSetField(TIFF* tif, ttag_t tag, ...)
+  int TIFFMergeFieldInfo(TIFF* tif, const TIFFFieldInfo* info, unsigned int n)
+  TIFFExtendProc TIFFSetTagExtender(TIFFExtendProc)
   TIFF* TIFFOpen(const char*, const char*)
+  TIFF* TIFFClientOpen(const char* name, const char* mode, thandle_t handle,
+                       TIFFReadWriteProc readproc, TIFFReadWriteProc writeproc, TIFFSeekProc seekproc,
+                       TIFFCloseProc closeproc, TIFFSizeProc sizeproc,
+                       TIFFMapFileProc mapproc, TIFFUnmapFileProc unmapproc)
   void TIFFClose(TIFF*)
   # reading
   tsize_t TIFFReadTile(TIFF* tif, tdata_t buf, unsigned int x, unsigned int y, unsigned int z, tsample_t sample)
   int TIFFReadScanline(TIFF* tif, tdata_t buf, unsigned int row, tsample_t sample)
+  tsize_t TIFFReadRawTile(TIFF* tif, ttile_t tile, tdata_t buf, tsize_t size)
+  tsize_t TIFFReadRawStrip(TIFF* tif, tstrip_t strip, tdata_t buf, tsize_t size)
   # read helper
+  ttile_t TIFFComputeTile(TIFF* tif, unsigned int x, unsigned int y, unsigned int z, tsample_t sample)
   ttile_t TIFFNumberOfTiles(TIFF* tif)
   tstrip_t TIFFNumberOfStrips(TIFF* tif)
+  tsize_t TIFFTileSize(TIFF* tif)
+  tsize_t TIFFScanlineSize(TIFF* tif)
   # write functions
   unsigned int TIFFDefaultStripSize(TIFF* tif, unsigned int estimate)
   int TIFFWriteScanline(TIFF* tif, tdata_t buf, unsigned int row, tsample_t sample)
   tsize_t TIFFWriteTile(TIFF* tif, tdata_t buf, unsigned int x, unsigned int y, unsigned int z, tsample_t sample)
+  tsize_t TIFFWriteRawTile(TIFF* tif, ttile_t tile, tdata_t buf, tsize_t size)
+  tsize_t TIFFWriteRawStrip(TIFF* tif, tstrip_t strip, tdata_t buf, tsize_t size)
   # directory functions
   tdir_t TIFFCurrentDirectory(TIFF* tif)
   int TIFFSetDirectory(TIFF* tif, tdir_t dir)
@@ -48,6 +91,7 @@ cdef extern from "tiffio.h":
   #RGBA functions
   int TIFFReadRGBAImage(TIFF* tif, unsigned int width, unsigned int height, unsigned int* raster, int stopOnError)
   int TIFFReadRGBATile(TIFF* tif, unsigned int x, unsigned int y, unsigned int* raster)
+  int TIFFReadRGBAStrip(TIFF* tif, unsigned int row, unsigned int* raster)
   unsigned short TIFFGetR(unsigned int pixel)
   unsigned short TIFFGetG(unsigned int pixel)
   unsigned short TIFFGetB(unsigned int pixel)
@@ -0,0 +1,207 @@
+"""Virtual mosaic of tiff files placed at known positions."""
+import numpy as np
+
+from ._pytiff import Tiff, _resolve_tile_shape
+from ._parallel import ordered_map, HandlePool
+from .convert import BIGTIFF_LIMIT, BAND_BYTES
+from .utils import scan
+
+BLEND_MODES = ("last", "first", "mean", "linear")
+
+
+def _ramp(n):
+    """Distance of every pixel of a field to the nearer border, starting with 1."""
+    i = np.arange(1, n + 1, dtype=np.float64)
+    return np.minimum(i, i[::-1])
+
+
+def _clip(value_range, size):
+    if value_range is None:
+        return 0, size
+    start = value_range[0] if value_range[0] is not None else 0
+    stop = value_range[1] if value_range[1] is not None and value_range[1] < size else size
+    return int(start), max(int(stop), int(start))
+
+
+class Mosaic(object):
+    """One large virtual image composed of tiff files (fields) at known positions.
+
+    Only the fields that intersect a region are read, in parallel by `workers` threads.
+    Files are opened through a pool, which keeps at most `max_open` of them open.
+    The layout of the fields is read without libtiff (see `pytiff.utils.scan`).
+
+    Overlapping fields are combined according to `blend`:
+    "last" and "first" use the last or first field in the order of `files`, "mean" averages them and
+    "linear" weights every pixel by its distance to the border of its field, which hides the seams.
+
+    Args:
+        files (list): filenames of the fields. All fields need the same dtype and number of samples.
+        positions (array_like): N x 2 array with the (y, x) pixel position of the upper left corner of every field.
+        blend (str): one of "last", "first", "mean" or "linear". Default: "last"
+        page (int): page of the fields that is used. Default: 0
+        fill_value: value of pixels that are not covered by any field. Default: 0
+        workers (int): number of threads reading fields. Default: 1
+        max_open (int): maximum number of open files. Default: 32
+        encoding (string): encoding of ascii tags, see `Tiff`. Default: None
+
+    Examples:
+        >>> with pytiff.Mosaic(files, positions, blend="linear", workers=8) as mosaic:
+        >>>   region = mosaic[10000:12000, 5000:8000]
+        >>>   mosaic.export("slide.tif", tile_shape=(512, 512), compression=8)
+    """
+    def __init__(self, files, positions, blend="last", page=0, fill_value=0, workers=1, max_open=32, encoding=None):
+        if blend not in BLEND_MODES:
+            raise ValueError("Unknown blend mode: {}. Use one of {}".format(blend, BLEND_MODES))
+        self.files = list(files)
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        if not self.files:
+            raise ValueError("A mosaic needs at least one file")
+        if len(positions) != len(self.files):
+            raise ValueError("{} positions are given for {} files".format(len(positions), len(self.files)))
+        if (positions < 0).any():
+            raise ValueError("Positions have to be non-negative")
+        self.blend = blend
+        self.page = page
+        self.fill_value = fill_value
+        self.workers = workers
+        self.encoding = encoding
+
+        sizes = []
+        for filename, pages in zip(self.files, scan(self.files, workers=workers)):
+            if page >= len(pages):
+                raise ValueError("{} has no page {}".format(filename, page))
+            sizes.append(pages[page]["shape"][:2])
+        # (y0, x0, y1, x1) of every field
+        self._boxes = np.concatenate([positions, positions + np.array(sizes, dtype=np.int64)], axis=1)
+        self._pool = HandlePool(self._open, max_open)
+        with self._pool.handle(0) as handle:
+            self.dtype = np.dtype(handle.dtype)
+            n_samples = handle.n_samples
+        self.shape = (int(self._boxes[:, 2].max()), int(self._boxes[:, 3].max()))
+        if n_samples > 1:
+            self.shape += (n_samples,)
+
+    def _open(self, index):
+        handle = Tiff(self.files[index], encoding=self.encoding)
+        if self.page:
+            handle.set_page(self.page)
+        return handle
+
+    def fields(self, y_range=None, x_range=None):
+        """Indices of the fields intersecting a region."""
+        y0, y1 = _clip(y_range, self.shape[0])
+        x0, x1 = _clip(x_range, self.shape[1])
+        boxes = self._boxes
+        return np.flatnonzero((boxes[:, 0] < y1) & (boxes[:, 2] > y0) & (boxes[:, 1] < x1) & (boxes[:, 3] > x0))
+
+    def read(self, y_range=None, x_range=None, workers=None):
+        """Read a region of the mosaic.
+
+        Args:
+            y_range (tuple): (start, stop) of the rows. Default: None (all rows)
+            x_range (tuple): (start, stop) of the columns. Default: None (all columns)
+            workers (int): number of threads. Default: None (workers of the mosaic)
+
+        Returns:
+            np.ndarray: array of shape (rows, columns[, samples])
+        """
+        y0, y1 = _clip(y_range, self.shape[0])
+        x0, x1 = _clip(x_range, self.shape[1])
+        shape = (y1 - y0, x1 - x0) + self.shape[2:]
+        indices = self.fields((y0, y1), (x0, x1))
+        if self.blend == "first":
+            # earlier fields overwrite later ones
+            indices = indices[::-1]
+
+        def read_field(i):
+            fy0, fx0, fy1, fx1 = self._boxes[i]
+            box = max(y0, fy0), max(x0, fx0), min(y1, fy1), min(x1, fx1)
+            with self._pool.handle(i) as handle:
+                data = handle.read((box[0] - fy0, box[2] - fy0), (box[1] - fx0, box[3] - fx0))
+            return box, data
+
+        fields = ordered_map(read_field, indices, self.workers if workers is None else workers)
+        out = np.full(shape, self.fill_value, dtype=self.dtype)
+        if self.blend in ("last", "first"):
+            for (by0, bx0, by1, bx1), data in fields:
+                out[by0 - y0:by1 - y0, bx0 - x0:bx1 - x0] = data
+            return out
+
+        total = np.zeros(shape, dtype=np.float64)
+        weights = np.zeros(shape[:2], dtype=np.float64)
+        for i, ((by0, bx0, by1, bx1), data) in zip(indices, fields):
+            if self.blend == "mean":
+                weight = np.ones(data.shape[:2])
+            else:
+                fy0, fx0, fy1, fx1 = self._boxes[i]
+                weight = np.minimum.outer(_ramp(fy1 - fy0)[by0 - fy0:by1 - fy0], _ramp(fx1 - fx0)[bx0 - fx0:bx1 - fx0])
+            region = slice(by0 - y0, by1 - y0), slice(bx0 - x0, bx1 - x0)
+            total[region] += data * (weight if data.ndim == 2 else weight[:, :, None])
+            weights[region] += weight
+        covered = weights > 0
+        values = total[covered] / (weights[covered] if total.ndim == 2 else weights[covered][:, None])
+        if self.dtype.kind != "f":
+            values = np.rint(values)
+        out[covered] = values.astype(self.dtype)
+        return out
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = tuple(index) + (slice(None),) * (2 - len(index))
+        if not isinstance(index[0], slice) or not isinstance(index[1], slice):
+            raise Exception("Only slicing is supported")
+        data = self.read((index[0].start, index[0].stop), (index[1].start, index[1].stop))
+        if len(index) > 2 and data.ndim == 3:
+            data = data[:, :, index[2]]
+        return data
+
+    def __array__(self, dtype=None):
+        return self.read()
+
+    def export(self, dst, tile_shape=(256, 256), compression=1, bigtiff=None, workers=None,
+               band_bytes=BAND_BYTES, encoding=None, **options):
+        """Write the mosaic into one tiled tiff file.
+
+        The mosaic is read in bands of rows aligned to the tiles of the destination and written
+        with `Tiff.__setitem__`, so only a few bands are held in memory at once.
+
+        Args:
+            dst (string): filename of the destination. An existing file is overwritten.
+            tile_shape (tuple or "auto"): tile shape of the destination. Default: (256, 256)
+            compression (int): libtiff compression code of the destination. Default: 1 (no compression)
+            bigtiff (bool): write a bigtiff. If None, bigtiff is used if the data gets close to 4 GiB. Default: None
+            workers (int): number of threads reading bands. Default: None (workers of the mosaic)
+            band_bytes (int): upper bound for the size of one band. Default: 64 MiB
+            encoding (string): encoding of ascii tags, see `Tiff`. Default: None
+            options: further options passed to `Tiff.new_page`.
+        """
+        samples = self.shape[2] if len(self.shape) > 2 else 1
+        layout = _resolve_tile_shape(dict(options, tile_shape=tile_shape), self.shape, self.dtype, samples,
+                                     compression, 256)
+        if bigtiff is None:
+            bigtiff = int(np.prod(self.shape)) * self.dtype.itemsize > BIGTIFF_LIMIT
+        # blending accumulates in float64
+        item_bytes = self.dtype.itemsize if self.blend in ("last", "first") else 8
+        row_bytes = self.shape[1] * samples * item_bytes
+        rows = max(layout[0], band_bytes // max(row_bytes, 1) // layout[0] * layout[0])
+        bands = [(y, min(y + rows, self.shape[0])) for y in range(0, self.shape[0], rows)]
+
+        def read_band(band):
+            return self.read(band, None, workers=1)
+
+        with Tiff(dst, "w", bigtiff=bigtiff, encoding=encoding) as out:
+            out.new_page(self.shape, self.dtype, tile_shape=layout, compression=compression, **options)
+            for (y0, y1), band in zip(bands, ordered_map(read_band, bands, self.workers if workers is None else workers)):
+                out[y0:y1, :] = band
+            out.save_page()
+
+    def close(self):
+        """Close all open files."""
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
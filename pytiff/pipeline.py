@@ -0,0 +1,141 @@
+"""Apply a function tile by tile from one tiff file to another."""
+import numpy as np
+
+from ._pytiff import Tiff, tags, _resolve_tile_shape
+from ._parallel import ordered_map, ReaderPool
+from .convert import BIGTIFF_LIMIT, _page_info
+from .utils import is_bigtiff, page_list
+
+
+def _tile_jobs(shape, tile_shape):
+    for y in range(0, shape[0], tile_shape[0]):
+        for x in range(0, shape[1], tile_shape[1]):
+            yield y, x, min(y + tile_shape[0], shape[0]), min(x + tile_shape[1], shape[1])
+
+
+def _read_block(handle, job, halo, shape):
+    """Read a tile with halo pixels on every side. Outside of the page the block is mirrored."""
+    y0, x0, y1, x1 = job
+    ya, xa = max(y0 - halo, 0), max(x0 - halo, 0)
+    yb, xb = min(y1 + halo, shape[0]), min(x1 + halo, shape[1])
+    block = handle.read((ya, yb), (xa, xb))
+    pad = [(halo - (y0 - ya), halo - (yb - y1)), (halo - (x0 - xa), halo - (xb - x1))]
+    if any(p for pair in pad for p in pair):
+        block = np.pad(block, pad + [(0, 0)] * (block.ndim - 2), mode="symmetric")
+    return block
+
+
+def _apply(func, block, halo, out_dtype):
+    result = np.asarray(func(block))
+    if result.shape[:2] != block.shape[:2]:
+        raise ValueError("func has to return an array of the block size {}, not {}".format(block.shape[:2], result.shape[:2]))
+    if halo:
+        result = result[halo:result.shape[0] - halo, halo:result.shape[1] - halo]
+    if result.ndim == 3 and result.shape[2] == 1:
+        result = result[:, :, 0]
+    return np.ascontiguousarray(result, dtype=out_dtype)
+
+
+class _Task(object):
+    """Picklable func application for worker processes."""
+    def __init__(self, func, halo, out_dtype):
+        self.func = func
+        self.halo = halo
+        self.out_dtype = out_dtype
+
+    def __call__(self, block):
+        return _apply(self.func, block, self.halo, self.out_dtype)
+
+
+def map_tiles(func, src, dst, halo=0, workers=1, out_dtype=None, tile_shape=None, pages=None,
+              processes=False, compression=1, bigtiff=None, encoding=None, **options):
+    """Apply a function to every tile of a tiff file and write the results to a tiled tiff file.
+
+    The source is read in blocks of the destination tile shape, enlarged by `halo` pixels on every side
+    (mirrored at the image border). `func` gets such a block and returns an array of the same length and width.
+    The halo is cropped from the result, which is written as one tile of the destination.
+    Blocks are processed by `workers` threads (or processes) and written in order; only a few blocks per worker
+    are held in memory at once.
+
+    Args:
+        func (callable): function mapping a block (length, width[, samples]) to an array of the same length and width.
+                         The result may have a different number of samples.
+        src (string): filename of the source tiff.
+        dst (string or Tiff): filename of the destination (an existing file is overwritten) or a Tiff opened for writing.
+        halo (int): number of overlap pixels on every side of a block. Default: 0
+        workers (int): number of threads or processes. Default: 1
+        out_dtype (np.dtype): dtype of the destination. Default: None (the dtype of the source)
+        tile_shape (tuple or "auto"): tile shape of the destination. Default: None (tile shape of the source if it is tiled, else 256 x 256)
+        pages (int, slice or list): pages of the source that are processed. Default: None (all pages)
+        processes (bool): run func in worker processes instead of threads. func has to be picklable. Default: False
+        compression (int): libtiff compression code of the destination. Default: 1 (no compression)
+        bigtiff (bool): write a bigtiff. If None, bigtiff is used if the source is a bigtiff or large. Default: None
+        encoding (string): encoding of ascii tags, see `Tiff`. Default: None
+        options: further options passed to `Tiff.new_page`.
+
+    Examples:
+        >>> from scipy import ndimage
+        >>> pytiff.map_tiles(lambda block: ndimage.gaussian_filter(block, 2), "slide.tif", "smooth.tif", halo=8, workers=8)
+        >>> pytiff.map_tiles(lambda block: block > 100, "slide.tif", "mask.tif", out_dtype=bool)
+    """
+    halo = int(halo)
+    if halo < 0:
+        raise ValueError("halo has to be positive, not {}".format(halo))
+    with Tiff(src, encoding=encoding) as handle:
+        page_indices = page_list(pages, handle.number_of_pages)
+        infos, source_tiles = [], []
+        for p in page_indices:
+            handle.set_page(p)
+            infos.append(_page_info(handle))
+            tiled = handle.is_tiled()
+            source_tiles.append((handle.tags[tags.tile_length], handle.tags[tags.tile_width]) if tiled else None)
+
+    if bigtiff is None:
+        total = sum(int(np.prod(info["shape"])) * info["dtype"].itemsize for info in infos)
+        bigtiff = is_bigtiff(src) or total > BIGTIFF_LIMIT
+
+    jobs = []
+    for i, info in enumerate(infos):
+        samples = info["shape"][2] if len(info["shape"]) > 2 else 1
+        shape = tile_shape if tile_shape is not None else source_tiles[i] or (256, 256)
+        layout = _resolve_tile_shape(dict(options, tile_shape=shape), info["shape"], info["dtype"],
+                                     samples, compression, 256)
+        info["layout"] = layout
+        jobs.extend((i,) + job for job in _tile_jobs(info["shape"], layout))
+
+    readers = ReaderPool(lambda: Tiff(src, encoding=encoding))
+
+    def read(job):
+        info = infos[job[0]]
+        return _read_block(readers.get(page_indices[job[0]]), job[1:], halo, info["shape"])
+
+    def dtype_of(i):
+        return np.dtype(out_dtype) if out_dtype is not None else infos[i]["dtype"]
+
+    if processes:
+        # blocks are read in the calling thread and sent to the processes
+        blocks = (read(job) for job in jobs)
+        results = ordered_map(_Task(func, halo, out_dtype), blocks, workers, processes=True)
+    else:
+        def process(job):
+            return _apply(func, read(job), halo, dtype_of(job[0]))
+        results = ordered_map(process, jobs, workers)
+
+    out = dst if isinstance(dst, Tiff) else Tiff(dst, "w", bigtiff=bigtiff, encoding=encoding)
+    try:
+        current = None
+        for (i, y0, x0, y1, x1), result in zip(jobs, results):
+            if i != current:
+                info = infos[i]
+                # the number of samples of the result is only known now
+                shape = info["shape"][:2] + result.shape[2:]
+                out.new_page(shape, dtype_of(i), tile_shape=info["layout"], compression=compression, **options)
+                out.set_tags(info["tags"])
+                current = i
+            result = np.ascontiguousarray(result, dtype=dtype_of(i))
+            out[y0:y1, x0:x1] = result
+        out.save_page()
+    finally:
+        readers.close()
+        if out is not dst:
+            out.close()
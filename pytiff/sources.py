@@ -0,0 +1,334 @@
+"""Byte sources for reading tiff files through a block cache.
+
+A byte source only needs to know its size and how to read a range of bytes.
+`BlockReader` turns a byte source into a file-like object, that can be passed to `pytiff.Tiff`.
+It caches fixed size blocks, merges adjacent requests into one and reads ahead, which keeps the number
+of requests small on network file systems or object stores.
+
+Examples:
+    >>> source = pytiff.HTTPRangeSource("https://example.org/slide.tif")
+    >>> reader = pytiff.BlockReader(source, block_size=256 * 1024, readahead=1024 * 1024)
+    >>> with pytiff.Tiff(reader) as f:
+    >>>   chunk = f[1000:2000, 1000:2000]
+    >>> print(reader.stats.requests, reader.stats.latency_histogram())
+"""
+import collections
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import Request, urlopen
+
+
+class ByteSource(object):
+    """Interface of a random access byte source."""
+
+    def size(self):
+        """Return the size of the source in bytes."""
+        raise NotImplementedError
+
+    def read_range(self, offset, length):
+        """Return `length` bytes starting at `offset`. Less bytes are returned only at the end of the source."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources of the source."""
+        pass
+
+
+class FileSource(ByteSource):
+    """Byte source for a local file.
+
+    Args:
+        filename (string): the filename.
+        latency (float): delay in seconds that is added to every request. Useful to simulate remote storage. Default: 0
+    """
+    def __init__(self, filename, latency=0):
+        self.filename = filename
+        self.name = filename
+        self.latency = latency
+        self._handle = open(filename, "rb")
+        self._lock = threading.Lock()
+        self._size = os.fstat(self._handle.fileno()).st_size
+
+    def size(self):
+        return self._size
+
+    def read_range(self, offset, length):
+        if self.latency:
+            time.sleep(self.latency)
+        if hasattr(os, "pread"):
+            return os.pread(self._handle.fileno(), length, offset)
+        with self._lock:
+            self._handle.seek(offset)
+            return self._handle.read(length)
+
+    def close(self):
+        self._handle.close()
+
+
+class HTTPRangeSource(ByteSource):
+    """Byte source for a file on a web server, that supports range requests.
+
+    Args:
+        url (string): the url of the tiff file.
+        headers (dict): additional request headers, e.g. for authentication. Default: None
+        timeout (float): timeout of a request in seconds. Default: 60
+    """
+    def __init__(self, url, headers=None, timeout=60):
+        self.url = url
+        self.name = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self._size = None
+
+    def _request(self, offset, length):
+        headers = dict(self.headers)
+        headers["Range"] = "bytes={}-{}".format(offset, offset + length - 1)
+        response = urlopen(Request(self.url, headers=headers), timeout=self.timeout)
+        try:
+            data = response.read()
+            content_range = response.headers.get("Content-Range")
+            status = response.getcode()
+        finally:
+            response.close()
+        if status != 206:
+            # the server ignored the range and sent the whole file
+            data = data[offset:offset + length]
+        return data, content_range
+
+    def size(self):
+        if self._size is None:
+            data, content_range = self._request(0, 1)
+            if content_range is None:
+                raise IOError("Server does not support range requests: {}".format(self.url))
+            self._size = int(content_range.split("/")[-1])
+        return self._size
+
+    def read_range(self, offset, length):
+        if length <= 0:
+            return b""
+        return self._request(offset, length)[0]
+
+
+class ReadStats(object):
+    """Request statistics of a `BlockReader`.
+
+    Attributes:
+        requests (int): number of requests to the byte source.
+        bytes_read (int): number of bytes read from the byte source.
+        hits (int): number of blocks served from the cache.
+        misses (int): number of blocks read from the byte source.
+        latencies (list): duration of every request in seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Set all counters to zero."""
+        with self._lock:
+            self.requests = 0
+            self.bytes_read = 0
+            self.hits = 0
+            self.misses = 0
+            self.latencies = []
+
+    def _record(self, n_bytes, latency):
+        with self._lock:
+            self.requests += 1
+            self.bytes_read += n_bytes
+            self.latencies.append(latency)
+
+    def latency_histogram(self, bins=None):
+        """Histogram of the request latencies.
+
+        Args:
+            bins (array_like): bin edges in seconds. Default: 0 and logarithmic bins from 10 us to 100 s.
+
+        Returns:
+            tuple: (counts, bin edges)
+        """
+        if bins is None:
+            bins = np.concatenate(([0], np.logspace(-5, 2, 15)))
+        with self._lock:
+            latencies = list(self.latencies)
+        return np.histogram(latencies, bins=bins)
+
+    def __repr__(self):
+        return "ReadStats(requests={}, bytes_read={}, hits={}, misses={})".format(
+            self.requests, self.bytes_read, self.hits, self.misses)
+
+
+class _BlockCache(object):
+    """Thread safe LRU cache of blocks, shared by all clones of a reader."""
+    def __init__(self, max_blocks):
+        self.max_blocks = max(int(max_blocks), 1)
+        self.blocks = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, index):
+        with self.lock:
+            block = self.blocks.get(index)
+            if block is not None:
+                # mark as recently used
+                self.blocks[index] = self.blocks.pop(index)
+            return block
+
+    def put(self, index, block):
+        with self.lock:
+            self.blocks[index] = block
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+
+    def __contains__(self, index):
+        with self.lock:
+            return index in self.blocks
+
+
+class BlockReader(object):
+    """File-like view of a byte source with a block cache, request coalescing and readahead.
+
+    Reads are served from blocks of `block_size` bytes. Missing adjacent blocks are fetched with one request,
+    and `readahead` bytes after a request are fetched with it. `Tiff` calls `prefetch` with the byte ranges
+    of all tiles of a chunk before decoding them, so a chunk usually needs a single request.
+
+    Args:
+        source (ByteSource): the byte source.
+        block_size (int): size of a cached block in bytes. Default: 64 KiB
+        cache_size (int): size of the block cache in bytes. Default: 64 MiB
+        readahead (int): number of bytes read additionally after every request. Default: 0
+        max_gap (int): ranges closer than max_gap bytes are merged into one request by prefetch. Default: block_size
+    """
+    def __init__(self, source, block_size=64 * 1024, cache_size=64 * 2**20, readahead=0, max_gap=None):
+        self.source = source
+        self.name = getattr(source, "name", "<source>")
+        self.block_size = int(block_size)
+        self.readahead = int(readahead)
+        self.max_gap = self.block_size if max_gap is None else int(max_gap)
+        self.stats = ReadStats()
+        self._cache = _BlockCache(cache_size // self.block_size)
+        self._size = source.size()
+        self._pos = 0
+
+    def clone(self):
+        """Return a reader with an own position, that shares the source, the cache and the statistics."""
+        other = BlockReader.__new__(BlockReader)
+        other.__dict__.update(self.__dict__)
+        other._pos = 0
+        return other
+
+    # file-like interface
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            pos = offset
+        elif whence == 1:
+            pos = self._pos + offset
+        elif whence == 2:
+            pos = self._size + offset
+        else:
+            raise ValueError("Invalid whence: {}".format(whence))
+        if pos < 0:
+            raise ValueError("Negative seek position {}".format(pos))
+        self._pos = pos
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self._size - self._pos, 0)
+        data = self.pread(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        data = self.pread(self._pos, len(view))
+        view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+    # block interface
+    def pread(self, offset, length):
+        """Read length bytes at offset through the cache."""
+        end = min(offset + length, self._size)
+        if end <= offset:
+            return b""
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        blocks = self._fetch_blocks(first, last)
+        data = b"".join(blocks)
+        start = offset - first * self.block_size
+        return data[start:start + end - offset]
+
+    def prefetch(self, ranges):
+        """Fetch the blocks of several (offset, length) ranges with as few requests as possible.
+
+        Ranges closer than max_gap bytes are merged.
+        """
+        ranges = sorted((int(o), int(n)) for o, n in ranges if n > 0)
+        merged = []
+        for offset, length in ranges:
+            if merged and offset <= merged[-1][1] + self.max_gap:
+                merged[-1][1] = max(merged[-1][1], offset + length)
+            else:
+                merged.append([offset, offset + length])
+        for start, end in merged:
+            end = min(end, self._size)
+            if end > start:
+                self._fetch_blocks(start // self.block_size, (end - 1) // self.block_size, readahead=False)
+
+    def _fetch_blocks(self, first, last, readahead=True):
+        """Return the blocks first to last (inclusive). Runs of missing blocks are read with one request each."""
+        blocks = [self._cache.get(i) for i in range(first, last + 1)]
+        n_hits = sum(b is not None for b in blocks)
+        with self.stats._lock:
+            self.stats.hits += n_hits
+            self.stats.misses += len(blocks) - n_hits
+
+        i = 0
+        while i < len(blocks):
+            if blocks[i] is not None:
+                i += 1
+                continue
+            j = i
+            while j < len(blocks) and blocks[j] is None:
+                j += 1
+            run_first, run_last = first + i, first + j - 1
+            n_extra = 0
+            if readahead and run_last == last:
+                n_extra = -(-self.readahead // self.block_size)
+            fetched = self._read_run(run_first, run_last + n_extra)
+            blocks[i:j] = fetched[:j - i]
+            i = j
+        return blocks
+
+    def _read_run(self, first, last):
+        """Read the blocks first to last (inclusive) with one request and cache them."""
+        last = min(last, (self._size - 1) // self.block_size)
+        offset = first * self.block_size
+        length = min((last + 1) * self.block_size, self._size) - offset
+        start = time.time()
+        data = self.source.read_range(offset, length)
+        self.stats._record(len(data), time.time() - start)
+        blocks = []
+        for index in range(first, last + 1):
+            block = data[(index - first) * self.block_size:(index - first + 1) * self.block_size]
+            self._cache.put(index, block)
+            blocks.append(block)
+        return blocks
@@ -0,0 +1,32 @@
+from pytiff import *
+import numpy as np
+import os
+import pytest
+import timeit
+
+TILED_GREY = "test_data/small_example_tiled.tif"
+TILED_RGB = "test_data/tiled_rgb_sample.tif"
+
+# timings depend on the machine and its load, run with PYTIFF_BENCHMARK=1
+pytestmark = pytest.mark.skipif(not os.environ.get("PYTIFF_BENCHMARK"), reason="benchmarks run with PYTIFF_BENCHMARK=1")
+
+def best_time(function, number=200, repeat=5):
+    """Best time of one call in microseconds."""
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e6
+
+@pytest.mark.parametrize("filename", [TILED_GREY, TILED_RGB])
+@pytest.mark.parametrize("size", [16, 64])
+def test_benchmark_read_patch(filename, size):
+    # a patch inside one tile against decoding that tile with TIFFReadTile alone
+    with Tiff(filename) as tif:
+        buffer = tif._decode_tile(0, 0)
+        tile_length, tile_width = buffer.shape[:2]
+        y, x = tile_length, tile_width
+        assert size <= min(tile_length, tile_width)
+        tile = tif._decode_tile(y, x, buffer)
+        np.testing.assert_array_equal(tile[:size, :size].squeeze(), tif.read_patch(y, x, size, size))
+
+        decode = best_time(lambda: tif._decode_tile(y, x, buffer))
+        fast = best_time(lambda: tif.read_patch(y, x, size, size))
+    # read_patch only adds the copy of the patch and the python call to the decode
+    assert fast < 2 * decode + 20, "read_patch {:.1f} us, decode {:.1f} us".format(fast, decode)
@@ -0,0 +1,262 @@
+from pytiff import *
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import numpy as np
+import pytest
+
+TILED_GREY = "test_data/small_example_tiled.tif"
+
+
+@pytest.fixture
+def cache():
+    c = SharedTileCache(size=64 * 1024, slot_size=4096, ways=4)
+    yield c
+    c.close()
+
+
+def test_put_get(cache):
+    tile = np.arange(1024, dtype=np.uint16).reshape(32, 32)
+    out = np.zeros_like(tile)
+    assert not cache.get(("a", 0, 0, 0), out)
+    cache.put(("a", 0, 0, 0), tile)
+    assert cache.get(("a", 0, 0, 0), out)
+    np.testing.assert_array_equal(out, tile)
+    # a tile of another size is not returned
+    assert not cache.get(("a", 0, 0, 0), np.zeros(10, dtype=np.uint8))
+
+
+def test_large_tiles_are_ignored(cache):
+    tile = np.ones(cache.slot_size + 1, dtype=np.uint8)
+    cache.put("large", tile)
+    assert not cache.get("large", np.zeros_like(tile))
+
+
+def test_budget(cache):
+    tiles = [np.full(1024, i, dtype=np.uint8) for i in range(100)]
+    for i, tile in enumerate(tiles):
+        cache.put(i, tile)
+    out = np.zeros(1024, dtype=np.uint8)
+    hits = [i for i in range(100) if cache.get(i, out)]
+    assert 0 < len(hits) <= cache.n_slots
+    for i in hits:
+        cache.get(i, out)
+        assert np.all(out == i)
+
+
+def test_clock_keeps_referenced_tiles():
+    with SharedTileCache(size=4 * 1024, slot_size=1024, ways=4) as c:
+        out = np.zeros(1024, dtype=np.uint8)
+        for i in range(4):
+            c.put(i, np.full(1024, i, dtype=np.uint8))
+        # the first round clears all reference bits and evicts slot 0
+        c.put(4, np.full(1024, 4, dtype=np.uint8))
+        assert c.get(1, out)
+        c.put(5, np.full(1024, 5, dtype=np.uint8))
+        assert c.get(1, out)
+        assert not c.get(2, out)
+
+
+def test_clear(cache):
+    cache.put("a", np.ones(16, dtype=np.uint8))
+    cache.clear()
+    assert not cache.get("a", np.zeros(16, dtype=np.uint8))
+
+
+def _worker(cache, queue):
+    out = np.zeros(256, dtype=np.uint8)
+    found = cache.get("from parent", out)
+    cache.put("from child", np.full(256, 7, dtype=np.uint8))
+    queue.put((found, int(out.sum())))
+    cache.close()
+
+
+def test_shared_between_processes(cache):
+    cache.put("from parent", np.ones(256, dtype=np.uint8))
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    p = ctx.Process(target=_worker, args=(cache, queue))
+    p.start()
+    found, total = queue.get(timeout=60)
+    p.join()
+    assert found and total == 256
+    out = np.zeros(256, dtype=np.uint8)
+    assert cache.get("from child", out)
+    assert np.all(out == 7)
+
+
+_ATTACH_SCRIPT = """
+import multiprocessing
+from pytiff import SharedTileCache
+
+def attach(cache):
+    cache.close()
+
+if __name__ == "__main__":
+    with SharedTileCache(size=64 * 1024, slot_size=4096) as cache:
+        p = multiprocessing.get_context("spawn").Process(target=attach, args=(cache,))
+        p.start()
+        p.join()
+"""
+
+
+def test_attach_keeps_owner_tracked(tmpdir):
+    # a worker that attaches must not touch the resource tracker entry of the owner
+    script = tmpdir.join("attach.py")
+    script.write(_ATTACH_SCRIPT)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, str(script)], env=env, stderr=subprocess.PIPE, timeout=120)
+    assert result.returncode == 0
+    assert b"Traceback" not in result.stderr
+    assert b"leaked" not in result.stderr
+
+
+def test_pickle_attaches(cache):
+    cache.put("a", np.ones(16, dtype=np.uint8))
+    other = pickle.loads(pickle.dumps(cache))
+    assert other.name == cache.name
+    assert other.get("a", np.zeros(16, dtype=np.uint8))
+    other.close()
+    # closing an attached cache keeps the data
+    assert cache.get("a", np.zeros(16, dtype=np.uint8))
+
+
+def test_concurrent_readers_and_writers(cache):
+    errors = []
+
+    def write():
+        for i in range(500):
+            cache.put(i % 8, np.full(1024, i % 8, dtype=np.uint8))
+
+    def read():
+        out = np.zeros(1024, dtype=np.uint8)
+        for i in range(2000):
+            if cache.get(i % 8, out) and not np.all(out == i % 8):
+                errors.append(i)
+
+    threads = [threading.Thread(target=write) for _ in range(2)] + [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+class CountingCache(object):
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+
+    def get(self, key, out):
+        found = self.cache.get(key, out)
+        self.hits += found
+        return found
+
+    def put(self, key, tile):
+        self.cache.put(key, tile)
+
+
+def test_tiff_tile_cache():
+    with SharedTileCache(size=2**22, slot_size=2**16) as shared:
+        cache = CountingCache(shared)
+        with Tiff(TILED_GREY, tile_cache=cache) as f:
+            first = f[:]
+            assert cache.hits == 0
+            second = f[:]
+            assert cache.hits > 0
+        np.testing.assert_array_equal(first, second)
+        with Tiff(TILED_GREY) as f:
+            np.testing.assert_array_equal(first, f[:])
+
+
+def test_tiff_tile_cache_pickle():
+    with SharedTileCache(size=2**22, slot_size=2**16) as cache:
+        with Tiff(TILED_GREY, tile_cache=cache) as f:
+            data = f[:]
+            loaded = pickle.loads(pickle.dumps(f))
+        assert loaded.tile_cache.name == cache.name
+        np.testing.assert_array_equal(loaded[:], data)
+        loaded.close()
+        loaded.tile_cache.close()
+
+
+@pytest.fixture
+def disk_cache(tmpdir_factory):
+    return DiskTileCache(str(tmpdir_factory.mktemp("tiles")), size=64 * 1024)
+
+
+def test_disk_put_get(disk_cache):
+    tile = np.arange(1024, dtype=np.uint16).reshape(32, 32)
+    out = np.zeros_like(tile)
+    key = (("/data/a.tif", 100, 5), 0, 0, 1, 2, 0)
+    assert not disk_cache.get(key, out)
+    disk_cache.put(key, tile)
+    assert disk_cache.get(key, out)
+    np.testing.assert_array_equal(out, tile)
+    # a tile of another size or dtype is not returned
+    assert not disk_cache.get(key, np.zeros(10, dtype=np.uint16))
+    assert not disk_cache.get(key, np.zeros((32, 32), dtype=np.int16))
+    # the tiles stay on disk
+    other = DiskTileCache(disk_cache.directory)
+    assert other.get(key, np.zeros_like(tile))
+    assert pickle.loads(pickle.dumps(disk_cache)).get(key, np.zeros_like(tile))
+
+
+def test_disk_lru(disk_cache):
+    tiles = [np.full(8 * 1024, i, dtype=np.uint8) for i in range(7)]
+    for i, tile in enumerate(tiles):
+        disk_cache.put(i, tile)
+        # older tiles have older modification times
+        os.utime(disk_cache._path(i), (1000 + i, 1000 + i))
+    out = np.zeros(8 * 1024, dtype=np.uint8)
+    # a hit marks tile 0 as recently used
+    assert disk_cache.get(0, out)
+    for i in range(7, 10):
+        disk_cache.put(i, np.full(8 * 1024, i, dtype=np.uint8))
+    assert disk_cache._usage <= disk_cache.size
+    assert disk_cache.get(0, out) and np.all(out == 0)
+    assert not disk_cache.get(1, out)
+    assert disk_cache.get(9, out) and np.all(out == 9)
+
+
+def test_disk_clear(disk_cache):
+    disk_cache.put("a", np.ones(16, dtype=np.uint8))
+    disk_cache.clear()
+    assert not disk_cache.get("a", np.zeros(16, dtype=np.uint8))
+    assert disk_cache._usage == 0
+
+
+def _disk_worker(directory, index):
+    cache = DiskTileCache(directory, size=2**20)
+    out = np.zeros(4096, dtype=np.uint8)
+    for i in range(50):
+        cache.put(i % 10, np.full(4096, i % 10, dtype=np.uint8))
+        if cache.get((i + index) % 10, out) and not np.all(out == (i + index) % 10):
+            raise AssertionError("inconsistent tile")
+
+
+def test_disk_shared_between_processes(disk_cache):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_disk_worker, args=(disk_cache.directory, i)) for i in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+    out = np.zeros(4096, dtype=np.uint8)
+    assert all(disk_cache.get(i, out) and np.all(out == i) for i in range(10))
+
+
+def test_tiff_disk_cache(tmpdir_factory):
+    directory = str(tmpdir_factory.mktemp("tiles"))
+    cache = CountingCache(DiskTileCache(directory))
+    with Tiff(TILED_GREY, tile_cache=cache) as f:
+        first = f[:]
+    # a new handle, e.g. after a restart, reads the tiles from disk
+    cache = CountingCache(DiskTileCache(directory))
+    with Tiff(TILED_GREY, tile_cache=cache) as f:
+        np.testing.assert_array_equal(first, f[:])
+    assert cache.hits > 0
@@ -0,0 +1,114 @@
+from pytiff import *
+import numpy as np
+import pytest
+import tifffile
+
+TILED_GREY = "test_data/small_example_tiled.tif"
+NOT_TILED_GREY = "test_data/small_example.tif"
+TILED_RGB = "test_data/tiled_rgb_sample.tif"
+MULTI_PAGE = "test_data/multi_page.tif"
+
+@pytest.mark.parametrize("filename", [TILED_GREY, NOT_TILED_GREY, TILED_RGB])
+@pytest.mark.parametrize("compression", [8, 32946])
+def test_convert(filename, compression, tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("convert").join("converted.tif"))
+    convert(filename, out, tile_shape=(64, 48), compression=compression)
+
+    with tifffile.TiffFile(filename) as handle:
+        expected = handle.pages[0].asarray()
+    with tifffile.TiffFile(out) as handle:
+        page = handle.pages[0]
+        assert page.is_tiled
+        assert (page.tilelength, page.tilewidth) == (64, 48)
+        assert page.compression == compression
+        np.testing.assert_array_equal(expected, page.asarray())
+
+def test_convert_small_bands(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("convert").join("converted.tif"))
+    # bands of a single tile row
+    convert(TILED_GREY, out, tile_shape=(16, 16), band_bytes=1, workers=3)
+    with Tiff(TILED_GREY) as src, Tiff(out) as dst:
+        np.testing.assert_array_equal(src[:], dst[:])
+
+def test_convert_jpeg_strips(tmpdir_factory):
+    tmpdir = tmpdir_factory.mktemp("convert")
+    src = str(tmpdir.join("jpeg.tif"))
+    out = str(tmpdir.join("converted.tif"))
+    y, x = np.mgrid[:70, :90]
+    data = np.dstack([y * 3, x * 2, x + y]).astype(np.uint8)
+    with Tiff(src, "w") as handle:
+        handle.write(data, method="scanline", compression=7, rows_per_strip=16)
+    # jpeg strips are decoded strip by strip with the rgba interface, not as a whole page
+    convert(src, out, tile_shape=(16, 16), band_bytes=1, workers=3)
+    with Tiff(src) as handle:
+        expected = handle[:]
+    with Tiff(src) as handle, Tiff(out) as dst:
+        np.testing.assert_array_equal(expected[20:45, 10:60], handle.read((20, 45), (10, 60)))
+        np.testing.assert_array_equal(expected, dst[:])
+
+def test_convert_pages(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("convert").join("converted.tif"))
+    convert(MULTI_PAGE, out, tile_shape=(32, 32), pages=[3, 0, 2], workers=2)
+
+    with tifffile.TiffFile(MULTI_PAGE) as src, tifffile.TiffFile(out) as dst:
+        assert len(dst.pages) == 3
+        for i, p in enumerate([3, 0, 2]):
+            np.testing.assert_array_equal(src.pages[p].asarray(), dst.pages[i].asarray())
+
+def test_convert_tags(tmpdir_factory):
+    src = str(tmpdir_factory.mktemp("convert").join("src.tif"))
+    out = str(tmpdir_factory.mktemp("convert").join("converted.tif"))
+    data = np.random.randint(0, 255, size=(100, 120), dtype=np.uint8)
+    with Tiff(src, "w") as handle:
+        handle.set_tags(image_description=b"converted image", artist=b"pytiff")
+        handle.write(data, method="scanline")
+
+    convert(src, out, tile_shape=(32, 32), bigtiff=True)
+    assert is_bigtiff(out)
+    with Tiff(out) as handle:
+        assert handle.description == b"converted image"
+        assert handle.tags[tags.artist] == b"pytiff"
+        np.testing.assert_array_equal(data, handle[:])
+
+def test_copy_pages(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("copy").join("copied.tif"))
+    copy_pages(MULTI_PAGE, out, pages=[1, 3])
+    with tifffile.TiffFile(MULTI_PAGE) as src, tifffile.TiffFile(out) as dst:
+        assert len(dst.pages) == 2
+        for i, p in enumerate([1, 3]):
+            np.testing.assert_array_equal(src.pages[p].asarray(), dst.pages[i].asarray())
+
+@pytest.mark.parametrize("tile", [None, (32, 32)])
+def test_copy_pages_big_endian(tile, tmpdir_factory):
+    tmpdir = tmpdir_factory.mktemp("copy")
+    src = str(tmpdir.join("big_endian.tif"))
+    out = str(tmpdir.join("copied.tif"))
+    data = np.random.randint(0, 2**16 - 1, size=(70, 90), dtype=np.uint16)
+    tifffile.imwrite(src, data, byteorder=">", tile=tile)
+    copy_pages(src, out)
+    assert byteorder(out) == ">"
+    np.testing.assert_array_equal(data, tifffile.imread(out))
+    with Tiff(out) as handle:
+        np.testing.assert_array_equal(data, handle[:])
+    # raw samples can not be copied into a file of the other byte order
+    with Tiff(src) as handle, Tiff(str(tmpdir.join("little.tif")), "w", byteorder="<") as little:
+        with pytest.raises(ValueError):
+            little.append_page_from(handle, 0)
+
+def test_copy_pages_compressed(tmpdir_factory):
+    tmpdir = tmpdir_factory.mktemp("copy")
+    compressed = str(tmpdir.join("compressed.tif"))
+    out = str(tmpdir.join("concatenated.tif"))
+    convert(TILED_RGB, compressed, tile_shape=(64, 64), compression=8)
+
+    with Tiff(out, "w") as handle:
+        copy_pages(compressed, handle)
+        with Tiff(TILED_GREY) as grey:
+            handle.append_page_from(grey, 0)
+
+    with tifffile.TiffFile(compressed) as src, tifffile.TiffFile(TILED_GREY) as grey, tifffile.TiffFile(out) as dst:
+        assert len(dst.pages) == 2
+        assert dst.pages[0].compression == 8
+        assert dst.pages[0].tilelength == 64
+        np.testing.assert_array_equal(src.pages[0].asarray(), dst.pages[0].asarray())
+        np.testing.assert_array_equal(grey.pages[0].asarray(), dst.pages[1].asarray())
@@ -0,0 +1,114 @@
+from pytiff import *
+import numpy as np
+import pytest
+import threading
+import tifffile
+
+def write_fields(tmpdir_factory, image, positions, size, **kwargs):
+    directory = tmpdir_factory.mktemp("mosaic")
+    files = []
+    for i, (y, x) in enumerate(positions):
+        filename = str(directory.join("field_{}.tif".format(i)))
+        tifffile.imwrite(filename, image[y:y + size[0], x:x + size[1]], **kwargs)
+        files.append(filename)
+    return files
+
+@pytest.mark.parametrize("blend", ["last", "first", "mean", "linear"])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_mosaic_read(blend, workers, tmpdir_factory):
+    image = np.random.randint(0, 255, size=(300, 400), dtype=np.uint8)
+    positions = [(y, x) for y in (0, 100, 200) for x in (0, 150, 300)]
+    files = write_fields(tmpdir_factory, image, positions, (100, 100), tile=(32, 32))
+    with Mosaic(files, positions, blend=blend, workers=workers, max_open=2) as mosaic:
+        assert mosaic.shape == (300, 400)
+        expected = np.zeros_like(image)
+        for y, x in positions:
+            expected[y:y + 100, x:x + 100] = image[y:y + 100, x:x + 100]
+        np.testing.assert_array_equal(expected, mosaic[:])
+        np.testing.assert_array_equal(expected[50:250, 90:320], mosaic[50:250, 90:320])
+        np.testing.assert_array_equal([], mosaic.fields((110, 190), (110, 140)))
+
+@pytest.mark.parametrize("blend", ["last", "first", "mean", "linear"])
+def test_mosaic_overlap(blend, tmpdir_factory):
+    directory = tmpdir_factory.mktemp("mosaic")
+    files = [str(directory.join("a.tif")), str(directory.join("b.tif"))]
+    tifffile.imwrite(files[0], np.full((64, 64, 3), 100, dtype=np.uint8), tile=(16, 16), photometric="rgb")
+    tifffile.imwrite(files[1], np.full((64, 64, 3), 200, dtype=np.uint8), tile=(16, 16), photometric="rgb")
+    with Mosaic(files, [(0, 0), (0, 32)], blend=blend) as mosaic:
+        assert mosaic.shape == (64, 96, 3)
+        data = mosaic[:]
+        assert (data[:, :32] == 100).all() and (data[:, 64:] == 200).all()
+        overlap = data[:, 32:64]
+        if blend == "last":
+            assert (overlap == 200).all()
+        elif blend == "first":
+            assert (overlap == 100).all()
+        elif blend == "mean":
+            assert (overlap == 150).all()
+        else:
+            # the weight of a field grows towards its center
+            assert overlap[32, 0, 0] < overlap[32, 16, 0] < overlap[32, 31, 0]
+            assert (overlap >= 100).all() and (overlap <= 200).all()
+        np.testing.assert_array_equal(data[:, :, 1], mosaic[:, :, 1])
+
+def test_mosaic_export(tmpdir_factory):
+    image = np.random.randint(0, 2**16 - 1, size=(250, 330), dtype=np.uint16)
+    positions = [(0, 0), (0, 200), (130, 0), (130, 200)]
+    files = write_fields(tmpdir_factory, image, positions, (120, 130))
+    out = str(tmpdir_factory.mktemp("mosaic").join("export.tif"))
+    with Mosaic(files, positions, fill_value=7) as mosaic:
+        mosaic.export(out, tile_shape=(64, 64), workers=2, band_bytes=64 * 330 * 2)
+        expected = mosaic[:]
+    assert (expected[120:130] == 7).all()
+    with tifffile.TiffFile(out) as handle:
+        assert handle.pages[0].is_tiled
+        np.testing.assert_array_equal(expected, handle.pages[0].asarray())
+
+def test_mosaic_invalid(tmpdir_factory):
+    image = np.zeros((64, 64), dtype=np.uint8)
+    files = write_fields(tmpdir_factory, image, [(0, 0)], (64, 64))
+    with pytest.raises(ValueError):
+        Mosaic(files, [(0, 0), (10, 10)])
+    with pytest.raises(ValueError):
+        Mosaic(files, [(0, 0)], blend="max")
+    with pytest.raises(ValueError):
+        Mosaic(files, [(-1, 0)])
+
+class Handle(object):
+    def __init__(self, key, log):
+        self.key = key
+        self.log = log
+        log.append(("open", key))
+
+    def close(self):
+        self.log.append(("close", self.key))
+
+def test_handle_pool():
+    from pytiff._parallel import HandlePool
+    log = []
+    pool = HandlePool(lambda key: Handle(key, log), max_open=2)
+    with pool.handle("a") as a:
+        with pool.handle("b") as b:
+            assert a is not b
+    with pool.handle("a") as handle:
+        assert handle is a
+    # the least recently used file is closed
+    with pool.handle("c"):
+        pass
+    assert ("close", "b") in log and ("close", "a") not in log
+
+    # a third thread waits until a handle is released
+    first = pool.acquire("x")
+    second = pool.acquire("y")
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire("z")))
+    thread.start()
+    thread.join(0.1)
+    assert not acquired
+    pool.release("x", first)
+    thread.join()
+    assert acquired[0].key == "z"
+    pool.release("y", second)
+    pool.release("z", acquired[0])
+    pool.close()
+    assert sum(1 for entry in log if entry[0] == "open") == sum(1 for entry in log if entry[0] == "close")
@@ -52,3 +52,14 @@ def test_cpickle_multipage():
     loaded_data = loaded[:]
     loaded.close()
     np.testing.assert_array_equal(data, loaded_data)
+
+def test_pickle_memory():
+    with open(MULTI_PAGE, "rb") as f:
+        t = Tiff(f.read())
+    t.set_page(1)
+    data = t[:]
+    loaded = pickle.loads(pickle.dumps(t))
+    t.close()
+    assert loaded.current_page == 1
+    np.testing.assert_array_equal(data, loaded[:])
+    loaded.close()
@@ -0,0 +1,49 @@
+from pytiff import *
+import numpy as np
+import pytest
+from scipy import ndimage
+
+TILED_GREY = "test_data/small_example_tiled.tif"
+NOT_TILED_GREY = "test_data/small_example.tif"
+TILED_RGB = "test_data/tiled_rgb_sample.tif"
+MULTI_PAGE = "test_data/multi_page.tif"
+
+def smooth(block):
+    return ndimage.uniform_filter(block.astype(np.float32), 5, mode="reflect")
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("filename", [TILED_GREY, NOT_TILED_GREY])
+def test_map_tiles_halo(filename, workers, tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("pipeline").join("smooth.tif"))
+    map_tiles(smooth, filename, out, halo=2, workers=workers, out_dtype=np.float32, tile_shape=(64, 48))
+    with Tiff(filename) as src, Tiff(out) as dst:
+        assert dst.dtype == np.float32
+        np.testing.assert_allclose(smooth(src[:]), dst[:], rtol=1e-5)
+
+def test_map_tiles_processes(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("pipeline").join("smooth.tif"))
+    map_tiles(smooth, TILED_GREY, out, halo=2, workers=2, processes=True, out_dtype=np.float32)
+    with Tiff(TILED_GREY) as src, Tiff(out) as dst:
+        np.testing.assert_allclose(smooth(src[:]), dst[:], rtol=1e-5)
+
+def test_map_tiles_channels(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("pipeline").join("grey.tif"))
+    map_tiles(lambda block: block.mean(axis=2) > 100, TILED_RGB, out, out_dtype=bool)
+    with Tiff(TILED_RGB) as src, Tiff(out) as dst:
+        assert dst.shape == src.shape[:2]
+        np.testing.assert_array_equal(src[:].mean(axis=2) > 100, dst[:])
+
+def test_map_tiles_pages(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("pipeline").join("pages.tif"))
+    map_tiles(lambda block: 255 - block, MULTI_PAGE, out, pages=[1, 3], workers=2)
+    with Tiff(MULTI_PAGE) as src, Tiff(out) as dst:
+        assert dst.number_of_pages == 2
+        for i, p in enumerate([1, 3]):
+            src.set_page(p)
+            dst.set_page(i)
+            np.testing.assert_array_equal(255 - src[:], dst[:])
+
+def test_map_tiles_wrong_shape(tmpdir_factory):
+    out = str(tmpdir_factory.mktemp("pipeline").join("wrong.tif"))
+    with pytest.raises(ValueError):
+        map_tiles(lambda block: block[1:], TILED_GREY, out)
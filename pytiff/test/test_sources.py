@@ -0,0 +1,93 @@
+from pytiff import *
+import numpy as np
+import pytest
+import threading
+try:
+    from http.server import HTTPServer, SimpleHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+TILED_GREY = "test_data/small_example_tiled.tif"
+TILED_BIG = "test_data/bigtif_example_tiled.tif"
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serve the test data with support for single range requests."""
+    def do_GET(self):
+        with open(self.path.lstrip("/"), "rb") as f:
+            data = f.read()
+        start, end = self.headers["Range"].split("=")[1].split("-")
+        start, end = int(start), min(int(end), len(data) - 1)
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, len(data)))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_block_reader():
+    with open(TILED_GREY, "rb") as f:
+        content = f.read()
+    reader = BlockReader(FileSource(TILED_GREY), block_size=1000, cache_size=10000)
+    assert reader.pread(0, len(content) + 10) == content
+    assert reader.stats.requests == 1
+
+    reader.seek(1500)
+    assert reader.read(2000) == content[1500:3500]
+    assert reader.tell() == 3500
+    buffer = bytearray(100)
+    reader.seek(-100, 2)
+    assert reader.readinto(buffer) == 100
+    assert bytes(buffer) == content[-100:]
+
+def test_block_reader_coalescing():
+    reader = BlockReader(FileSource(TILED_GREY), block_size=1024, readahead=0)
+    reader.prefetch([(0, 100), (500, 100), (5000, 10), (5100, 10), (100000, 10)])
+    # (0, 600) and (5000, 5110) are merged, (100000, 100010) is read separately
+    assert reader.stats.requests == 3
+    reader.pread(0, 600)
+    reader.pread(5000, 110)
+    assert reader.stats.requests == 3
+
+def test_block_reader_readahead():
+    reader = BlockReader(FileSource(TILED_GREY), block_size=1024, readahead=4096)
+    reader.pread(0, 10)
+    reader.pread(1024, 4096)
+    assert reader.stats.requests == 1
+    counts, edges = reader.stats.latency_histogram()
+    assert counts.sum() == 1
+
+def test_tiff_block_reader():
+    with Tiff(TILED_BIG) as tif:
+        expected = tif[:]
+    source = FileSource(TILED_BIG, latency=0.001)
+    reader = BlockReader(source, block_size=4096, readahead=0)
+    with Tiff(reader) as tif:
+        reader.stats.reset()
+        np.testing.assert_array_equal(expected[10:300, 20:400], tif[10:300, 20:400])
+        # the four tiles are stored next to each other and fetched together
+        assert reader.stats.requests <= 2
+        pages = tif.pages
+        np.testing.assert_array_equal(expected, pages[0][:])
+
+def test_http_range_source(server):
+    with Tiff(TILED_GREY) as tif:
+        expected = tif[:]
+    source = HTTPRangeSource(server + "/" + TILED_GREY)
+    with open(TILED_GREY, "rb") as f:
+        assert source.size() == len(f.read())
+    with Tiff(source) as tif:
+        np.testing.assert_array_equal(expected, tif[:])
+        np.testing.assert_array_equal(expected[100:200, 300:400], tif[100:200, 300:400])
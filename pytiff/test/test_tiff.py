@@ -160,3 +160,191 @@ def read_methods(filename):
         chunk = tif[100:200, 250:350]
         np.testing.assert_array_equal(first_page[100:200, 250:350], chunk)
 
+
+def test_read_stack(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("stack").join("stack.tif"))
+    stack = np.random.randint(0, 255, size=(6, 80, 70), dtype=np.uint8)
+    with Tiff(filename, "w") as handle:
+        for page in stack:
+            handle.write(page, method="tile", tile_length=16, tile_width=16)
+
+    with Tiff(filename) as tif:
+        data = tif.read_stack(slice(1, 5), (10, 50), (20, 60))
+        np.testing.assert_array_equal(stack[1:5, 10:50, 20:60], data)
+        assert tif.current_page == 0
+
+        data = tif.read_stack([5, 0, 3], workers=2)
+        np.testing.assert_array_equal(stack[[5, 0, 3]], data)
+
+        out = np.zeros((6, 40, 40), dtype=np.uint8)
+        res = tif.read_stack(None, (0, 40), (30, 70), out=out, workers=3)
+        assert res is out
+        np.testing.assert_array_equal(stack[:, :40, 30:], out)
+
+        np.testing.assert_array_equal(stack[2:4, 5:25, :30], tif[2:4, 5:25, :30])
+        np.testing.assert_array_equal(stack[:, 5:25, :30], tif[:, 5:25, :30])
+        np.testing.assert_array_equal(stack[3, 5:25, :30], tif[3, 5:25, :30, :])
+
+@pytest.mark.parametrize("filename", [TILED_GREY, NOT_TILED_GREY, TILED_RGB, TILED_BIG])
+def test_read_memory(filename):
+    import io
+    with open(filename, "rb") as f:
+        content = f.read()
+    with Tiff(filename) as tif:
+        expected = tif[:]
+
+    for source in [content, bytearray(content), memoryview(content), io.BytesIO(content)]:
+        with Tiff(source) as tif:
+            assert tif.filename is None
+            np.testing.assert_array_equal(expected, tif[:])
+            np.testing.assert_array_equal(expected[100:200, 50:300], tif[100:200, 50:300])
+
+def test_write_memory():
+    import io
+    data = np.random.randint(0, 2**16 - 1, size=(100, 80), dtype=np.uint16)
+    stream = io.BytesIO()
+    with Tiff(stream, "w") as tif:
+        tif.write(data, method="tile", tile_length=32, tile_width=32)
+        tif.write(data[::-1], method="scanline")
+
+    content = stream.getvalue()
+    with Tiff(content) as tif:
+        assert tif.number_of_pages == 2
+        np.testing.assert_array_equal(data, tif[:])
+        tif.set_page(1)
+        np.testing.assert_array_equal(data[::-1], tif[:])
+
+def test_write_memory_buffer_fails():
+    with open(TILED_GREY, "rb") as f:
+        content = f.read()
+    with pytest.raises(ValueError):
+        Tiff(content, "w")
+
+@pytest.mark.parametrize("filename", [TILED_GREY, NOT_TILED_GREY, TILED_RGB])
+def test_read_into(filename):
+    with Tiff(filename) as tif:
+        expected = tif[:]
+        np.testing.assert_array_equal(expected[10:90, 20:250], tif.read((10, 90), (20, 250)))
+
+        scaled = tif.read((10, 90), (20, 250), scale=(0.5, 1))
+        assert scaled.dtype == np.float32
+        np.testing.assert_allclose(scaled, expected[10:90, 20:250] * 0.5 + 1)
+
+        batch = np.zeros((3, 80, 230) + expected.shape[2:], dtype=np.float64)
+        result = tif.read((10, 90), (20, 250), out=batch[1], scale=1. / 255)
+        assert result.base is batch
+        np.testing.assert_allclose(batch[1], expected[10:90, 20:250] / 255.)
+        assert not batch[0].any() and not batch[2].any()
+
+        with pytest.raises(ValueError):
+            tif.read((10, 90), (20, 250), out=np.zeros((10, 10), dtype=np.float64))
+
+def test_read_channels():
+    with Tiff(TILED_RGB) as tif:
+        expected = tif[:]
+        np.testing.assert_array_equal(expected[:50, :60, [2, 0]], tif.read((0, 50), (0, 60), channels=[2, 0]))
+        np.testing.assert_array_equal(expected[:50, :60, 1], tif.read((0, 50), (0, 60), channels=1))
+        out = np.zeros((60, 50, 1), dtype=np.uint16)
+        tif.read((0, 50), (0, 60), out=out.transpose(1, 0, 2), channels=[0])
+        np.testing.assert_array_equal(expected[:50, :60, 0].T, out[:, :, 0])
+        with pytest.raises(IndexError):
+            tif.read(channels=[5])
+
+@pytest.mark.parametrize("tiled", [True, False])
+def test_read_planar_channels(tiled, tmpdir_factory):
+    import tifffile
+    data = np.random.randint(0, 2**16 - 1, size=(7, 100, 90), dtype=np.uint16)
+    filename = str(tmpdir_factory.mktemp("planar").join("planar.tif"))
+    tifffile.imwrite(filename, data, planarconfig="separate", photometric="minisblack",
+                     tile=(32, 32) if tiled else None)
+    expected = np.moveaxis(data, 0, -1)
+
+    with Tiff(filename) as tif:
+        assert tif.dtype == np.uint16
+        np.testing.assert_array_equal(expected, tif[:])
+        np.testing.assert_array_equal(expected[10:60, 5:70, [2, 5]], tif[10:60, 5:70, [2, 5]])
+        np.testing.assert_array_equal(expected[10:60, 5:70, 3], tif[10:60, 5:70, 3])
+        np.testing.assert_array_equal(expected[10:60, 5:70, 1:4], tif[10:60, 5:70, 1:4])
+        np.testing.assert_array_equal(expected[:, :, [6, 0]], tif.read(channels=[6, 0]))
+
+@pytest.mark.parametrize("method", ["tile", "scanline"])
+def test_write_planar(method, tmpdir_factory):
+    import tifffile
+    data = np.random.randint(0, 255, size=(70, 50, 5), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("planar").join("planar.tif"))
+    with Tiff(filename, "w") as tif:
+        tif.write(data, method=method, planar_config=2, tile_shape=(32, 32))
+
+    with tifffile.TiffFile(filename) as tif:
+        assert tif.pages[0].planarconfig == 2
+        np.testing.assert_array_equal(np.moveaxis(data, -1, 0), tif.asarray())
+    with Tiff(filename) as tif:
+        np.testing.assert_array_equal(data[:, :, [4, 1]], tif[:, :, [4, 1]])
+
+def test_write_planar_chunks(tmpdir_factory):
+    data = np.random.randint(0, 2**16 - 1, size=(100, 80, 3), dtype=np.uint16)
+    filename = str(tmpdir_factory.mktemp("planar").join("planar_chunks.tif"))
+    with Tiff(filename, "w") as tif:
+        tif.new_page(data.shape, data.dtype, planar_config=2, photometric=1, tile_shape=(32, 32))
+        # chunks start at tile boundaries
+        tif[:64, :] = data[:64]
+        tif[64:, :] = data[64:]
+    with Tiff(filename) as tif:
+        np.testing.assert_array_equal(data, tif[:])
+        np.testing.assert_array_equal(data[20:90, :, 2], tif.read((20, 90), channels=2))
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_read_masked(workers):
+    mask = np.zeros((50, 50), dtype=bool)
+    mask[5:10, 30:32] = True
+    with Tiff(TILED_GREY) as tif:
+        expected = tif[:]
+        tiles = list(tif.iter_masked_tiles(mask, workers=workers))
+        assert sorted((y, x) for y, x, _ in tiles) == [(0, 256)]
+        for y, x, tile in tiles:
+            np.testing.assert_array_equal(expected[y:y + 256, x:x + 256], tile)
+
+        result = tif.read_masked(mask, fill=3, workers=workers)
+        np.testing.assert_array_equal(expected[:256, 256:], result[:256, 256:])
+        assert np.all(result[256:] == 3) and np.all(result[:, :256] == 3)
+        assert np.all(tif.read_masked(mask * 0) == 0)
+
+@pytest.mark.parametrize("filename", [TILED_GREY, TILED_RGB])
+def test_read_patch(filename):
+    data = tifffile.imread(filename)
+    with Tiff(filename) as tif:
+        for y, x, h, w in [(0, 0, 16, 16), (10, 250, 64, 64), (3, 5, 1, 1), (480, 490, 64, 64)]:
+            patch = tif.read_patch(y, x, h, w)
+            np.testing.assert_array_equal(data[y:y + h, x:x + w], patch)
+            np.testing.assert_array_equal(patch, tif[y:y + h, x:x + w])
+        # the reused tile buffer must not leak into returned arrays
+        first = tif.read_patch(0, 0, 8, 8)
+        tif.read_patch(300, 300, 8, 8)
+        np.testing.assert_array_equal(data[:8, :8], first)
+        np.testing.assert_array_equal(data[100:], tif[100:])
+
+@pytest.mark.parametrize("filename", [NOT_TILED_GREY, NOT_TILED_RGB])
+def test_read_striped_slices(filename):
+    data = tifffile.imread(filename)
+    with Tiff(filename) as tif:
+        np.testing.assert_array_equal(data, tif[:])
+        np.testing.assert_array_equal(data[10:50], tif[10:50])
+        np.testing.assert_array_equal(data[10:50, 20:30], tif[10:50, 20:30])
+
+def test_read_bilevel_default_bits(tmpdir_factory):
+    # tifffile leaves out BitsPerSample for bilevel images, the default of the specification is 1
+    data = np.random.rand(40, 50) > 0.5
+    filename = str(tmpdir_factory.mktemp("read").join("bilevel.tif"))
+    tifffile.imwrite(filename, data)
+    with Tiff(filename) as tif:
+        assert tif.n_bits[0] == 1
+        np.testing.assert_array_equal(data, tif[:])
+        np.testing.assert_array_equal(np.packbits(data, axis=-1), tif.read_packed())
+
+def test_open_unsupported_dtype(tmpdir_factory):
+    # complex samples can not be read, but the file can be opened and its tags read
+    filename = str(tmpdir_factory.mktemp("read").join("complex.tif"))
+    tifffile.imwrite(filename, np.zeros((20, 30), dtype=np.complex64), tile=(16, 16), description="complex")
+    with Tiff(filename) as tif:
+        assert tif.shape == (20, 30)
+        assert tif.description == b"complex"
@@ -0,0 +1,73 @@
+from pytiff import *
+import numpy as np
+import pytest
+
+def test_auto_tile_shape_multiple_of_16():
+    for access in ["patches", "rows", "full"]:
+        for shape in [(20, 30), (500, 500), (50000, 40000)]:
+            tile_length, tile_width = auto_tile_shape(shape, np.uint8, access=access)
+            assert tile_length % 16 == 0 and tile_width % 16 == 0
+            assert tile_length > 0 and tile_width > 0
+
+def test_auto_tile_shape_access():
+    shape = (50000, 40000)
+    patches = auto_tile_shape(shape, np.uint8, access="patches", patch_size=64)
+    rows = auto_tile_shape(shape, np.uint8, access="rows", patch_size=64)
+    full = auto_tile_shape(shape, np.uint8, access="full")
+    assert patches[0] * patches[1] < full[0] * full[1]
+    # row access prefers wide tiles
+    assert rows[1] > rows[0]
+    # larger pixels lead to smaller tiles
+    rgb = auto_tile_shape(shape, np.uint16, samples=3, access="patches", patch_size=64)
+    assert rgb[0] * rgb[1] <= patches[0] * patches[1]
+
+def test_auto_tile_shape_invalid_access():
+    with pytest.raises(ValueError):
+        auto_tile_shape((100, 100), np.uint8, access="random")
+
+def test_replay_windows():
+    windows = [(0, 0, 256, 256), (1000, 500, 64, 64)]
+    result = replay_windows(windows, (4096, 4096), [(256, 256), (512, 512)])
+    assert result[(256, 256)] == 5 * 256 * 256
+    assert result[(512, 512)] == 5 * 512 * 512
+    # windows outside of the image are clipped
+    result = replay_windows([(4000, 4000, 512, 512)], (4096, 4096), [(256, 256)], dtype=np.uint16)
+    assert result[(256, 256)] == 256 * 256 * 2
+
+def test_write_auto_tile_shape(tmpdir_factory):
+    data = np.random.randint(0, 255, size=(300, 200), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("write").join("auto_tiles.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.write(data, method="tile", tile_shape="auto", access="patches", patch_size=64)
+    with Tiff(filename) as handle:
+        assert handle.tags[tags.tile_length] % 16 == 0
+        assert handle.tags[tags.tile_width] % 16 == 0
+        np.testing.assert_array_equal(data, handle[:])
+
+def test_write_invalid_tile_shape(tmpdir_factory):
+    data = np.zeros((32, 32), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("write").join("invalid_tiles.tif"))
+    with Tiff(filename, "w") as handle:
+        with pytest.raises(ValueError):
+            handle.write(data, method="tile", tile_shape=(20, 20))
+
+def test_tiles_in_mask():
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[2, 3] = True
+    grid = tiles_in_mask(mask, (1000, 1000), (256, 256))
+    assert grid.shape == (4, 4)
+    assert list(zip(*grid.nonzero())) == [(0, 1), (1, 1)]
+    # the scale can be given explicitly
+    grid = tiles_in_mask(mask, (1000, 1000), (256, 256), mask_scale=50)
+    assert list(zip(*grid.nonzero())) == [(0, 0)]
+    assert not tiles_in_mask(np.zeros((5, 5)), (100, 100), (16, 16)).any()
+
+def test_tiles_in_mask_brute_force():
+    mask = np.random.rand(37, 53) > 0.97
+    grid = tiles_in_mask(mask, (1000, 1500), (64, 128))
+    scale_y, scale_x = 1000 / 37., 1500 / 53.
+    for ty in range(grid.shape[0]):
+        for tx in range(grid.shape[1]):
+            y0, y1 = int(np.floor(ty * 64 / scale_y)), int(np.ceil(min(ty * 64 + 64, 1000) / scale_y))
+            x0, x1 = int(np.floor(tx * 128 / scale_x)), int(np.ceil(min(tx * 128 + 128, 1500) / scale_x))
+            assert mask[y0:y1, x0:x1].any() == grid[ty, tx]
@@ -1,4 +1,7 @@
 from pytiff import byteorder, is_bigtiff
+from pytiff.utils import pack_samples, unpack_samples, sample_dtype, scan
+import numpy as np
+import pytest
 
 def test_byteorder():
     assert byteorder("test_data/small_example.tif") == "<"
@@ -7,3 +10,46 @@ def test_byteorder():
 def test_is_bigtiff():
     assert not is_bigtiff("test_data/small_example.tif")
     assert is_bigtiff("test_data/bigtif_example.tif")
+
+@pytest.mark.parametrize("n_bits", [1, 2, 4, 8, 12])
+def test_pack_samples(n_bits):
+    data = np.random.randint(0, 2**n_bits, size=(9, 37, 3)).astype(sample_dtype(n_bits))
+    packed = pack_samples(data, n_bits)
+    assert packed.shape == (9, -(-37 * 3 * n_bits // 8))
+    np.testing.assert_array_equal(data.reshape(9, -1), unpack_samples(packed, n_bits, 37 * 3))
+    np.testing.assert_array_equal(data.reshape(9, -1)[:, 5:40], unpack_samples(packed, n_bits, 35, start=5))
+
+def test_pack_samples_msb_first():
+    assert pack_samples(np.array([[1, 0, 1, 1]], dtype=bool), 1).tolist() == [[0b10110000]]
+    assert pack_samples(np.array([[0xabc, 0x123]], dtype=np.uint16), 12).tolist() == [[0xab, 0xc1, 0x23]]
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.int16, np.uint16, np.float32, np.float64])
+@pytest.mark.parametrize("bigtiff,byteorder", [(False, "<"), (True, "<"), (False, ">")])
+def test_scan(dtype, bigtiff, byteorder, tmpdir_factory):
+    import tifffile
+    filename = str(tmpdir_factory.mktemp("scan").join("pages.tif"))
+    with tifffile.TiffWriter(filename, bigtiff=bigtiff, byteorder=byteorder) as handle:
+        handle.write(np.zeros((100, 70), dtype=dtype), tile=(32, 48))
+        handle.write(np.zeros((60, 50, 3), dtype=dtype), rowsperstrip=7, photometric="rgb")
+    pages = scan(filename, offsets=True)[0]
+    assert len(pages) == 2
+    assert pages[0]["shape"] == (100, 70) and pages[0]["tile_shape"] == (32, 48)
+    assert pages[1]["shape"] == (60, 50, 3) and pages[1]["tile_shape"] is None and pages[1]["rows_per_strip"] == 7
+    with tifffile.TiffFile(filename) as handle:
+        for record, page in zip(pages, handle.pages):
+            assert record["dtype"] == page.dtype
+            np.testing.assert_array_equal(record["offsets"], page.dataoffsets)
+            np.testing.assert_array_equal(record["byte_counts"], page.databytecounts)
+
+def test_scan_files(tmpdir_factory):
+    files = ["test_data/small_example_tiled.tif", "test_data/multi_page.tif", "test_data/bigtif_example.tif"]
+    broken = str(tmpdir_factory.mktemp("scan").join("broken.tif"))
+    with open(broken, "wb") as handle:
+        handle.write(b"no tiff")
+    records = scan(files + [broken], workers=3, errors="ignore")
+    assert [len(r) for r in records[:3]] == [1, 4, 1]
+    assert records[0][0]["tile_shape"] == (256, 256)
+    assert "offsets" not in records[0][0]
+    assert records[3] is None
+    with pytest.raises(IOError):
+        scan([broken])
@@ -2,6 +2,7 @@ from hypothesis import HealthCheck
 from hypothesis import given, settings
 from hypothesis.extra import numpy as hnp
 from pytiff import *
+from pytiff.utils import pack_samples
 import hypothesis.strategies as st
 import numpy as np
 import pytest
@@ -183,3 +184,209 @@ def test_write_chunk_multiple_pages(tmpdir_factory):
             assert data.shape == chunk.shape
             assert np.all(data == chunk)
 
+
+@pytest.mark.parametrize("method", ["tile", "scanline"])
+def test_write_bool(method, tmpdir_factory):
+    data = np.random.rand(70, 90) > 0.5
+    filename = str(tmpdir_factory.mktemp("write").join("mask.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.write(data, method=method, tile_shape=(32, 32))
+
+    with tifffile.TiffFile(filename) as handle:
+        assert handle.pages[0].bitspersample == 1
+        np.testing.assert_array_equal(data, handle.asarray())
+    with Tiff(filename) as handle:
+        assert handle.dtype == np.bool_
+        np.testing.assert_array_equal(data, handle[:])
+        np.testing.assert_array_equal(data[13:51, 7:77], handle[13:51, 7:77])
+        packed = handle.read_packed((13, 51), (7, 77))
+        np.testing.assert_array_equal(np.packbits(data[13:51, 7:77], axis=-1), packed)
+
+@pytest.mark.parametrize("n_bits,dtype", [(2, np.uint8), (4, np.uint8), (12, np.uint16)])
+@pytest.mark.parametrize("method", ["tile", "scanline"])
+def test_write_sub_byte(n_bits, dtype, method, tmpdir_factory):
+    data = np.random.randint(0, 2**n_bits, size=(50, 70)).astype(dtype)
+    filename = str(tmpdir_factory.mktemp("write").join("bits.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.write(data, method=method, tile_shape=(16, 32), n_bits=n_bits)
+    with Tiff(filename) as handle:
+        assert handle.n_bits[0] == n_bits
+        assert handle.dtype == dtype
+        np.testing.assert_array_equal(data, handle[:])
+        np.testing.assert_array_equal(data[5:33, 3:61], handle[5:33, 3:61])
+        for y_range, x_range in [((5, 33), (3, 61)), ((0, 50), (32, 70)), ((17, 18), (0, 70))]:
+            expected = pack_samples(data[slice(*y_range), slice(*x_range)], n_bits)
+            np.testing.assert_array_equal(expected, handle.read_packed(y_range, x_range))
+
+def test_write_chunk_bool(tmpdir_factory):
+    data = np.random.rand(100, 120) > 0.5
+    filename = str(tmpdir_factory.mktemp("write").join("mask_chunk.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.new_page(data.shape, bool, tile_shape=(32, 32))
+        handle[:64, :] = data[:64]
+        handle[64:, :] = data[64:]
+    with Tiff(filename) as handle:
+        np.testing.assert_array_equal(data, handle[:])
+
+def test_write_invalid_bits(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("write").join("bits.tif"))
+    with Tiff(filename, "w") as handle:
+        with pytest.raises(ValueError):
+            handle.write(np.zeros((16, 16), dtype=np.float32), n_bits=4)
+
+@pytest.mark.parametrize("fill_value", [0, 255])
+def test_write_skip_empty(fill_value, tmpdir_factory):
+    data = np.full((100, 130), fill_value, dtype=np.uint8)
+    data[40:50, 70:90] = 7
+    filename = str(tmpdir_factory.mktemp("write").join("sparse.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.write(data, tile_shape=(32, 32), skip_empty=True, fill_value=fill_value)
+
+    with tifffile.TiffFile(filename) as handle:
+        counts = np.array(handle.pages[0].databytecounts)
+        assert np.count_nonzero(counts) == 1
+        assert handle.pages[0].tags["GDAL_NODATA"].value == str(fill_value)
+    with Tiff(filename) as handle:
+        np.testing.assert_array_equal(handle.nonempty_tiles(), [[32, 64]])
+        assert handle.fill_value == fill_value
+        np.testing.assert_array_equal(data, handle[:])
+        np.testing.assert_array_equal(data[10:60, 50:100], handle.read((10, 60), (50, 100)))
+
+@pytest.mark.parametrize("chunks", [False, True])
+def test_write_skip_empty_background(chunks, tmpdir_factory):
+    data = np.full((70, 90), 9, dtype=np.uint16)
+    filename = str(tmpdir_factory.mktemp("write").join("background.tif"))
+    with Tiff(filename, "w") as handle:
+        if chunks:
+            handle.new_page(data.shape, data.dtype, tile_shape=(32, 32), skip_empty=True, fill_value=9)
+            handle[:, :] = data
+            handle.save_page()
+        else:
+            handle.write(data, tile_shape=(32, 32), skip_empty=True, fill_value=9)
+    # the offsets and byte counts are needed, so one tile is stored
+    np.testing.assert_array_equal(data, tifffile.imread(filename))
+    with Tiff(filename) as handle:
+        assert len(handle.nonempty_tiles()) <= 1
+        np.testing.assert_array_equal(data, handle[:])
+
+def test_read_fill_value_per_page(tmpdir_factory, capfd):
+    sparse = np.full((64, 64), 3, dtype=np.uint8)
+    sparse[:16, :16] = 1
+    dense = np.zeros((64, 64), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("write").join("mixed.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.write(sparse, tile_shape=(32, 32), skip_empty=True, fill_value=3)
+        handle.write(dense, tile_shape=(32, 32))
+    with Tiff(filename) as handle:
+        assert handle.fill_value == 3
+        np.testing.assert_array_equal(sparse, handle[:])
+        handle.set_page(1)
+        assert handle.fill_value == 0
+        np.testing.assert_array_equal(dense, handle[:])
+    # libtiff knows the nodata tag, it does not warn about it
+    assert "42113" not in capfd.readouterr().err
+
+def test_write_chunk_skip_empty(tmpdir_factory):
+    data = np.zeros((64, 64), dtype=np.uint16)
+    data[:16, :16] = 1
+    filename = str(tmpdir_factory.mktemp("write").join("sparse_chunks.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.new_page(data.shape, data.dtype, tile_shape=(32, 32), skip_empty=True)
+        handle[:, :] = data
+    with Tiff(filename) as handle:
+        np.testing.assert_array_equal(handle.nonempty_tiles(), [[0, 0]])
+        np.testing.assert_array_equal(data, handle[:])
+
+@pytest.mark.parametrize("method", ["tile", "scanline"])
+def test_write_background(method, tmpdir_factory):
+    data = np.random.randint(0, 2**16 - 1, size=(300, 200), dtype=np.uint16)
+    filename = str(tmpdir_factory.mktemp("write").join("background.tif"))
+    with Tiff(filename, "w", write_queue=2) as handle:
+        handle.write(data, method=method, tile_shape=(32, 32))
+        handle.write(data[::-1], method=method, tile_shape=(32, 32))
+    with tifffile.TiffFile(filename) as handle:
+        np.testing.assert_array_equal(data, handle.pages[0].asarray())
+        np.testing.assert_array_equal(data[::-1], handle.pages[1].asarray())
+
+def test_write_chunk_background(tmpdir_factory):
+    data = np.random.randint(0, 255, size=(256, 192), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("write").join("background_chunks.tif"))
+    with Tiff(filename, "w", write_queue=4) as handle:
+        handle.new_page(data.shape, data.dtype, tile_shape=(64, 64))
+        block = np.empty((64, 192), dtype=np.uint8)
+        for y in range(0, 256, 64):
+            # the block is reused, queued tiles must not change
+            block[:] = data[y:y + 64]
+            handle[y:y + 64, :] = block
+        handle.set_tags(image_description="background")
+        handle.save_page()
+    with Tiff(filename) as handle:
+        np.testing.assert_array_equal(data, handle[:])
+        assert handle.description == b"background"
+
+def test_write_background_error(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("write").join("background_error.tif"))
+    handle = Tiff(filename, "w", write_queue=2)
+    handle.new_page((64, 64), np.uint8, tile_shape=(32, 32))
+    # outside of the image, the error is raised when the page is saved
+    handle._write_chunk(np.zeros((32, 32), dtype=np.uint8), x_pos=1024, y_pos=0)
+    with pytest.raises(IOError):
+        handle.save_page()
+    handle.close()
+
+def test_background_writer():
+    from pytiff._parallel import BackgroundWriter
+    results = []
+    writer = BackgroundWriter(2)
+    for i in range(20):
+        writer.submit(results.append, i)
+    writer.flush()
+    assert results == list(range(20))
+
+    def fail(i):
+        raise IOError("failed {}".format(i))
+    writer.submit(fail, 1)
+    writer.submit(results.append, 99)
+    with pytest.raises(IOError):
+        writer.flush()
+    assert 99 not in results
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(results.append, 1)
+
+@pytest.mark.parametrize("compression", [1, 8, 32946])
+def test_write_volume(tmpdir_factory, compression):
+    data = np.random.randint(0, 2**16 - 1, size=(40, 50, 70), dtype=np.uint16)
+    filename = str(tmpdir_factory.mktemp("write").join("volume.tif"))
+    with Tiff(filename, "w") as handle:
+        handle.new_page(data.shape, data.dtype, tile_shape=(16, 32, 32), compression=compression)
+        for z in range(0, 40, 16):
+            handle[z:z + 16] = data[z:z + 16]
+        handle.save_page()
+    with tifffile.TiffFile(filename) as handle:
+        assert handle.pages[0].imagedepth == 40
+        assert handle.pages[0].tiledepth == 16
+        np.testing.assert_array_equal(data, handle.pages[0].asarray())
+    with Tiff(filename) as handle:
+        assert handle.shape == data.shape
+        np.testing.assert_array_equal(data, handle[:])
+        np.testing.assert_array_equal(data[5:30, 10:45, 33:70], handle[5:30, 10:45, 33:])
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_read_volume(tmpdir_factory, compression):
+    data = np.random.randint(0, 255, size=(20, 40, 50, 3), dtype=np.uint8)
+    filename = str(tmpdir_factory.mktemp("write").join("volume_rgb.tif"))
+    tifffile.imwrite(filename, data, tile=(8, 16, 16), volumetric=True, photometric="rgb", compression=compression)
+    with Tiff(filename) as handle:
+        assert handle.shape == (20, 40, 50, 3)
+        np.testing.assert_array_equal(data[3:17, 5:21, 7:40], handle[3:17, 5:21, 7:40])
+        np.testing.assert_array_equal(data[:, :, :, 1], handle[:, :, :, 1])
+        out = np.zeros((8, 16, 16, 3), dtype=np.uint8)
+        handle.read_volume((8, 16), (16, 32), (0, 16), out=out)
+        np.testing.assert_array_equal(data[8:16, 16:32, :16], out)
+
+def test_write_volume_compression(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("write").join("volume_lzw.tif"))
+    with Tiff(filename, "w") as handle:
+        with pytest.raises(ValueError):
+            handle.new_page((20, 32, 32), np.uint8, tile_shape=(8, 16, 16), compression=5)
@@ -0,0 +1,200 @@
+import numpy as np
+
+# libtiff requires tile length and width to be multiples of 16
+TILE_MULTIPLE = 16
+
+# Approximate fixed cost of touching one tile, expressed in decoded bytes.
+# It accounts for the seek/read call, the codec setup and the per tile python overhead.
+# code: overhead in bytes
+_TILE_OVERHEAD = {
+    1: 16384,       # no compression
+    5: 32768,       # lzw
+    7: 65536,       # jpeg
+    8: 32768,       # adobe deflate
+    32773: 16384,   # packbits
+    32946: 32768,   # deflate
+    34925: 65536,   # lzma
+    50000: 32768,   # zstd
+}
+_DEFAULT_COMPRESSED_OVERHEAD = 32768
+
+ACCESS_PATTERNS = ("patches", "rows", "full")
+
+
+def round_tile_size(value):
+    """Round a tile dimension up to the next multiple of 16.
+
+    Args:
+        value (int): requested tile dimension.
+
+    Returns:
+        int: the smallest multiple of 16 that is larger or equal to value (at least 16).
+    """
+    value = max(int(value), 1)
+    return int(-(-value // TILE_MULTIPLE) * TILE_MULTIPLE)
+
+
+def _pair(value):
+    if np.ndim(value) == 0:
+        return int(value), int(value)
+    return int(value[0]), int(value[1])
+
+
+def _expected_tiles(window, tile, size, aligned):
+    """Expected number of tiles touched along one axis.
+
+    For unaligned windows the window origin is assumed to be uniformly distributed.
+    """
+    n_tiles = np.ceil(size / tile)
+    if aligned:
+        expected = np.ceil(window / tile)
+    else:
+        expected = (window - 1) / tile + 1
+    return np.minimum(expected, n_tiles)
+
+
+def auto_tile_shape(image_shape, dtype, samples=1, compression=1, access="patches",
+                    patch_size=256, max_tile_size=1024, max_tile_bytes=4*2**20):
+    """Choose a tile shape for an image and an expected access pattern.
+
+    Every candidate tile shape (multiples of 16) is scored by the number of bytes that have
+    to be decoded for a typical read plus a fixed overhead per touched tile, which depends on
+    the compression. The shape with the lowest cost is returned.
+
+    Args:
+        image_shape (tuple): (image length, image width) of the page.
+        dtype (np.dtype): data type of a sample.
+        samples (int): samples per pixel. Default: 1
+        compression (int): libtiff compression code. Default: 1 (no compression)
+        access (str): expected access pattern. "patches" for random windows of size patch_size,
+                      "rows" for bands of patch_size rows spanning the whole width,
+                      "full" for reading whole pages. Default: "patches"
+        patch_size (int or tuple): typical window (length, width) for "patches" or number
+                                   of rows for "rows". Default: 256
+        max_tile_size (int): upper bound for the tile length and width. Default: 1024
+        max_tile_bytes (int): upper bound for the decoded size of a tile. Default: 4 MiB
+
+    Returns:
+        tuple: (tile_length, tile_width), both multiples of 16.
+    """
+    if access not in ACCESS_PATTERNS:
+        raise ValueError("Unknown access pattern: {}. Use one of {}".format(access, ACCESS_PATTERNS))
+    length, width = int(image_shape[0]), int(image_shape[1])
+    pixel_bytes = np.dtype(dtype).itemsize * int(samples)
+    overhead = _TILE_OVERHEAD.get(int(compression), _DEFAULT_COMPRESSED_OVERHEAD)
+
+    if patch_size is None:
+        patch_size = 256
+    patch_length, patch_width = _pair(patch_size)
+    if access == "patches":
+        window = (min(patch_length, length), min(patch_width, width))
+        aligned = (False, False)
+    elif access == "rows":
+        window = (min(patch_length, length), width)
+        aligned = (False, True)
+    else:
+        window = (length, width)
+        aligned = (True, True)
+
+    candidates_y = np.arange(TILE_MULTIPLE, min(max_tile_size, round_tile_size(length)) + 1, TILE_MULTIPLE)
+    candidates_x = np.arange(TILE_MULTIPLE, min(max_tile_size, round_tile_size(width)) + 1, TILE_MULTIPLE)
+    tl, tw = np.meshgrid(candidates_y.astype(np.float64), candidates_x.astype(np.float64), indexing="ij")
+
+    n_tiles = _expected_tiles(window[0], tl, length, aligned[0]) * _expected_tiles(window[1], tw, width, aligned[1])
+    tile_bytes = tl * tw * pixel_bytes
+    cost = n_tiles * (tile_bytes + overhead)
+    cost[tile_bytes > max_tile_bytes] = np.inf
+    if not np.isfinite(cost).any():
+        return TILE_MULTIPLE, TILE_MULTIPLE
+
+    # prefer square and smaller tiles if costs are equal
+    order = np.lexsort((tl.ravel() * tw.ravel(), np.abs(tl - tw).ravel(), cost.ravel()))
+    best = order[0]
+    return int(tl.ravel()[best]), int(tw.ravel()[best])
+
+
+def replay_windows(windows, image_shape, tile_shapes, dtype=np.uint8, samples=1):
+    """Replay recorded read windows against candidate tile layouts.
+
+    Args:
+        windows (array_like): N x 4 array of read windows given as (y, x, length, width).
+        image_shape (tuple): (image length, image width) of the page.
+        tile_shapes (list): candidate (tile_length, tile_width) tuples.
+        dtype (np.dtype): data type of a sample. Default: uint8
+        samples (int): samples per pixel. Default: 1
+
+    Returns:
+        dict: maps each candidate tile shape to the number of bytes that would be decoded
+        to serve all windows.
+
+    Examples:
+        >>> windows = [(0, 0, 256, 256), (1000, 500, 64, 64)]
+        >>> pytiff.replay_windows(windows, (4096, 4096), [(256, 256), (512, 512)])
+        {(256, 256): 327680, (512, 512): 1310720}
+    """
+    windows = np.asarray(windows, dtype=np.int64).reshape(-1, 4)
+    length, width = int(image_shape[0]), int(image_shape[1])
+    y0 = np.clip(windows[:, 0], 0, length)
+    x0 = np.clip(windows[:, 1], 0, width)
+    y1 = np.clip(windows[:, 0] + windows[:, 2], 0, length)
+    x1 = np.clip(windows[:, 1] + windows[:, 3], 0, width)
+    valid = (y1 > y0) & (x1 > x0)
+    y0, x0, y1, x1 = y0[valid], x0[valid], y1[valid], x1[valid]
+    pixel_bytes = np.dtype(dtype).itemsize * int(samples)
+
+    result = {}
+    for tile_shape in tile_shapes:
+        tile_length, tile_width = _pair(tile_shape)
+        n_y = -(-y1 // tile_length) - y0 // tile_length
+        n_x = -(-x1 // tile_width) - x0 // tile_width
+        n_tiles = int(np.sum(n_y * n_x))
+        result[(tile_length, tile_width)] = n_tiles * tile_length * tile_width * pixel_bytes
+    return result
+
+
+def tiles_in_mask(mask, image_shape, tile_shape, mask_scale=None):
+    """Find the tiles of an image that intersect a low resolution mask.
+
+    Args:
+        mask (array_like): 2D boolean mask covering the whole image.
+        image_shape (tuple): (image length, image width) of the page.
+        tile_shape (tuple): (tile_length, tile_width).
+        mask_scale (float or tuple): number of image pixels per mask pixel, per axis if a tuple is given.
+                                     Default: None (derived from the image and mask shapes)
+
+    Returns:
+        np.ndarray: boolean array with one entry per tile, True if any mask pixel under the tile is set.
+
+    Examples:
+        >>> mask = np.zeros((10, 10), dtype=bool)
+        >>> mask[2, 3] = True
+        >>> pytiff.tiling.tiles_in_mask(mask, (1000, 1000), (256, 256)).nonzero()
+        (array([0, 1]), array([1, 1]))
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim != 2:
+        raise ValueError("The mask has to be 2D, not {}D".format(mask.ndim))
+    length, width = int(image_shape[0]), int(image_shape[1])
+    tile_length, tile_width = _pair(tile_shape)
+    if mask_scale is None:
+        scale_y, scale_x = length / float(mask.shape[0]), width / float(mask.shape[1])
+    elif np.ndim(mask_scale) == 0:
+        scale_y = scale_x = float(mask_scale)
+    else:
+        scale_y, scale_x = float(mask_scale[0]), float(mask_scale[1])
+
+    def bounds(n_pixels, tile, scale, n_mask):
+        start = np.arange(0, n_pixels, tile)
+        stop = np.minimum(start + tile, n_pixels)
+        first = np.clip(np.floor(start / scale).astype(np.int64), 0, n_mask)
+        last = np.clip(np.ceil(stop / scale).astype(np.int64), 0, n_mask)
+        return first, np.maximum(last, np.minimum(first + 1, n_mask))
+
+    y0, y1 = bounds(length, tile_length, scale_y, mask.shape[0])
+    x0, x1 = bounds(width, tile_width, scale_x, mask.shape[1])
+    # summed area table, so every tile is checked with four lookups
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = mask.cumsum(0).cumsum(1)
+    counts = (table[y1[:, None], x1[None, :]] - table[y0[:, None], x1[None, :]]
+              - table[y1[:, None], x0[None, :]] + table[y0[:, None], x0[None, :]])
+    return counts > 0
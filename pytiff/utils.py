@@ -1,4 +1,7 @@
 import struct
+import numpy as np
+
+from ._parallel import ordered_map
 
 def is_bigtiff(filename):
     """Check if a tiff image is bigtiff or not.
@@ -29,3 +32,255 @@ def byteorder(filename):
     with open(filename, "rb") as handle:
         tmp = {b'II': '<', b'MM': '>'}[handle.read(2)]
         return tmp
+
+def page_list(pages, n_pages):
+    """Convert a page selection to a list of page indices.
+
+    Args:
+        pages (None, int, slice or iterable): the selected pages. None selects all pages.
+        n_pages (int): number of pages in the file.
+
+    Returns:
+        list: page indices.
+    """
+    if pages is None:
+        return list(range(n_pages))
+    if isinstance(pages, slice):
+        return list(range(n_pages))[pages]
+    if np.ndim(pages) == 0:
+        pages = [pages]
+    result = []
+    for p in pages:
+        p = int(p)
+        if p < 0:
+            p += n_pages
+        if p < 0 or p >= n_pages:
+            raise IndexError("Page {} out of range. The file has {} pages.".format(p, n_pages))
+        result.append(p)
+    return result
+
+def sample_dtype(n_bits):
+    """Numpy dtype of unsigned samples with n_bits bits. 1 bit samples are bool."""
+    if n_bits == 1:
+        return np.dtype(bool)
+    if n_bits <= 8:
+        return np.dtype(np.uint8)
+    if n_bits <= 16:
+        return np.dtype(np.uint16)
+    if n_bits <= 32:
+        return np.dtype(np.uint32)
+    return np.dtype(np.uint64)
+
+def pack_samples(data, n_bits):
+    """Pack unsigned samples into rows of n_bits per sample, most significant bit first.
+
+    The last axis is packed, every row starts at a byte boundary as in tiff strips and tiles.
+    Values are truncated to n_bits.
+
+    Args:
+        data (np.ndarray): samples, e.g. a (length, width) mask or a (length, width, samples) image.
+        n_bits (int): bits per sample, 1 to 16.
+
+    Returns:
+        np.ndarray: uint8 array of shape (length, bytes per row).
+
+    Examples:
+        >>> pytiff.utils.pack_samples(np.array([[1, 0, 1, 1]], dtype=bool), 1)
+        array([[176]], dtype=uint8)
+    """
+    data = np.asarray(data)
+    rows = data.reshape(data.shape[0], -1) if data.ndim > 1 else data.reshape(1, -1)
+    if n_bits == 1:
+        return np.packbits(rows != 0, axis=-1)
+    if n_bits == 8:
+        return np.ascontiguousarray(rows, dtype=np.uint8)
+    shifts = np.arange(n_bits - 1, -1, -1, dtype=np.uint16)
+    bits = (rows.astype(np.uint16)[:, :, None] >> shifts) & 1
+    return np.packbits(bits.reshape(rows.shape[0], -1).astype(np.uint8), axis=-1)
+
+def unpack_samples(packed, n_bits, count, start=0, dtype=None):
+    """Unpack a window of samples from rows packed with n_bits per sample.
+
+    Only the bytes containing the samples start to start + count are unpacked.
+
+    Args:
+        packed (np.ndarray): uint8 array of shape (length, bytes per row).
+        n_bits (int): bits per sample, 1 to 16.
+        count (int): number of samples per row that are unpacked.
+        start (int): index of the first sample in a row. Default: 0
+        dtype (np.dtype): dtype of the result. Default: `sample_dtype(n_bits)`
+
+    Returns:
+        np.ndarray: array of shape (length, count).
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    if packed.ndim == 1:
+        packed = packed[None]
+    if dtype is None:
+        dtype = sample_dtype(n_bits)
+    first_bit = start * n_bits
+    last_bit = (start + count) * n_bits
+    window = packed[:, first_bit // 8:-(-last_bit // 8)]
+    if n_bits == 8:
+        return window.astype(dtype)
+    bits = np.unpackbits(window, axis=-1)
+    bits = bits[:, first_bit % 8:first_bit % 8 + count * n_bits]
+    if n_bits == 1:
+        return bits.astype(dtype)
+    weights = (1 << np.arange(n_bits - 1, -1, -1)).astype(np.uint16)
+    values = bits.reshape(bits.shape[0], count, n_bits).astype(np.uint16).dot(weights)
+    return values.astype(dtype)
+
+# tiff field type: (numpy type code, size in bytes)
+_FIELD_TYPES = {
+    1: ("u1", 1), 2: ("u1", 1), 3: ("u2", 2), 4: ("u4", 4), 5: ("u4", 8), 6: ("i1", 1), 7: ("u1", 1),
+    8: ("i2", 2), 9: ("i4", 4), 10: ("i4", 8), 11: ("f4", 4), 12: ("f8", 8), 13: ("u4", 4),
+    16: ("u8", 8), 17: ("i8", 8), 18: ("u8", 8),
+}
+# tags read by scan: code: name
+_SCAN_TAGS = {
+    256: "image_width", 257: "image_length", 258: "bits_per_sample", 259: "compression",
+    262: "photometric", 277: "samples_per_pixel", 278: "rows_per_strip", 284: "planar_config",
+    322: "tile_width", 323: "tile_length", 339: "sample_format", 32997: "image_depth", 32998: "tile_depth",
+}
+_OFFSET_TAGS = {273: "strip_offsets", 279: "strip_byte_counts", 324: "tile_offsets", 325: "tile_byte_counts"}
+
+def _scan_dtype(sample_format, n_bits):
+    if sample_format == 3:
+        return np.dtype("f{}".format(max(n_bits // 8, 2)))
+    if sample_format == 2:
+        return np.dtype("i{}".format(max(n_bits // 8, 1)))
+    return sample_dtype(n_bits)
+
+def _field_values(handle, order, entry, bigtiff, count_limit=None):
+    """Values of an ifd entry, read from the file if they do not fit into the entry."""
+    code, size = _FIELD_TYPES.get(int(entry["type"]), ("u1", 1))
+    count = int(entry["count"])
+    if count_limit is not None:
+        count = min(count, count_limit)
+    n_bytes = count * size
+    if entry["type"] in (5, 10):
+        count *= 2
+    raw = entry["value"].tobytes()
+    if int(entry["count"]) * size > (8 if bigtiff else 4):
+        offset = struct.unpack(order + ("Q" if bigtiff else "I"), raw)[0]
+        handle.seek(offset)
+        raw = handle.read(n_bytes)
+    return np.frombuffer(raw[:n_bytes], dtype=order + code, count=count)
+
+def scan_file(filename, offsets=False):
+    """Read the page layout of a tiff file without libtiff.
+
+    Only the header and the image file directories are read.
+
+    Args:
+        filename (str): Filename of a tiff image.
+        offsets (bool): If True, the records contain the offsets and byte counts of all tiles or strips. Default: False
+
+    Returns:
+        list: one dict per page with the keys page, shape, dtype, tile_shape (None for striped pages),
+        rows_per_strip, compression, photometric, planar_config, samples_per_pixel, bits_per_sample
+        and, if requested, offsets and byte_counts.
+    """
+    pages = []
+    with open(filename, "rb") as handle:
+        header = handle.read(16)
+        try:
+            order = {b"II": "<", b"MM": ">"}[header[:2]]
+        except KeyError:
+            raise IOError("{} is not a tiff file".format(filename))
+        version = struct.unpack(order + "H", header[2:4])[0]
+        bigtiff = version == 43
+        if version not in (42, 43):
+            raise IOError("{} is not a tiff file".format(filename))
+        if bigtiff:
+            next_ifd = struct.unpack(order + "Q", header[8:16])[0]
+            count_format, count_size = "Q", 8
+            entry_dtype = np.dtype([("tag", order + "u2"), ("type", order + "u2"), ("count", order + "u8"), ("value", "V8")])
+        else:
+            next_ifd = struct.unpack(order + "I", header[4:8])[0]
+            count_format, count_size = "H", 2
+            entry_dtype = np.dtype([("tag", order + "u2"), ("type", order + "u2"), ("count", order + "u4"), ("value", "V4")])
+
+        visited = set()
+        while next_ifd and next_ifd not in visited:
+            visited.add(next_ifd)
+            handle.seek(next_ifd)
+            n_entries = struct.unpack(order + count_format, handle.read(count_size))[0]
+            block = handle.read(n_entries * entry_dtype.itemsize + (8 if bigtiff else 4))
+            entries = np.frombuffer(block, dtype=entry_dtype, count=n_entries)
+            next_ifd = struct.unpack(order + ("Q" if bigtiff else "I"), block[n_entries * entry_dtype.itemsize:])[0]
+
+            fields = {}
+            for entry in entries:
+                tag = int(entry["tag"])
+                if tag in _SCAN_TAGS:
+                    fields[_SCAN_TAGS[tag]] = int(_field_values(handle, order, entry, bigtiff, 1)[0])
+                elif offsets and tag in _OFFSET_TAGS:
+                    fields[_OFFSET_TAGS[tag]] = _field_values(handle, order, entry, bigtiff).astype(np.uint64)
+
+            samples = fields.get("samples_per_pixel", 1)
+            n_bits = fields.get("bits_per_sample", 1)
+            shape = (fields.get("image_length", 0), fields.get("image_width", 0))
+            if fields.get("image_depth", 1) > 1:
+                shape = (fields["image_depth"],) + shape
+            if samples > 1:
+                shape += (samples,)
+            tile_shape = None
+            if "tile_width" in fields:
+                tile_shape = (fields.get("tile_length", 0), fields["tile_width"])
+                if fields.get("tile_depth", 1) > 1:
+                    tile_shape = (fields["tile_depth"],) + tile_shape
+            record = {
+                "page": len(pages),
+                "shape": shape,
+                "dtype": _scan_dtype(fields.get("sample_format", 1), n_bits),
+                "tile_shape": tile_shape,
+                "rows_per_strip": None if tile_shape else min(fields.get("rows_per_strip", shape[0]), shape[0]),
+                "compression": fields.get("compression", 1),
+                "photometric": fields.get("photometric"),
+                "planar_config": fields.get("planar_config", 1),
+                "samples_per_pixel": samples,
+                "bits_per_sample": n_bits,
+            }
+            if offsets:
+                prefix = "tile" if tile_shape else "strip"
+                record["offsets"] = fields.get(prefix + "_offsets")
+                record["byte_counts"] = fields.get(prefix + "_byte_counts")
+            pages.append(record)
+    return pages
+
+def scan(paths, workers=1, offsets=False, errors="raise"):
+    """Read the page layout of many tiff files without opening them with libtiff.
+
+    Only the header and the image file directories of every file are read, which is much faster than
+    creating a `pytiff.Tiff` object per file. The files are scanned in parallel by `workers` threads.
+
+    Args:
+        paths (str or iterable): filenames of tiff images.
+        workers (int): number of threads. Default: 1
+        offsets (bool): If True, the records contain the offsets and byte counts of all tiles or strips. Default: False
+        errors (str): "raise" to raise an IOError for unreadable files, "ignore" to return None for them. Default: "raise"
+
+    Returns:
+        list: for every path a list of page records as returned by `scan_file` (or None).
+
+    Examples:
+        >>> records = pytiff.utils.scan(glob.glob("archive/**/*.tif"), workers=16)
+        >>> records[0][0]["shape"], records[0][0]["tile_shape"]
+        ((40000, 30000, 3), (512, 512))
+    """
+    if errors not in ("raise", "ignore"):
+        raise ValueError("errors has to be 'raise' or 'ignore', not {}".format(errors))
+    if isinstance(paths, str):
+        paths = [paths]
+
+    def scan_one(filename):
+        try:
+            return scan_file(filename, offsets)
+        except (IOError, OSError, struct.error, ValueError):
+            if errors == "raise":
+                raise
+            return None
+
+    return list(ordered_map(scan_one, paths, workers))